@@ -1,4 +1,3 @@
-import os
 import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
@@ -6,7 +5,6 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_caching import Cache
 from flask_mail import Mail
-from .meraki_dashboard import get_dashboard
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -30,47 +28,53 @@ def create_app(config_name='default'):
     login.init_app(app)
     cache.init_app(app)
     mail.init_app(app)
+
+    from .rate_limit import rate_limits
+    rate_limits.init_app(app)
     login.login_view = 'routes.login'
 
     from . import routes
     logging.info("Registering blueprint")
     app.register_blueprint(routes.bp)
 
+    from .assets import assets
+    assets.init_app(app)
+
     from app.models import User
 
+    from .sightings import sighting_buffer, client_debounce
+    sighting_buffer.init_app(app)
+    client_debounce.init_app(app)
+
+    from .fast_lane import fast_lane
+    fast_lane.init_app(app)
+
+    from .admission import admission
+    admission.init_app(app)
+
+    from .inventory import inventory
+    inventory.init_app(app)
+
+    from .status_poller import status_poller
+    status_poller.init_app(app)
+
+    from .sync_scheduler import sync_scheduler
+    sync_scheduler.init_app(app)
+
     @login.user_loader
     def load_user(id):
         return User.query.get(int(id))
 
-    from . import meraki_api
-    meraki_api_enabled = os.environ.get('MERAKI_API_ENABLED', 'false').lower() == 'true'
-    logging.info(f"Meraki API Enabled: {meraki_api_enabled}")
-
-    if meraki_api_enabled:
-        api_key = os.environ.get('MERAKI_API_KEY')
-        org_id = os.environ.get('MERAKI_ORG_ID')
-        ssid_names_str = os.environ.get('MERAKI_SSID_NAMES', '')
-        ssid_names = ssid_names_str.split(',')
-
-        logging.info(f"MERAKI_API_KEY: {'set' if api_key else 'not set'}")
-        logging.info(f"MERAKI_ORG_ID: {org_id}")
-        logging.info(f"MERAKI_SSID_NAMES: {ssid_names_str}")
-
-        if api_key and org_id and ssid_names:
-            logging.info("All Meraki environment variables are set, proceeding with splash page update.")
-            dashboard = get_dashboard()
-            if dashboard:
-                networks = dashboard.organizations.getOrganizationNetworks(org_id)
-                if networks:
-                    network_id = networks[0]['id']
-                    if not meraki_api.verify_port_forwarding_rule(dashboard, network_id):
-                        meraki_api.add_port_forwarding_rule(dashboard, network_id)
-                meraki_api.update_splash_page_settings(dashboard, org_id, ssid_names)
-        else:
-            logging.warning("Meraki API is enabled, but one or more required environment variables are missing.")
+    # Meraki provisioning runs once per deployment through `flask provision`
+    # (see entrypoint.sh), not in every worker
+    from .provisioning import provision_command
+    app.cli.add_command(provision_command)
 
     from . import errors
     app.register_blueprint(errors.bp)
 
+    from .splash_page import splash_page
+    splash_page.init_app(app)
+
     logging.info("Flask app created")
     return app
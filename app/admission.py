@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from .lru import LRUCache
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` tokens, refilled at `rate` per second.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, tokens=1):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+
+class AdmissionControl:
+    """
+    Sheds splash page load during reconnect storms.
+
+    Each MAC gets a small token bucket that absorbs the duplicate probes
+    captive network assistants send, and the worker allows at most
+    `max_concurrent` sightings to be persisted at once. Requests that are
+    throttled or that cannot get a slot within `queue_timeout` are still served
+    the pre-rendered splash page, just without recording the sighting.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.burst = 3
+        self.rate = 0.2
+        self.max_concurrent = 16
+        self.queue_timeout = 0.05
+        self._buckets = LRUCache()
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ADMISSION_CONTROL_ENABLED', False)
+        self.burst = app.config.get('ADMISSION_MAC_BURST', 3)
+        self.rate = app.config.get('ADMISSION_MAC_RATE', 0.2)
+        self.max_concurrent = app.config.get('ADMISSION_MAX_CONCURRENT', 16)
+        self.queue_timeout = app.config.get('ADMISSION_QUEUE_TIMEOUT', 0.05)
+        # Idle buckets refill completely after burst / rate seconds, so they can be dropped then
+        self._buckets = LRUCache(max_size=app.config.get('ADMISSION_MAX_TRACKED_MACS', 50000),
+                                 ttl=self.burst / self.rate if self.rate else None)
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._reset_counters()
+        logging.info(f"Splash admission control enabled: {self.enabled}")
+
+    def _reset_counters(self):
+        self.admitted = 0
+        self.throttled = 0
+        self.degraded = 0
+        self.in_flight = 0
+
+    def _bucket(self, mac_address):
+        bucket = self._buckets.get(mac_address)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, self.rate)
+            self._buckets.set(mac_address, bucket)
+        return bucket
+
+    @contextmanager
+    def admit(self, mac_address, wait=True):
+        """
+        Yield True if the request may persist its sighting, False if it should
+        be served without touching the database. With `wait=False` a busy
+        worker degrades immediately instead of blocking for a slot.
+        """
+        if not self.enabled:
+            yield True
+            return
+
+        if not self._bucket(mac_address).take():
+            self.throttled += 1
+            logging.debug(f"Throttled duplicate splash probe from {mac_address}")
+            yield False
+            return
+
+        if not self._slots.acquire(timeout=self.queue_timeout if wait else 0):
+            self.degraded += 1
+            logging.warning("Splash page overloaded, serving without recording the sighting")
+            yield False
+            return
+
+        self.admitted += 1
+        self.in_flight += 1
+        try:
+            yield True
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'admitted': self.admitted,
+            'throttled': self.throttled,
+            'degraded': self.degraded,
+            'in_flight': self.in_flight,
+            'max_concurrent': self.max_concurrent,
+            'tracked_macs': len(self._buckets),
+        }
+
+
+admission = AdmissionControl()
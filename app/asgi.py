@@ -0,0 +1,191 @@
+import logging
+from datetime import datetime
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_cookie, parse_etags
+from werkzeug.urls import iri_to_uri
+from .admission import admission
+from .fast_lane import fast_lane
+from .grant_token import issue_grant_token, verify_grant_token
+from .models import Client, User
+from .sightings import client_debounce, sighting_buffer, upsert_statement
+from .splash_page import splash_page
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(database_url):
+    """
+    Map a synchronous SQLAlchemy URL onto the matching asyncio driver.
+    """
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {url.get_backend_name()}")
+    return url.set(drivername=driver)
+
+
+class PortalASGI:
+    """
+    ASGI application serving the splash and connect endpoints with async
+    handlers and an async database engine. Every other request, including
+    anything that needs a full login, is passed through to the Flask app.
+    """
+
+    def __init__(self, flask_app, engine=None):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = engine or create_async_engine(
+            async_database_url(flask_app.config['SQLALCHEMY_DATABASE_URI']))
+        self.dialect = self.engine.dialect.name
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.cookie_name = flask_app.config.get('SESSION_COOKIE_NAME', 'session')
+        self.session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            path = scope['path'][len(scope.get('root_path', '')):] or '/'
+            if path == '/':
+                if await self.splash(scope, send):
+                    return
+            elif path == '/connect':
+                await self.connect(scope, send)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                sighting_buffer.stop()
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _session(self, headers):
+        cookie = parse_cookie(headers.get('Cookie', '')).get(self.cookie_name)
+        if not cookie or self.serializer is None:
+            return {}
+        try:
+            return self.serializer.loads(cookie, max_age=self.session_max_age)
+        except Exception:
+            return {}
+
+    async def _is_logged_in(self, session):
+        user_id = session.get('_user_id')
+        if not user_id:
+            return False
+        async with self.engine.connect() as conn:
+            result = await conn.execute(select(User.id).where(User.id == int(user_id)))
+            return result.first() is not None
+
+    async def splash(self, scope, send):
+        """
+        Async counterpart of routes.splash. Returns False if the request should
+        be handled by the Flask app instead, e.g. because the user is not logged in.
+        """
+        headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+        try:
+            # Anything other than an authenticated session (remember-me cookies,
+            # the login redirect) is left to Flask-Login in the WSGI app
+            if not await self._is_logged_in(self._session(headers)):
+                return False
+
+            args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+            client_mac = args.get('client_mac')
+            client_ip = args.get('client_ip')
+            user_agent = headers.get('User-Agent')
+
+            if not (client_mac and client_ip):
+                logging.warning("Direct access to splash page without Meraki data")
+                await self._send(scope, send, 200, [('Content-Type', 'text/html; charset=utf-8')],
+                                 b"Direct access is not supported.")
+                return True
+
+            logging.info(f"Processing client with MAC: {client_mac} and IP: {client_ip}")
+            redirect_url = args.get('base_grant_url')
+
+            with admission.admit(client_mac, wait=False) as admitted:
+                if admitted:
+                    await self.record_sighting(client_mac, client_ip, user_agent)
+                    if redirect_url and await self.is_granted(client_mac):
+                        logging.info(f"Fast lane grant for {client_mac}, redirecting to {redirect_url}")
+                        await self._send(scope, send, 302, [('Location', redirect_url)], b'')
+                        return True
+
+            with self.flask_app.app_context():
+                token = issue_grant_token(redirect_url, client_mac) if redirect_url else None
+            timer_duration = self.flask_app.config.get('SPLASH_TIMER_SECONDS', 10)
+            page = splash_page.get(timer_duration, scope.get('root_path', ''))
+            status, response_headers, body = splash_page.negotiate(
+                page, token,
+                parse_accept_header(headers.get('Accept-Encoding')),
+                parse_etags(headers.get('If-None-Match')))
+            await self._send(scope, send, status, response_headers, body)
+        except Exception as e:
+            logging.error(f"Error in splash page: {e}", exc_info=True)
+            await self._send(scope, send, 500, [('Content-Type', 'text/html; charset=utf-8')],
+                             b"An error occurred. Please try again later.")
+        return True
+
+    async def record_sighting(self, mac_address, ip_address, user_agent):
+        now = datetime.utcnow()
+        if client_debounce.should_skip(mac_address, ip_address, now):
+            return
+        if not sighting_buffer.add(mac_address, ip_address, user_agent, now):
+            async with self.engine.begin() as conn:
+                await conn.execute(upsert_statement(self.dialect, [(mac_address, ip_address, user_agent, now)]))
+        client_debounce.remember(mac_address, ip_address, now)
+
+    async def is_granted(self, mac_address):
+        if not fast_lane.enabled:
+            return False
+        if fast_lane.check_hot(mac_address):
+            return True
+        if fast_lane.check_miss(mac_address):
+            return False
+        async with self.engine.connect() as conn:
+            result = await conn.execute(select(Client.last_granted).where(Client.mac_address == mac_address))
+            return fast_lane.check_record(mac_address, result.scalar())
+
+    async def connect(self, scope, send):
+        """
+        Async counterpart of routes.connect.
+        """
+        args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        token = args.get('t')
+        with self.flask_app.app_context():
+            claims = verify_grant_token(token) if token else None
+        if claims:
+            redirect_url = claims['grant']
+            if fast_lane.enabled and claims.get('mac'):
+                now = datetime.utcnow()
+                async with self.engine.begin() as conn:
+                    await conn.execute(update(Client).where(Client.mac_address == claims['mac'])
+                                       .values(last_granted=now))
+                fast_lane.remember(claims['mac'], now)
+        else:
+            headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+            redirect_url = self._session(headers).get('redirect_url', 'https://www.reddit.com')
+        logging.info(f"Redirecting user to {redirect_url}")
+        # Header values go out as latin-1, so quote anything beyond ASCII
+        await self._send(scope, send, 302, [('Location', iri_to_uri(redirect_url))], b'')
+
+    @staticmethod
+    async def _send(scope, send, status, headers, body):
+        raw_headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        raw_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import click
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+bp = Blueprint('assets', __name__)
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.html', '.json', '.txt')
+MAX_AGE = 31536000
+
+
+def fingerprint(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:10]
+
+
+def build_assets(static_folder, output_folder=None):
+    """
+    Copy every file under `static_folder` into `output_folder` with a content
+    hash in its name, write gzip/brotli variants of text assets next to them,
+    and write a manifest mapping original names to fingerprinted ones.
+    """
+    output_folder = output_folder or os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(output_folder):
+        shutil.rmtree(output_folder)
+    os.makedirs(output_folder)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != output_folder]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            stem, ext = os.path.splitext(relative)
+            built = f"{stem}.{fingerprint(source)}{ext}"
+            target = os.path.join(output_folder, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            if ext in COMPRESSIBLE:
+                with open(source, 'rb') as f:
+                    data = f.read()
+                with open(target + '.gz', 'wb') as f:
+                    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as f:
+                        f.write(brotli.compress(data))
+            manifest[relative] = built
+
+    with open(os.path.join(output_folder, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    """
+    Resolves static filenames to fingerprinted build output when it exists,
+    and falls back to the plain static route otherwise.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.output_folder = None
+        self._inline = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.load_manifest(app)
+        app.register_blueprint(bp)
+        app.cli.add_command(assets_cli)
+        app.add_template_global(self.url, 'asset_url')
+        app.add_template_global(self.inline, 'inline_asset')
+
+    def load_manifest(self, app):
+        self.output_folder = app.config.get('ASSETS_FOLDER') or os.path.join(app.static_folder, DIST_DIR)
+        self.manifest = {}
+        self._inline = {}
+        manifest_path = os.path.join(self.output_folder, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            logging.info(f"Loaded asset manifest with {len(self.manifest)} entries")
+
+    def url(self, filename, default=None):
+        """
+        URL for a static file, fingerprinted if the asset bundle has been built.
+        `default` is used when the file is not shipped in app/static at all.
+        """
+        built = self.manifest.get(filename)
+        if built:
+            return url_for('assets.serve', filename=built)
+        if default and not os.path.exists(os.path.join(current_app.static_folder, filename)):
+            return default
+        return url_for('static', filename=filename)
+
+    def inline(self, filename):
+        """
+        Contents of a static text file, for inlining critical CSS into a page.
+        """
+        if filename not in self._inline:
+            with open(os.path.join(current_app.static_folder, filename), encoding='utf-8') as f:
+                self._inline[filename] = Markup(f.read().strip())
+        return self._inline[filename]
+
+
+@bp.route('/assets/<path:filename>')
+def serve(filename):
+    """
+    Serve a fingerprinted asset with a far-future cache lifetime, preferring a
+    precompressed variant when the client accepts one.
+    """
+    folder = assets.output_folder
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.exists(os.path.join(folder, filename + suffix)):
+            response = send_from_directory(folder, filename + suffix, max_age=MAX_AGE,
+                                           mimetype=_mimetype(filename))
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(folder, filename, max_age=MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+@assets_cli.command('build')
+def build_command():
+    """Fingerprint and precompress everything in app/static."""
+    manifest = build_assets(current_app.static_folder, assets.output_folder)
+    assets.manifest = manifest
+    click.echo(f"Built {len(manifest)} assets into {assets.output_folder}")
+
+
+assets = Assets()
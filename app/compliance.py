@@ -0,0 +1,78 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+from .meraki_api import get_external_url, portal_network_id, verify_port_forwarding_rule, verify_splash_page
+
+# Placeholders get_external_url returns instead of a hostname
+EXTERNAL_URL_MISSING = ('Appliance not found', 'Not available')
+
+
+def external_url_ok(external_url):
+    return bool(external_url) and external_url not in EXTERNAL_URL_MISSING
+
+
+def check_network(dashboard, org_id, network, ssid_names, needs_rule=True):
+    """
+    Check one network: its external URL, its port forwarding rule if
+    `needs_rule` is set (otherwise reported as None) and the splash page of
+    each of `ssid_names`. Every check is memoized per network or per
+    (network, SSID) pair, so repeated checks are served from the cache.
+    """
+    row = {
+        'id': network['id'],
+        'name': network.get('name', network['id']),
+        'external_url': None,
+        'port_forwarding_rule_active': False if needs_rule else None,
+        'ssids': {name: False for name in ssid_names},
+        'compliant': False,
+        'error': None,
+    }
+    try:
+        row['external_url'] = get_external_url(dashboard, org_id, network['id'])
+        if needs_rule:
+            row['port_forwarding_rule_active'] = verify_port_forwarding_rule(dashboard, network['id'])
+        row['ssids'] = {name: verify_splash_page(dashboard, network['id'], name) for name in ssid_names}
+    except Exception as e:
+        logging.error(f"Error checking Meraki network {network['id']}: {e}", exc_info=True)
+        row['error'] = str(e)
+    row['compliant'] = (row['error'] is None and external_url_ok(row['external_url'])
+                        and (row['port_forwarding_rule_active'] or not needs_rule) and all(row['ssids'].values()))
+    return row
+
+
+def compliance_matrix(dashboard, org_id, networks, ssid_names, max_workers=None):
+    """
+    Check every (network, SSID) pair, up to `max_workers` networks at a time
+    (MERAKI_FETCH_CONCURRENCY by default). Only the portal's network needs
+    the port forwarding rule, as only it gets one from provisioning. Returns
+    one row per network, in the order of `networks`.
+    """
+    if not networks:
+        return []
+    max_workers = max_workers or int(os.environ.get('MERAKI_FETCH_CONCURRENCY') or 4)
+    app = current_app._get_current_object() if has_app_context() else None
+    rule_network_id = portal_network_id(networks)
+
+    def check(network):
+        needs_rule = network['id'] == rule_network_id
+        # The memoized checks need an app context for the cache
+        if app is None:
+            return check_network(dashboard, org_id, network, ssid_names, needs_rule)
+        with app.app_context():
+            return check_network(dashboard, org_id, network, ssid_names, needs_rule)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(networks)), thread_name_prefix='compliance') as pool:
+        return list(pool.map(check, networks))
+
+
+def summarize(rows, ssid_names):
+    """
+    Counts of compliant networks and (network, SSID) pairs.
+    """
+    return {
+        'networks': len(rows),
+        'compliant_networks': sum(1 for row in rows if row['compliant']),
+        'pairs': len(rows) * len(ssid_names),
+        'compliant_pairs': sum(1 for row in rows for name in ssid_names if row['ssids'].get(name)),
+    }
@@ -9,6 +9,8 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'SimpleCache'
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') is not None
@@ -17,6 +19,32 @@ class Config:
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
     ADMIN_SUBNET = os.environ.get('ADMIN_SUBNET')
     SPLASH_TIMER_SECONDS = int(os.environ.get('SPLASH_TIMER_SECONDS') or 10)
+    GRANT_TOKEN_MAX_AGE = int(os.environ.get('GRANT_TOKEN_MAX_AGE') or 3600)
+    SIGHTING_WRITE_BEHIND = os.environ.get('SIGHTING_WRITE_BEHIND', 'false').lower() == 'true'
+    SIGHTING_BATCH_SIZE = int(os.environ.get('SIGHTING_BATCH_SIZE') or 200)
+    SIGHTING_FLUSH_INTERVAL = float(os.environ.get('SIGHTING_FLUSH_INTERVAL') or 2)
+    SIGHTING_QUEUE_MAX = int(os.environ.get('SIGHTING_QUEUE_MAX') or 10000)
+    CLIENT_DEBOUNCE_SECONDS = int(os.environ.get('CLIENT_DEBOUNCE_SECONDS') or 60)
+    CLIENT_DEBOUNCE_MAX_ENTRIES = int(os.environ.get('CLIENT_DEBOUNCE_MAX_ENTRIES') or 50000)
+    FAST_LANE_ENABLED = os.environ.get('FAST_LANE_ENABLED', 'false').lower() == 'true'
+    FAST_LANE_WINDOW_SECONDS = int(os.environ.get('FAST_LANE_WINDOW_SECONDS') or 3600)
+    FAST_LANE_MAX_ENTRIES = int(os.environ.get('FAST_LANE_MAX_ENTRIES') or 50000)
+    FAST_LANE_MISS_TTL = int(os.environ.get('FAST_LANE_MISS_TTL') or 30)
+    ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'false').lower() == 'true'
+    ADMISSION_MAC_BURST = int(os.environ.get('ADMISSION_MAC_BURST') or 3)
+    ADMISSION_MAC_RATE = float(os.environ.get('ADMISSION_MAC_RATE') or 0.2)
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT') or 16)
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT') or 0.05)
+    ADMISSION_MAX_TRACKED_MACS = int(os.environ.get('ADMISSION_MAX_TRACKED_MACS') or 50000)
+    PROVISION_LOCK_FILE = os.environ.get('PROVISION_LOCK_FILE')
+    STATUS_POLL_SECONDS = int(os.environ.get('STATUS_POLL_SECONDS') or 60)
+    INVENTORY_REFRESH_SECONDS = int(os.environ.get('INVENTORY_REFRESH_SECONDS') or 900)
+    MERAKI_INCREMENTAL_SYNC = os.environ.get('MERAKI_INCREMENTAL_SYNC', 'false').lower() == 'true'
+    MERAKI_SHARED_RATE_LIMIT = os.environ.get('MERAKI_SHARED_RATE_LIMIT', 'true').lower() == 'true'
+    MERAKI_WEBHOOK_SECRET = os.environ.get('MERAKI_WEBHOOK_SECRET')
+    MERAKI_WEBHOOK_TTL_MULTIPLIER = int(os.environ.get('MERAKI_WEBHOOK_TTL_MULTIPLIER') or 12)
+    DNS_SYNC_INTERVAL_SECONDS = int(os.environ.get('DNS_SYNC_INTERVAL_SECONDS') or 900)
+    DNS_SYNC_LOCK_FILE = os.environ.get('DNS_SYNC_LOCK_FILE')
 
 class TestingConfig(Config):
     TESTING = True
@@ -24,3 +52,5 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False
     MAIL_SUPPRESS_SEND = True
     MAIL_DEFAULT_SENDER = 'test@example.com'
+    # Tests start sync runs themselves
+    DNS_SYNC_INTERVAL_SECONDS = 0
@@ -0,0 +1,188 @@
+from datetime import datetime
+from sqlalchemy import func
+from . import db
+from .dns_sync import Mapping, SyncPlan, normalize_hostname, normalize_pihole_mappings
+from .models import DnsMapping, SyncJournalEntry
+from .pihole_api import PiholeReport
+from .utils import fingerprint
+
+# Writes made between two journal commits when Pi-hole takes them one by one
+BATCH_SIZE = 100
+
+
+def mapping_checksum(hostname, ip):
+    return fingerprint({'hostname': hostname, 'ip': ip})
+
+
+def managed_mappings():
+    """
+    The mappings the app has pushed to Pi-hole, in the form of Pi-hole's list.
+    """
+    return [{'ip': row.ip, 'hostname': row.hostname} for row in DnsMapping.query]
+
+
+def incremental_clients(delta):
+    """
+    The clients an incremental sync plans with: the managed mappings as
+    clients, with those of the clients in `delta` replaced by them. A client
+    whose mapping matches the checksum of its managed one changed nothing
+    upstream and is left out. Returns the clients and the number left out.
+    """
+    rows = DnsMapping.query.all()
+    by_mac = {row.mac: row for row in rows if row.mac}
+    changed = []
+    skipped = 0
+    for client in delta:
+        row = by_mac.get(client.get('mac'))
+        hostname = normalize_hostname(client.get('dhcpHostname'))
+        if row is not None and hostname and row.checksum == mapping_checksum(hostname, client.get('ip')):
+            skipped += 1
+            continue
+        changed.append(client)
+    replaced = {client.get('mac') for client in changed if client.get('mac')}
+    clients = [{'dhcpHostname': row.hostname, 'ip': row.ip, 'mac': row.mac, 'lastSeen': row.last_seen}
+               for row in rows if row.mac not in replaced]
+    return clients + changed, skipped
+
+
+def journal_progress(run_id):
+    """
+    The number of journal entries of a run by status.
+    """
+    counts = dict(db.session.query(SyncJournalEntry.status, func.count())
+                  .filter(SyncJournalEntry.run_id == run_id).group_by(SyncJournalEntry.status))
+    return {status: counts.get(status, 0) for status in ('pending', 'done', 'failed')}
+
+
+class DnsJournal:
+    """
+    The journal of one SyncRun.
+
+    Every planned write is stored as a pending SyncJournalEntry before it is
+    made, and marked done or failed once Pi-hole has answered, so the writes
+    an interrupted run did not get to can be finished by another run. Done
+    writes are mirrored in the DnsMapping table, which later runs can plan
+    against instead of reading Pi-hole.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.sources = {}
+
+    def track(self, clients):
+        """
+        Pass `clients` through, remembering the client each mapping came from.
+        """
+        for client in clients:
+            hostname = normalize_hostname(client.get('dhcpHostname'))
+            if hostname and client.get('ip'):
+                self.sources[Mapping(hostname, client['ip'])] = client
+            yield client
+
+    def sync(self, pihole, plan, desired, current, prune):
+        """
+        Journal and apply the writes of `plan`, then bring the managed mappings
+        in line with the desired ones Pi-hole already had. Called by sync_dns;
+        returns the PiholeReport, or None when there was nothing to write.
+        """
+        self.record(plan)
+        report = self.apply(pihole) if plan.writes else None
+        self.remember(desired, current, prune)
+        return report
+
+    def record(self, plan):
+        for action, mappings in (('delete', plan.deletes), ('add', plan.adds)):
+            for mapping in mappings:
+                source = self.sources.get(mapping, {}) if action == 'add' else {}
+                db.session.add(SyncJournalEntry(
+                    run_id=self.run.id, action=action, hostname=mapping.hostname, ip=mapping.ip,
+                    mac=source.get('mac'), last_seen=_last_seen(source), status='pending'))
+        db.session.commit()
+
+    def pending(self):
+        # 'delete' sorts after 'add', so descending puts the deletes first
+        return (SyncJournalEntry.query.filter_by(run_id=self.run.id, status='pending')
+                .order_by(SyncJournalEntry.action.desc(), SyncJournalEntry.id).all())
+
+    def apply(self, pihole):
+        """
+        Make the pending writes, deletes first. A Pi-hole that takes writes one
+        by one gets them BATCH_SIZE at a time, and the journal is committed
+        after every batch.
+        """
+        entries = self.pending()
+        report = PiholeReport()
+        size = max(len(entries), 1) if getattr(pihole, 'bulk', False) else BATCH_SIZE
+        for start in range(0, len(entries), size):
+            batch = entries[start:start + size]
+            result = pihole.apply(adds=[_mapping(entry) for entry in batch if entry.action == 'add'],
+                                  deletes=[_mapping(entry) for entry in batch if entry.action == 'delete'])
+            errors = {(action, mapping): error for action, mapping, error in result.failed}
+            for entry in batch:
+                error = errors.get((entry.action, _mapping(entry)))
+                if error is None:
+                    self._done(entry)
+                else:
+                    entry.status = 'failed'
+                    entry.error = error[:255]
+            db.session.commit()
+            report.added += result.added
+            report.deleted += result.deleted
+            report.failed.extend(result.failed)
+            report.elapsed += result.elapsed
+        return report
+
+    def remember(self, desired, current, prune):
+        """
+        Record the desired mappings that were already in `current`, and with
+        `prune` forget the managed mappings that are no longer desired.
+        """
+        managed = {row.hostname: row for row in DnsMapping.query}
+        for mapping in desired & current:
+            row = managed.get(mapping.hostname)
+            if row is None or row.ip != mapping.ip:
+                source = self.sources.get(mapping, {})
+                db.session.merge(DnsMapping(
+                    hostname=mapping.hostname, ip=mapping.ip, mac=source.get('mac'),
+                    last_seen=_last_seen(source), checksum=mapping_checksum(mapping.hostname, mapping.ip)))
+        if prune:
+            for row in managed.values():
+                if Mapping(row.hostname, row.ip) not in desired:
+                    db.session.delete(row)
+        db.session.commit()
+
+    def resume(self, pihole):
+        """
+        Finish the pending writes handed over from an interrupted run. Writes
+        that reached Pi-hole before the interruption are marked done without
+        being repeated. Returns the resumed plan and the PiholeReport.
+        """
+        entries = self.pending()
+        current = normalize_pihole_mappings(pihole.get_mappings())
+        for entry in entries:
+            if (_mapping(entry) in current) == (entry.action == 'add'):
+                self._done(entry)
+        db.session.commit()
+        plan = SyncPlan(adds=[_mapping(entry) for entry in entries if entry.action == 'add'],
+                        deletes=[_mapping(entry) for entry in entries if entry.action == 'delete'],
+                        unchanged=0, conflicts=[])
+        return plan, self.apply(pihole)
+
+    def _done(self, entry):
+        entry.status = 'done'
+        entry.error = None
+        if entry.action == 'delete':
+            DnsMapping.query.filter_by(hostname=entry.hostname, ip=entry.ip).delete()
+        else:
+            db.session.merge(DnsMapping(
+                hostname=entry.hostname, ip=entry.ip, mac=entry.mac, last_seen=entry.last_seen,
+                last_pushed=datetime.utcnow(), checksum=mapping_checksum(entry.hostname, entry.ip)))
+
+
+def _mapping(entry):
+    return Mapping(entry.hostname, entry.ip)
+
+
+def _last_seen(client):
+    last_seen = client.get('lastSeen')
+    return str(last_seen)[:32] if last_seen is not None else None
@@ -0,0 +1,129 @@
+import logging
+from collections import namedtuple
+
+Mapping = namedtuple('Mapping', ['hostname', 'ip'])
+
+
+class SyncPlan(namedtuple('SyncPlan', ['adds', 'deletes', 'unchanged', 'conflicts'])):
+    """
+    The Pi-hole writes a sync needs: mappings to delete, then mappings to add.
+    `conflicts` are client claims that lost to another client with the same
+    IP or hostname.
+    """
+
+    @property
+    def writes(self):
+        return len(self.adds) + len(self.deletes)
+
+    def summary(self):
+        return {
+            'adds': len(self.adds),
+            'deletes': len(self.deletes),
+            'unchanged': self.unchanged,
+            'conflicts': len(self.conflicts),
+        }
+
+
+def normalize_hostname(hostname):
+    """
+    Lower-case a hostname and strip whitespace and the trailing dot, as Pi-hole
+    stores it. Returns None for an empty hostname.
+    """
+    if not hostname:
+        return None
+    hostname = str(hostname).strip().rstrip('.').lower()
+    return hostname or None
+
+
+def normalize_pihole_mappings(mappings):
+    """
+    The set of Mappings in a Pi-hole custom DNS list. Accepts the legacy API's
+    [domain, ip] pairs as well as dicts with 'domain' or 'hostname' and 'ip'.
+    """
+    current = set()
+    for mapping in mappings:
+        if isinstance(mapping, dict):
+            hostname, ip = mapping.get('domain') or mapping.get('hostname'), mapping.get('ip')
+        else:
+            hostname, ip = mapping
+        hostname = normalize_hostname(hostname)
+        if hostname and ip:
+            current.add(Mapping(hostname, ip))
+    return current
+
+
+def desired_mappings(clients):
+    """
+    The Mappings the Meraki clients call for, with collisions resolved the same
+    way whatever the order of `clients`: an IP or a hostname goes to the most
+    recently seen client, and on a tie to the greatest (hostname, IP). Clients
+    are consumed one by one, so `clients` can be a stream. Returns the set of
+    Mappings and the sorted list of the claims that lost.
+    """
+    by_ip = {}
+    conflicts = set()
+    for client in clients:
+        hostname = normalize_hostname(client.get('dhcpHostname'))
+        ip = client.get('ip')
+        if not hostname or not ip:
+            continue
+        rank = (str(client.get('lastSeen') or ''), hostname)
+        held = by_ip.get(ip)
+        if held is None or rank > held[0]:
+            if held is not None and held[1] != hostname:
+                conflicts.add(Mapping(held[1], ip))
+            by_ip[ip] = (rank, hostname)
+        elif held[1] != hostname:
+            conflicts.add(Mapping(hostname, ip))
+
+    by_hostname = {}
+    for ip, (rank, hostname) in by_ip.items():
+        claim = (rank[0], ip)
+        held = by_hostname.get(hostname)
+        if held is None or claim > held:
+            if held is not None:
+                conflicts.add(Mapping(hostname, held[1]))
+            by_hostname[hostname] = claim
+        else:
+            conflicts.add(Mapping(hostname, ip))
+    desired = {Mapping(hostname, ip) for hostname, (_, ip) in by_hostname.items()}
+    return desired, sorted(conflicts)
+
+
+def plan_sync(desired, current, prune=True, conflicts=()):
+    """
+    The minimal set of writes that turns the `current` Pi-hole Mappings into
+    the `desired` ones. A current mapping of a desired hostname to another IP
+    is always deleted; other mappings missing from `desired` are deleted only
+    if `prune` is set.
+    """
+    desired_hostnames = {mapping.hostname for mapping in desired}
+    adds = sorted(desired - current)
+    deletes = sorted(mapping for mapping in current - desired
+                     if prune or mapping.hostname in desired_hostnames)
+    return SyncPlan(adds=adds, deletes=deletes, unchanged=len(desired & current), conflicts=list(conflicts))
+
+
+def sync_dns(clients, pihole_mappings, pihole, prune=True, dry_run=False, journal=None):
+    """
+    Plan the sync of the Meraki `clients` into the Pi-hole custom DNS list
+    `pihole_mappings` and, unless `dry_run` is set, apply it with the
+    PiholeClient `pihole`, through `journal` (a DnsJournal) if given. Returns
+    the plan and the PiholeReport, which is None for a dry run or when there
+    was nothing to write.
+    """
+    if journal is not None:
+        clients = journal.track(clients)
+    desired, conflicts = desired_mappings(clients)
+    current = normalize_pihole_mappings(pihole_mappings)
+    plan = plan_sync(desired, current, prune=prune, conflicts=conflicts)
+    for mapping in plan.conflicts:
+        logging.warning(f"Not mapping {mapping.hostname} to {mapping.ip}, another client claims the name or address")
+    logging.info(f"DNS sync plan{' (dry run)' if dry_run else ''}: {plan.summary()}")
+    if dry_run:
+        return plan, None
+    if journal is not None:
+        return plan, journal.sync(pihole, plan, desired, current, prune)
+    if not plan.writes:
+        return plan, None
+    return plan, pihole.apply(adds=plan.adds, deletes=plan.deletes)
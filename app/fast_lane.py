@@ -0,0 +1,132 @@
+import logging
+from datetime import datetime, timedelta
+from . import db
+from .lru import LRUCache
+from .models import Client
+
+
+class FastLane:
+    """
+    Sends recently granted clients straight to Meraki's grant URL.
+
+    A MAC that went through /connect within `window` seconds skips the splash
+    page and its timer. Grants are recorded in `Client.last_granted` and kept
+    in a per-worker hot set so that most fast-lane checks never hit the DB.
+    MACs the DB had no grant for are remembered for `miss_ttl` seconds, so a
+    client that keeps probing before it connects is not looked up every time.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.window = 0
+        self.miss_ttl = 0
+        self._hot = LRUCache()
+        self._misses = LRUCache()
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('FAST_LANE_ENABLED', False)
+        self.window = app.config.get('FAST_LANE_WINDOW_SECONDS', 3600)
+        self.miss_ttl = app.config.get('FAST_LANE_MISS_TTL', 30)
+        max_size = app.config.get('FAST_LANE_MAX_ENTRIES', 50000)
+        self._hot = LRUCache(max_size=max_size, ttl=self.window)
+        self._misses = LRUCache(max_size=max_size, ttl=self.miss_ttl)
+        self._reset_counters()
+        logging.info(f"Fast lane enabled: {self.enabled}")
+
+    def _reset_counters(self):
+        self.lookups = 0
+        self.memory_hits = 0
+        self.memory_misses = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def cutoff(self):
+        return datetime.utcnow() - timedelta(seconds=self.window)
+
+    def is_granted(self, mac_address):
+        """
+        Return True if the MAC was granted access within the fast-lane window.
+        """
+        if not self.enabled:
+            return False
+        if self.check_hot(mac_address):
+            return True
+        if self.check_miss(mac_address):
+            return False
+        client = Client.query.filter_by(mac_address=mac_address).first()
+        return self.check_record(mac_address, client.last_granted if client else None)
+
+    def check_hot(self, mac_address):
+        """
+        Return True if the MAC is in the hot set with a grant inside the window.
+        """
+        self.lookups += 1
+        granted_at = self._hot.get(mac_address)
+        if granted_at is not None and granted_at >= self.cutoff():
+            self.memory_hits += 1
+            return True
+        return False
+
+    def check_miss(self, mac_address):
+        """
+        Return True if the DB recently had no grant for the MAC.
+        """
+        if self.miss_ttl and self._misses.get(mac_address):
+            self.memory_misses += 1
+            self.misses += 1
+            return True
+        return False
+
+    def check_record(self, mac_address, last_granted):
+        """
+        Return True if the stored grant time is inside the window. The answer
+        is cached either way.
+        """
+        if last_granted is not None and last_granted >= self.cutoff():
+            self._hot.set(mac_address, last_granted)
+            self.db_hits += 1
+            return True
+        if self.miss_ttl:
+            self._misses.set(mac_address, True)
+        self.misses += 1
+        return False
+
+    def record_grant(self, mac_address):
+        """
+        Remember that the MAC has just been sent to its grant URL.
+
+        Only an existing Client row is updated: a client whose sighting has
+        not been written yet (see SightingBuffer) gets no last_granted, and
+        is fast-laned by this worker's hot set alone.
+        """
+        if not self.enabled or not mac_address:
+            return
+        now = datetime.utcnow()
+        Client.query.filter_by(mac_address=mac_address).update({'last_granted': now})
+        db.session.commit()
+        self.remember(mac_address, now)
+
+    def remember(self, mac_address, granted_at):
+        self._hot.set(mac_address, granted_at)
+        self._misses.pop(mac_address)
+
+    def stats(self):
+        hits = self.memory_hits + self.db_hits
+        return {
+            'enabled': self.enabled,
+            'window': self.window,
+            'cutoff': self.cutoff(),
+            'lookups': self.lookups,
+            'hits': hits,
+            'memory_hits': self.memory_hits,
+            'memory_misses': self.memory_misses,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': round(100.0 * hits / self.lookups, 1) if self.lookups else 0.0,
+        }
+
+
+fast_lane = FastLane()
@@ -0,0 +1,42 @@
+import logging
+from time import time
+import jwt
+from flask import current_app
+
+# Tokens are issued with an expiry aligned to this many seconds, so repeat
+# probes from the same client within a bucket get a byte-identical page.
+EXPIRY_BUCKET_SECONDS = 60
+# Password reset tokens are signed with the same key, so grant tokens name
+# their purpose and only tokens with this audience are accepted
+AUDIENCE = 'meraki-captive-portal:grant'
+
+
+def issue_grant_token(grant_url, client_mac=None, expires_in=None):
+    """
+    Sign Meraki's grant URL (and the client MAC) into a short-lived token
+    that can be carried in the /connect URL instead of the session.
+    """
+    if expires_in is None:
+        expires_in = current_app.config.get('GRANT_TOKEN_MAX_AGE', 3600)
+    expires_at = (int(time()) // EXPIRY_BUCKET_SECONDS + 1) * EXPIRY_BUCKET_SECONDS + expires_in
+    payload = {'grant': grant_url, 'aud': AUDIENCE, 'exp': expires_at}
+    if client_mac:
+        payload['mac'] = client_mac
+    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+
+
+def verify_grant_token(token):
+    """
+    Return the token's claims, or None if it is invalid, has expired or is
+    not a grant token.
+    """
+    try:
+        claims = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'], audience=AUDIENCE,
+                            options={'require': ['exp', 'aud', 'grant']})
+    except jwt.PyJWTError as e:
+        logging.warning(f"Rejected grant token: {e}")
+        return None
+    if not isinstance(claims['grant'], str):
+        logging.warning("Rejected grant token: the grant claim is not a URL")
+        return None
+    return claims
@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from .meraki_dashboard import get_dashboard
+
+
+class InventoryIndex:
+    """
+    In-process index of the organization's devices.
+
+    One org-wide `getOrganizationDevices` call is indexed by network and
+    product type and by serial, so per-network device lookups are dictionary
+    reads. The index is built on first use and refreshed every
+    `refresh_interval` seconds by a background thread in each worker.
+    """
+
+    def __init__(self, app=None):
+        self.refresh_interval = 900
+        self._by_network = {}
+        self._by_serial = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.stop()
+        self.refresh_interval = app.config.get('INVENTORY_REFRESH_SECONDS', 900)
+        self._by_network = {}
+        self._by_serial = {}
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.org_id = None
+        self.updated = None
+        self._load_attempted = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.lookups = 0
+
+    def refresh(self, dashboard=None, org_id=None):
+        """
+        Rebuild the index from one org-wide devices call. Returns False if the
+        dashboard is not configured or the call failed; the old index is kept.
+        """
+        dashboard = dashboard or get_dashboard()
+        org_id = org_id or os.environ.get('MERAKI_ORG_ID')
+        if not dashboard or not org_id:
+            return False
+        with self._refresh_lock:
+            try:
+                devices = dashboard.organizations.getOrganizationDevices(org_id, total_pages='all')
+            except Exception as e:
+                self.refresh_errors += 1
+                logging.error(f"Meraki API error refreshing device inventory: {e}")
+                return False
+
+            by_network, by_serial = {}, {}
+            for device in devices:
+                by_serial[device['serial']] = device
+                key = (device.get('networkId'), _product_type(device))
+                by_network.setdefault(key, []).append(device)
+            with self._lock:
+                self._by_network = by_network
+                self._by_serial = by_serial
+                self.org_id = org_id
+                self.updated = datetime.utcnow()
+                self.refreshes += 1
+        logging.info(f"Indexed {len(by_serial)} Meraki devices in {len(by_network)} network/product groups")
+        return True
+
+    def _ensure_loaded(self):
+        # Like the sighting flusher, the refresher is started lazily so every
+        # forked worker runs its own
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                    self._stopping.clear()
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name='inventory-refresher', daemon=True)
+                    self._thread.start()
+        self.load()
+
+    def load(self, dashboard=None):
+        """
+        Build the index if it has never been built. After a failed attempt,
+        lookups leave retrying to the refresher thread for `refresh_interval`
+        seconds rather than all queueing up for another org-wide call.
+        """
+        if self.updated is not None:
+            return True
+        if self._load_attempted is not None and time.monotonic() - self._load_attempted < self.refresh_interval:
+            return False
+        self._load_attempted = time.monotonic()
+        return self.refresh(dashboard)
+
+    def _run(self):
+        while not self._stopping.wait(self.refresh_interval):
+            self.refresh()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def devices(self, network_id, product_type=None):
+        """
+        Devices in a network, optionally only those of one product type
+        (appliance, wireless, switch, ...).
+        """
+        self._ensure_loaded()
+        self.lookups += 1
+        if product_type is not None:
+            return list(self._by_network.get((network_id, product_type), ()))
+        return [device for (network, _), devices in self._by_network.items() if network == network_id
+                for device in devices]
+
+    def appliance(self, network_id):
+        """
+        The first security appliance (MX) in a network, or None.
+        """
+        appliances = self.devices(network_id, 'appliance')
+        return appliances[0] if appliances else None
+
+    def device(self, serial):
+        self._ensure_loaded()
+        self.lookups += 1
+        return self._by_serial.get(serial)
+
+    def stats(self):
+        return {
+            'org_id': self.org_id,
+            'devices': len(self._by_serial),
+            'updated': self.updated,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'lookups': self.lookups,
+            'refresh_interval': self.refresh_interval,
+        }
+
+
+def _product_type(device):
+    # Older API responses have no productType, so fall back to the model name
+    product_type = device.get('productType')
+    if product_type:
+        return product_type
+    model = device.get('model', '')
+    if model.startswith(('MX', 'Z')):
+        return 'appliance'
+    if model.startswith(('MR', 'CW')):
+        return 'wireless'
+    if model.startswith('MS'):
+        return 'switch'
+    return 'other'
+
+
+inventory = InventoryIndex()
@@ -0,0 +1,106 @@
+import inspect
+import logging
+import threading
+import time
+from functools import wraps
+from flask import current_app, has_app_context
+from . import cache
+
+# Seconds a failed lookup (a None result) is cached, so that one API error does
+# not hide the data for the whole lifetime of a result
+ERROR_TIMEOUT = 30
+
+_refreshing: set[str] = set()
+_refreshing_lock = threading.Lock()
+
+
+def cache_is_shared(app=None):
+    """
+    Whether the app's cache backend is a server every worker talks to (Redis
+    or Memcached), so that what one worker stores or deletes is seen by all.
+    SimpleCache and the other in-process backends are per worker.
+    """
+    app = app or current_app
+    name = type(app.extensions.get('cache', {}).get(cache)).__name__
+    return 'Redis' in name or 'Memcached' in name
+
+
+def memoize(timeout, stale=0, ignore=('dashboard',), error_timeout=ERROR_TIMEOUT):
+    """
+    Cache a function's result in the Flask cache, keyed on its arguments.
+
+    A result is fresh for `timeout` seconds. For another `stale` seconds after
+    that, callers get the old result immediately while a background thread
+    refreshes it. Arguments named in `ignore` (the dashboard client) are left
+    out of the key. `timeout` may also be a callable returning the seconds,
+    which is called with the app context pushed each time a result is stored.
+    A None result signals a failed lookup: it is only kept for
+    `error_timeout` seconds, and a background refresh that returns None
+    leaves the stale result in place.
+
+    The wrapped function gets an `invalidate(*args, **kwargs)` method that drops
+    the cached result for those arguments. Outside an app context the function
+    is simply called.
+    """
+    def decorator(f):
+        signature = inspect.signature(f)
+        prefix = f"memo:{f.__module__}.{f.__qualname__}"
+
+        def make_key(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs)
+            bound.apply_defaults()
+            parts = [f"{name}={value!r}" for name, value in bound.arguments.items() if name not in ignore]
+            return f"{prefix}({','.join(parts)})"
+
+        def store(key, value):
+            if value is None:
+                cache.set(key, (value, time.time() + error_timeout), timeout=error_timeout)
+                return
+            fresh_for = timeout() if callable(timeout) else timeout
+            cache.set(key, (value, time.time() + fresh_for), timeout=fresh_for + stale)
+
+        def refresh(app, key, args, kwargs):
+            try:
+                with app.app_context():
+                    value = f(*args, **kwargs)
+                    if value is None:
+                        logging.warning(f"Background refresh of {key} failed, keeping the stale result")
+                        return
+                    store(key, value)
+                logging.debug(f"Refreshed {key}")
+            except Exception as e:
+                logging.error(f"Background refresh of {key} failed: {e}", exc_info=True)
+            finally:
+                with _refreshing_lock:
+                    _refreshing.discard(key)
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not has_app_context():
+                return f(*args, **kwargs)
+            key = make_key(*args, **kwargs)
+            entry = cache.get(key)
+            if entry is None:
+                value = f(*args, **kwargs)
+                store(key, value)
+                return value
+
+            value, fresh_until = entry
+            if time.time() >= fresh_until:
+                # Serve the stale value and refresh it once, off the request path
+                with _refreshing_lock:
+                    start = key not in _refreshing
+                    _refreshing.add(key)
+                if start:
+                    threading.Thread(target=refresh, daemon=True,
+                                     args=(current_app._get_current_object(), key, args, kwargs)).start()
+            return value
+
+        def invalidate(*args, **kwargs):
+            if has_app_context():
+                cache.delete(make_key(*args, **kwargs))
+
+        wrapper.invalidate = invalidate
+        wrapper.make_key = make_key
+        return wrapper
+    return decorator
@@ -1,18 +1,124 @@
 import meraki
 import os
 import logging
+import threading
+from collections import namedtuple
+from .rate_limit import call_limited, rate_limits
+
+SharedDashboard = namedtuple('SharedDashboard', ['pid', 'api_key', 'dashboard'])
+
+_shared = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # A forked gunicorn worker must not reuse the parent's connections
+    global _shared, _lock
+    _shared = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
 
 def get_dashboard():
     """
-    Initializes and returns a Meraki Dashboard API instance.
+    Returns the process-wide Meraki Dashboard API instance, creating it on
+    first use. The instance keeps a pooled keep-alive HTTP session; it is
+    rebuilt in a new process or when MERAKI_API_KEY changes. Every API call
+    made through it is rate limited, see `LimitedDashboard`.
     """
     api_key = os.environ.get('MERAKI_API_KEY')
     if not api_key:
         logging.warning("MERAKI_API_KEY not found in environment variables.")
         return None
 
+    shared = _shared
+    if shared is not None and shared.pid == os.getpid() and shared.api_key == api_key:
+        return shared.dashboard
+
+    with _lock:
+        return _build(api_key)
+
+
+def _build(api_key):
+    global _shared
+    shared = _shared
+    if shared is not None and shared.pid == os.getpid() and shared.api_key == api_key:
+        return shared.dashboard
+
     # Suppress informational logging from the Meraki library
     logging.getLogger('meraki').setLevel(logging.WARNING)
 
-    dashboard = meraki.DashboardAPI(api_key, suppress_logging=True)
+    dashboard = meraki.DashboardAPI(
+        api_key,
+        suppress_logging=True,
+        single_request_timeout=int(os.environ.get('MERAKI_REQUEST_TIMEOUT') or 60),
+        maximum_retries=int(os.environ.get('MERAKI_MAXIMUM_RETRIES') or 5),
+        # 429s are handled by the shared limiter rather than by sleeping in the SDK
+        wait_on_rate_limit=False,
+    )
+    _configure_pool(dashboard, int(os.environ.get('MERAKI_POOL_SIZE') or 10))
+    dashboard = LimitedDashboard(dashboard)
+    if shared is not None and shared.pid == os.getpid():
+        logging.info("MERAKI_API_KEY changed, rebuilding the Meraki dashboard client")
+    _shared = SharedDashboard(os.getpid(), api_key, dashboard)
     return dashboard
+
+
+def _configure_pool(dashboard, pool_size):
+    """
+    Size the dashboard session's connection pool. Older SDK releases use a
+    requests session, newer ones an httpx client.
+    """
+    session = getattr(dashboard, '_session', None)
+    try:
+        if hasattr(session, '_req_session'):
+            from requests.adapters import HTTPAdapter
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session._req_session.mount('https://', adapter)
+        elif hasattr(session, '_client'):
+            import httpx
+            client = session._client
+            session._client = httpx.Client(
+                timeout=client.timeout,
+                headers=client.headers,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+            client.close()
+    except Exception as e:
+        logging.warning(f"Could not configure the Meraki connection pool: {e}")
+
+
+class LimitedDashboard:
+    """
+    Wraps a DashboardAPI so that every call on its API sections
+    (`dashboard.organizations.getOrganizationNetworks(...)` and so on) draws
+    from the organization's shared rate limiter and retries after a 429.
+    Private attributes such as `_session` are passed through unwrapped.
+    """
+
+    def __init__(self, dashboard):
+        self._dashboard = dashboard
+
+    def __getattr__(self, name):
+        attribute = getattr(self._dashboard, name)
+        if name.startswith('_'):
+            return attribute
+        return _LimitedSection(attribute)
+
+
+class _LimitedSection:
+    def __init__(self, section):
+        self._section = section
+
+    def __getattr__(self, name):
+        method = getattr(self._section, name)
+        if name.startswith('_') or not callable(method):
+            return method
+
+        def limited(*args, **kwargs):
+            limiter = rate_limits.limiter(os.environ.get('MERAKI_ORG_ID') or 'default')
+            return call_limited(limiter, method, *args, **kwargs)
+        return limited
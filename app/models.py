@@ -8,11 +8,79 @@ from flask import current_app
 
 class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    mac_address = db.Column(db.String(17), nullable=False)
+    mac_address = db.Column(db.String(17), nullable=False, index=True, unique=True)
     ip_address = db.Column(db.String(15), nullable=False)
     user_agent = db.Column(db.String(255), nullable=True)
     first_seen = db.Column(db.DateTime, default=datetime.utcnow)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    last_granted = db.Column(db.DateTime, nullable=True)
+
+class NetworkSyncCursor(db.Model):
+    network_id = db.Column(db.String(64), primary_key=True)
+    last_synced = db.Column(db.DateTime, nullable=False)
+
+class ProvisionedState(db.Model):
+    key = db.Column(db.String(128), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class SyncRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    trigger = db.Column(db.String(16), nullable=False)
+    dry_run = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)
+    queued_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    adds = db.Column(db.Integer, nullable=False, default=0)
+    deletes = db.Column(db.Integer, nullable=False, default=0)
+    unchanged = db.Column(db.Integer, nullable=False, default=0)
+    conflicts = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(255), nullable=True)
+
+    @property
+    def duration(self):
+        if self.started_at is None:
+            return None
+        return ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'trigger': self.trigger,
+            'dry_run': self.dry_run,
+            'status': self.status,
+            'queued_at': self.queued_at.isoformat() + 'Z',
+            'started_at': self.started_at.isoformat() + 'Z' if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() + 'Z' if self.finished_at else None,
+            'duration': round(self.duration, 1) if self.duration is not None else None,
+            'adds': self.adds,
+            'deletes': self.deletes,
+            'unchanged': self.unchanged,
+            'conflicts': self.conflicts,
+            'errors': self.errors,
+            'message': self.message,
+        }
+
+class DnsMapping(db.Model):
+    hostname = db.Column(db.String(253), primary_key=True)
+    ip = db.Column(db.String(45), nullable=False)
+    mac = db.Column(db.String(17), nullable=True, index=True)
+    last_seen = db.Column(db.String(32), nullable=True)
+    last_pushed = db.Column(db.DateTime, nullable=True)
+    checksum = db.Column(db.String(64), nullable=False)
+
+class SyncJournalEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('sync_run.id'), nullable=False, index=True)
+    action = db.Column(db.String(8), nullable=False)
+    hostname = db.Column(db.String(253), nullable=False)
+    ip = db.Column(db.String(45), nullable=False)
+    mac = db.Column(db.String(17), nullable=True)
+    last_seen = db.Column(db.String(32), nullable=True)
+    status = db.Column(db.String(8), nullable=False, default='pending')
+    error = db.Column(db.String(255), nullable=True)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -1,40 +1,390 @@
-import requests
+import logging
 import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .dns_sync import normalize_hostname
+
+
+class PiholeError(Exception):
+    pass
+
+
+class PiholeReport:
+    """
+    Outcome of a batch of Pi-hole writes.
+    """
+
+    def __init__(self):
+        self.added = 0
+        self.deleted = 0
+        self.failed = []
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def summary(self):
+        return {
+            'added': self.added,
+            'deleted': self.deleted,
+            'failed': len(self.failed),
+            'elapsed_ms': round(self.elapsed * 1000, 1),
+        }
+
+
+class _SessionExpired(Exception):
+    pass
+
+
+class LegacyBackend:
+    """
+    The custom DNS API of Pi-hole v5 (admin/api.php): one GET per read or
+    write, with the API key in the query string. Batches of writes run on up
+    to `max_workers` threads of the client.
+    """
+
+    version = 5
+    bulk = False
+
+    def __init__(self, client, api_url):
+        self.client = client
+        self.api_url = api_url if api_url.endswith('.php') else f"{base_url(api_url)}/admin/api.php"
+
+    def _call(self, action, **params):
+        client = self.client
+        try:
+            response = client.session.get(self.api_url, timeout=client.timeout,
+                                          params={'customdns': '', 'action': action, **params, 'auth': client.api_key})
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise PiholeError(client.mask(e)) from None
+        if isinstance(data, dict) and data.get('success') is False:
+            raise PiholeError(data.get('message') or f"Pi-hole refused {action}")
+        return data
+
+    def get_mappings(self):
+        data = self._call('get')
+        return [{'ip': ip, 'hostname': domain} for domain, ip in data.get('data', [])]
+
+    def add(self, ip, hostname):
+        self._call('add', ip=ip, domain=hostname)
+
+    def delete(self, ip, hostname):
+        self._call('delete', ip=ip, domain=hostname)
+
+    def apply(self, adds, deletes):
+        report = PiholeReport()
+        lock = threading.Lock()
+
+        def write(action, mapping):
+            try:
+                getattr(self, action)(mapping.ip, mapping.hostname)
+            except PiholeError as e:
+                logging.error(f"Error {'adding' if action == 'add' else 'deleting'} Pi-hole mapping "
+                              f"{mapping.hostname} -> {mapping.ip}: {e}")
+                with lock:
+                    report.failed.append((action, mapping, str(e)))
+                return
+            with lock:
+                if action == 'add':
+                    report.added += 1
+                else:
+                    report.deleted += 1
+
+        with ThreadPoolExecutor(max_workers=self.client.max_workers, thread_name_prefix='pihole') as pool:
+            # Deletes finish first, so a hostname that moved can be added again
+            list(pool.map(lambda mapping: write('delete', mapping), deletes))
+            list(pool.map(lambda mapping: write('add', mapping), adds))
+        return report
+
+    def close(self):
+        pass
+
+
+class V6Backend:
+    """
+    The REST API of Pi-hole v6 (/api). The API key, which should be an app
+    password, is exchanged for a session ID once and sent in a header rather
+    than in the URL; an expired session is renewed on the next call. A batch
+    of writes replaces the dns.hosts list in a single request.
+    """
+
+    version = 6
+    bulk = True
+
+    def __init__(self, client, api_url):
+        self.client = client
+        self.base_url = base_url(api_url)
+        self._sid = None
+        self._login_lock = threading.Lock()
+
+    def _login(self, expired=None):
+        with self._login_lock:
+            # Another thread may already have renewed the session
+            if self._sid is not None and self._sid != expired:
+                return self._sid
+            data = self._send('POST', '/auth', json={'password': self.client.api_key})
+            session = data.get('session') or {}
+            if not session.get('valid'):
+                raise PiholeError(session.get('message') or 'Pi-hole rejected the API key')
+            # A Pi-hole without a password hands out no session ID
+            self._sid = session.get('sid') or ''
+            return self._sid
+
+    def _send(self, method, path, sid=None, **kwargs):
+        client = self.client
+        headers = {'X-FTL-SID': sid} if sid else {}
+        try:
+            response = client.session.request(method, f"{self.base_url}/api{path}", headers=headers,
+                                              timeout=client.timeout, **kwargs)
+            data = response.json() if response.content else {}
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise PiholeError(client.mask(e)) from None
+        if response.status_code == 401 and path != '/auth':
+            raise _SessionExpired()
+        if response.status_code >= 400 and not (path == '/auth' and response.status_code == 401):
+            error = data.get('error') if isinstance(data, dict) else None
+            raise PiholeError((error or {}).get('message') or f"Pi-hole returned {response.status_code} for {method} {path}")
+        return data
+
+    def _request(self, method, path, **kwargs):
+        sid = self._sid if self._sid is not None else self._login()
+        try:
+            return self._send(method, path, sid=sid, **kwargs)
+        except _SessionExpired:
+            pass
+        try:
+            return self._send(method, path, sid=self._login(expired=sid), **kwargs)
+        except _SessionExpired:
+            raise PiholeError(f"Pi-hole refused the new session for {method} {path}") from None
+
+    def hosts(self):
+        """
+        The dns.hosts entries as (ip, [hostname, ...]) pairs.
+        """
+        data = self._request('GET', '/config/dns/hosts')
+        entries = ((data.get('config') or {}).get('dns') or {}).get('hosts') or []
+        return [(fields[0], fields[1:]) for fields in (entry.split() for entry in entries) if len(fields) > 1]
+
+    def get_mappings(self):
+        return [{'ip': ip, 'hostname': hostname} for ip, hostnames in self.hosts() for hostname in hostnames]
+
+    def _entry_path(self, ip, hostname):
+        return '/config/dns/hosts/' + quote(f"{ip} {hostname}", safe='')
+
+    def add(self, ip, hostname):
+        self._request('PUT', self._entry_path(ip, hostname))
+
+    def delete(self, ip, hostname):
+        self._request('DELETE', self._entry_path(ip, hostname))
+
+    def apply(self, adds, deletes):
+        deleted = {(mapping.ip, normalize_hostname(mapping.hostname)) for mapping in deletes}
+        entries = []
+        present = set()
+        for ip, hostnames in self.hosts():
+            # Keep the other hostnames of an entry, in their original spelling
+            kept = [hostname for hostname in hostnames if (ip, normalize_hostname(hostname)) not in deleted]
+            if kept:
+                entries.append(' '.join([ip, *kept]))
+                present.update((ip, normalize_hostname(hostname)) for hostname in kept)
+        entries.extend(f"{mapping.ip} {mapping.hostname}" for mapping in adds
+                       if (mapping.ip, normalize_hostname(mapping.hostname)) not in present)
+        # All or nothing: a failure is raised and reported for every mapping
+        self._request('PATCH', '/config', json={'config': {'dns': {'hosts': entries}}})
+        report = PiholeReport()
+        report.added, report.deleted = len(adds), len(deletes)
+        return report
+
+    def close(self):
+        # Free the session, Pi-hole only allows a few at a time
+        if self._sid:
+            try:
+                self._send('DELETE', '/auth', sid=self._sid)
+            except PiholeError as e:
+                logging.warning(f"Error logging out of Pi-hole: {e}")
+            self._sid = None
+
+
+def base_url(api_url):
+    """
+    The Pi-hole address in a PIHOLE_API_URL that points at either API, e.g.
+    http://pihole for http://pihole/admin/api.php or http://pihole/api.
+    """
+    url = api_url.rstrip('/')
+    for suffix in ('/admin/api.php', '/api'):
+        if url.endswith(suffix):
+            return url[:-len(suffix)]
+    return url
+
+
+class PiholeClient:
+    """
+    Client for the Pi-hole local DNS records.
+
+    Requests go through one keep-alive session whose connection pool has room
+    for `max_workers` connections. Connection errors and 429/5xx responses are
+    retried up to `retries` times with exponential back-off. With
+    `api_version` 'auto', the first call checks whether the Pi-hole serves the
+    v6 REST API and otherwise falls back to the legacy admin/api.php.
+    """
+
+    backends = {'5': LegacyBackend, '6': V6Backend}
+
+    def __init__(self, api_url, api_key, timeout=5, retries=2, max_workers=8, api_version='auto'):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.api_version = api_version
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self.session = requests.Session()
+        # PATCH replaces the whole hosts list, so it is as safe to retry as PUT
+        retry = Retry(total=retries, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {'PATCH'}, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def mask(self, error):
+        # The legacy API key is a query parameter, keep it out of the logs
+        return str(error).replace(self.api_key, '***')
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    version = self.detect_version() if self.api_version == 'auto' else str(self.api_version)
+                    if version not in self.backends:
+                        raise PiholeError(f"Unsupported Pi-hole API version {version}")
+                    self._backend = self.backends[version](self, self.api_url)
+                    logging.info(f"Using the Pi-hole v{version} API at {base_url(self.api_url)}")
+        return self._backend
+
+    @property
+    def bulk(self):
+        """
+        Whether apply() makes a batch of any size in one request.
+        """
+        return self.backend.bulk
+
+    def detect_version(self):
+        """
+        '6' if the Pi-hole answers /api/auth like the v6 REST API, else '5'.
+        """
+        try:
+            response = self.session.get(f"{base_url(self.api_url)}/api/auth", timeout=self.timeout)
+            data = response.json() if response.status_code in (200, 401) else None
+        except ValueError:
+            data = None
+        except requests.exceptions.RequestException as e:
+            raise PiholeError(self.mask(e)) from None
+        return '6' if isinstance(data, dict) and 'session' in data else '5'
+
+    def get_mappings(self):
+        """
+        The custom DNS mappings as dicts with 'ip' and 'hostname'.
+        """
+        return self.backend.get_mappings()
+
+    def add(self, ip, hostname):
+        self.backend.add(ip, hostname)
+
+    def delete(self, ip, hostname):
+        self.backend.delete(ip, hostname)
+
+    def apply(self, adds=(), deletes=()):
+        """
+        Delete and then add (hostname, ip) mappings: with the legacy API one
+        request per mapping, `max_workers` at a time, with the v6 API as one
+        update of the hosts list. Failed writes are collected in the returned
+        PiholeReport rather than raised.
+        """
+        started = time.monotonic()
+        try:
+            report = self.backend.apply(list(adds), list(deletes))
+        except PiholeError as e:
+            logging.error(f"Error applying Pi-hole changes: {e}")
+            # Nothing was written
+            report = PiholeReport()
+            report.failed = ([('delete', mapping, str(e)) for mapping in deletes]
+                             + [('add', mapping, str(e)) for mapping in adds])
+        report.elapsed = time.monotonic() - started
+        logging.info(f"Applied Pi-hole changes: {report.summary()}")
+        return report
+
+    def close(self):
+        if self._backend is not None:
+            self._backend.close()
+        self.session.close()
+
+
+SharedPihole = namedtuple('SharedPihole', ['pid', 'api_url', 'api_key', 'api_version', 'client'])
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_pihole_client():
+    """
+    The process-wide Pi-hole client, or None if PIHOLE_API_URL or
+    PIHOLE_API_KEY is not set. Like the dashboard client it is rebuilt in a
+    new process or when the settings change.
+    """
+    global _shared
+    api_url = os.environ.get('PIHOLE_API_URL')
+    api_key = os.environ.get('PIHOLE_API_KEY')
+    api_version = os.environ.get('PIHOLE_API_VERSION') or 'auto'
+    if not api_url or not api_key:
+        return None
+    with _shared_lock:
+        shared = _shared
+        if shared is None or shared[:4] != (os.getpid(), api_url, api_key, api_version):
+            client = PiholeClient(
+                api_url, api_key,
+                timeout=float(os.environ.get('PIHOLE_TIMEOUT') or 5),
+                retries=int(os.environ.get('PIHOLE_RETRIES') or 2),
+                max_workers=int(os.environ.get('PIHOLE_CONCURRENCY') or 8),
+                api_version=api_version,
+            )
+            shared = _shared = SharedPihole(os.getpid(), api_url, api_key, api_version, client)
+        return shared.client
+
 
 def get_pihole_mappings():
-    pihole_api_url = os.environ.get('PIHOLE_API_URL')
-    pihole_api_key = os.environ.get('PIHOLE_API_KEY')
-    if not pihole_api_url or not pihole_api_key:
+    pihole = get_pihole_client()
+    if pihole is None:
         return []
-
     try:
-        response = requests.get(f"{pihole_api_url}?customdns&auth={pihole_api_key}", timeout=5)
-        response.raise_for_status()
-        return response.json().get('data', [])
-    except requests.exceptions.RequestException as e:
-        print(f"Error getting Pi-hole mappings: {e}")
+        return pihole.get_mappings()
+    except PiholeError as e:
+        logging.error(f"Error getting Pi-hole mappings: {e}")
         return []
 
 def add_pihole_mapping(ip, hostname):
-    pihole_api_url = os.environ.get('PIHOLE_API_URL')
-    pihole_api_key = os.environ.get('PIHOLE_API_KEY')
-    if not pihole_api_url or not pihole_api_key:
+    pihole = get_pihole_client()
+    if pihole is None:
         return
-
     try:
-        response = requests.get(f"{pihole_api_url}?customdns&action=add&ip={ip}&domain={hostname}&auth={pihole_api_key}", timeout=5)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Error adding Pi-hole mapping: {e}")
+        pihole.add(ip, hostname)
+    except PiholeError as e:
+        logging.error(f"Error adding Pi-hole mapping: {e}")
 
 def delete_pihole_mapping(ip, hostname):
-    pihole_api_url = os.environ.get('PIHOLE_API_URL')
-    pihole_api_key = os.environ.get('PIHOLE_API_KEY')
-    if not pihole_api_url or not pihole_api_key:
+    pihole = get_pihole_client()
+    if pihole is None:
         return
-
     try:
-        response = requests.get(f"{pihole_api_url}?customdns&action=delete&ip={ip}&domain={hostname}&auth={pihole_api_key}", timeout=5)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Error deleting Pi-hole mapping: {e}")
+        pihole.delete(ip, hostname)
+    except PiholeError as e:
+        logging.error(f"Error deleting Pi-hole mapping: {e}")
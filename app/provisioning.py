@@ -0,0 +1,170 @@
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime
+import click
+import meraki
+from flask import current_app, has_app_context
+from . import db, meraki_api, utils
+from .models import ProvisionedState
+from .meraki_dashboard import get_dashboard
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:  # pragma: no cover - fcntl is not available on Windows
+    HAS_FCNTL = False
+
+DEFAULT_LOCK_FILE = '/tmp/meraki-captive-portal-provision.lock'
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Non-blocking exclusive lock on `path`. Yields True if this process holds
+    the lock, False if another process is already provisioning.
+    """
+    if not HAS_FCNTL:
+        logging.warning("File locking is not available, provisioning without a lock")
+        yield True
+        return
+    with open(path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def applied_fingerprint(key):
+    """
+    The fingerprint recorded when `key` was last provisioned, or None. Without
+    an app context nothing is recorded.
+    """
+    if not has_app_context():
+        return None
+    state = db.session.get(ProvisionedState, key)
+    return state.fingerprint if state else None
+
+
+def record_fingerprint(key, fingerprint):
+    if not has_app_context():
+        return
+    state = db.session.get(ProvisionedState, key)
+    if state is None:
+        state = ProvisionedState(key=key)
+        db.session.add(state)
+    state.fingerprint = fingerprint
+    state.applied_at = datetime.utcnow()
+    db.session.commit()
+
+
+def live_fingerprint(desired, live=None):
+    """
+    Fingerprint of `desired` together with the dashboard state `live()`
+    returns, or None if that state cannot be read.
+    """
+    if live is None:
+        return utils.fingerprint(desired)
+    try:
+        state = live()
+    except meraki.APIError as e:
+        logging.warning(f"Could not read the dashboard state to compare with: {e}")
+        return None
+    return utils.fingerprint({'desired': desired, 'live': state})
+
+
+def apply_once(key, desired, apply, force=False, live=None):
+    """
+    Run `apply` unless `desired`, and the dashboard state returned by `live`
+    (a cheap read such as the SSID list), are what they were when `key` was
+    last provisioned, so a new SSID or a change made by hand in the dashboard
+    is applied again. `apply` reads the current state and writes only what
+    differs; it returns None on failure, in which case nothing is recorded and
+    the next run tries again, and something true if it wrote, in which case
+    the live state is read again for the record. Returns True if `apply` ran.
+    """
+    fingerprint = live_fingerprint(desired, live)
+    if not force and fingerprint is not None and applied_fingerprint(key) == fingerprint:
+        logging.info(f"{key} is unchanged since it was last provisioned, skipping")
+        return False
+    result = apply()
+    if result is not None:
+        if result and live is not None:
+            fingerprint = live_fingerprint(desired, live)
+        if fingerprint is not None:
+            record_fingerprint(key, fingerprint)
+    return True
+
+
+def provision(dashboard=None, force=False):
+    """
+    Configure the Meraki network for the captive portal: add the port
+    forwarding rule if it is missing and point the configured SSIDs at the
+    splash page. Each target's desired settings are fingerprinted with a
+    summary of its live state, and targets whose fingerprint matches the last
+    applied one are not compared setting by setting or written again unless
+    `force` is set. Returns True if provisioning ran.
+    """
+    meraki_api_enabled = os.environ.get('MERAKI_API_ENABLED', 'false').lower() == 'true'
+    logging.info(f"Meraki API Enabled: {meraki_api_enabled}")
+    if not meraki_api_enabled:
+        return False
+
+    api_key = os.environ.get('MERAKI_API_KEY')
+    org_id = os.environ.get('MERAKI_ORG_ID')
+    ssid_names_str = os.environ.get('MERAKI_SSID_NAMES', '')
+    ssid_names = ssid_names_str.split(',')
+
+    logging.info(f"MERAKI_API_KEY: {'set' if api_key else 'not set'}")
+    logging.info(f"MERAKI_ORG_ID: {org_id}")
+    logging.info(f"MERAKI_SSID_NAMES: {ssid_names_str}")
+
+    if not (api_key and org_id and ssid_names):
+        logging.warning("Meraki API is enabled, but one or more required environment variables are missing.")
+        return False
+
+    logging.info("All Meraki environment variables are set, proceeding with splash page update.")
+    dashboard = dashboard or get_dashboard()
+    if not dashboard:
+        return False
+    networks = dashboard.organizations.getOrganizationNetworks(org_id)
+    network_id = meraki_api.portal_network_id(networks)
+    if network_id:
+        rule = meraki_api.desired_port_forwarding_rule()
+        if rule:
+            apply_once(f"port_forwarding:{network_id}", rule,
+                       lambda: meraki_api.add_port_forwarding_rule(dashboard, network_id), force,
+                       live=lambda: meraki_api.port_forwarding_rules(dashboard, network_id))
+        else:
+            logging.error("LAN_IP environment variable not set, cannot add port forwarding rule.")
+    for network in networks:
+        desired = dict(meraki_api.desired_splash_settings(dashboard, org_id, network['id']),
+                       ssids=sorted(ssid_names))
+        apply_once(f"splash:{network['id']}", desired,
+                   lambda network=network: meraki_api.update_network_splash_settings(
+                       dashboard, org_id, network, ssid_names), force,
+                   live=lambda network=network: meraki_api.ssid_summary(dashboard, network['id']))
+    return True
+
+
+@click.command('provision')
+@click.option('--force', is_flag=True, help='Re-read and re-apply settings even if they are unchanged.')
+def provision_command(force):
+    """Configure the Meraki network for the captive portal, once per host."""
+    lock_path = current_app.config.get('PROVISION_LOCK_FILE') or DEFAULT_LOCK_FILE
+    with file_lock(lock_path) as acquired:
+        if not acquired:
+            logging.info(f"Provisioning is already running (lock {lock_path} is held), skipping")
+            click.echo("Provisioning already in progress, skipped")
+            return
+        try:
+            ran = provision(force=force)
+        except Exception as e:
+            logging.error(f"Meraki provisioning failed: {e}", exc_info=True)
+            raise click.ClickException(f"Provisioning failed: {e}")
+    click.echo("Provisioning complete" if ran else "Provisioning skipped")
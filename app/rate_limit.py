@@ -0,0 +1,225 @@
+import logging
+import os
+import random
+import threading
+import time
+import meraki
+from .admission import TokenBucket
+from .memo import cache_is_shared
+
+# Attempts after a 429 before the error is raised to the caller
+RATE_LIMIT_RETRIES = 3
+# Upper bound of the random delay added on top of Retry-After, per attempt
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+
+class SharedWindowCounter:
+    """
+    Fixed one-second window counter whose state lives in a cache backend
+    shared by all workers.
+
+    Every worker increments the same counter for the current wall-clock
+    second, which is atomic in Redis and Memcached, and a call may proceed
+    while the counter is within `rate`. Unlike a token bucket nothing carries
+    over between windows, and up to twice `rate` calls can start around a
+    window boundary; the per-worker TokenBucket in RateLimiter smooths that.
+    """
+
+    def __init__(self, backend, key, rate):
+        self.backend = backend
+        self.key = key
+        self.rate = rate
+
+    def _window_key(self):
+        return f"{self.key}:{int(time.time())}"
+
+    def take(self):
+        key = self._window_key()
+        self.backend.add(key, 0, timeout=2)
+        used = self.backend.inc(key)
+        if used is None:
+            # The backend lost the key between add and inc; let the call through
+            return True
+        return used <= self.rate
+
+    def available(self):
+        return max(0, int(self.rate - (self.backend.get(self._window_key()) or 0)))
+
+
+class RateLimiter:
+    """
+    Blocking limiter for calls against a shared request budget, such as
+    Meraki's per-organization API rate limit.
+
+    At most `max_concurrent` calls run at once in this process and calls are
+    started at no more than `rate` per second, evenly spaced unless `burst`
+    allows more at once. With a cache `backend` the budget and any back-off
+    are shared by every worker using the same backend. After a rate-limited
+    response, `backoff` pauses callers until the Retry-After time passes.
+    """
+
+    def __init__(self, rate, burst=None, max_concurrent=4, backend=None, key='rate-limit'):
+        self.rate = rate
+        self.max_concurrent = max_concurrent
+        self.backend = backend
+        self.key = key
+        self._local = TokenBucket(burst or 1, rate)
+        self._shared = SharedWindowCounter(backend, key, rate) if backend is not None else None
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self.calls = 0
+        self.waits = 0
+        self.waited = 0.0
+        self.backoffs = 0
+
+    def _pause(self):
+        # Seconds every caller still has to hold back after a 429. The shared
+        # deadline is wall-clock time, since it is compared across processes.
+        pause = self._blocked_until - time.monotonic()
+        if self.backend is not None:
+            pause = max(pause, (self.backend.get(f"{self.key}:blocked_until") or 0) - time.time())
+        return pause
+
+    def acquire(self):
+        """
+        Block until a call may start within the rate budget.
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                pause = self._pause()
+            if pause > 0:
+                time.sleep(pause)
+                continue
+            # The local bucket spaces this worker's calls, the shared one caps all workers
+            if self._local.take():
+                if self._shared is None or self._shared.take():
+                    break
+            time.sleep(1.0 / self.rate)
+        waited = time.monotonic() - started
+        with self._lock:
+            self.calls += 1
+            if waited > 0.001:
+                self.waits += 1
+                self.waited += waited
+
+    def backoff(self, seconds):
+        """
+        Hold back every caller for `seconds`, e.g. from a Retry-After header.
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self.backoffs += 1
+        if self.backend is not None:
+            key = f"{self.key}:blocked_until"
+            until = time.time() + seconds
+            if until > (self.backend.get(key) or 0):
+                self.backend.set(key, until, timeout=int(seconds) + 1)
+        logging.warning(f"Rate limited, pausing requests for {seconds:.1f}s")
+
+    def tokens_available(self):
+        if self._shared is not None:
+            return self._shared.available()
+        return int(self._local.tokens)
+
+    def __enter__(self):
+        self._slots.acquire()
+        try:
+            self.acquire()
+        except BaseException:
+            self._slots.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self._slots.release()
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'shared': self.backend is not None,
+                'max_concurrent': self.max_concurrent,
+                'tokens_available': self.tokens_available(),
+                'calls': self.calls,
+                'waits': self.waits,
+                'waited': round(self.waited, 3),
+                'throttled': self.backoffs,
+            }
+
+
+class RateLimits:
+    """
+    Registry of the dashboard rate limiters, one per organization.
+
+    With Redis or Memcached as the app's Flask-Caching backend, limiters draw
+    from it and all gunicorn workers share one budget. With a per-process
+    cache (SimpleCache) each worker only limits itself.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self._limiters = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from . import cache
+        backend = app.extensions.get('cache', {}).get(cache)
+        shared = app.config.get('MERAKI_SHARED_RATE_LIMIT', True)
+        self.backend = backend if shared and cache_is_shared(app) else None
+        self.reset()
+        logging.info(f"Dashboard rate limit shared across workers: {self.backend is not None}")
+
+    def reset(self):
+        with self._lock:
+            self._limiters = {}
+
+    def limiter(self, name):
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                limiter = RateLimiter(rate=float(os.environ.get('MERAKI_ORG_RATE') or 9),
+                                      max_concurrent=int(os.environ.get('MERAKI_FETCH_CONCURRENCY') or 4),
+                                      backend=self.backend, key=f"meraki-rate:{name}")
+                self._limiters[name] = limiter
+            return limiter
+
+    def stats(self):
+        with self._lock:
+            return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+def retry_after(error, default=1.0):
+    """
+    Seconds to wait from the Retry-After header of a rate-limited response.
+    """
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('Retry-After', default))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+
+def call_limited(limiter, func, *args, **kwargs):
+    """
+    Call a dashboard API method within the limiter's budget. A 429 Too Many
+    Requests response pauses all callers for its Retry-After plus a random,
+    exponentially growing delay, then the call is retried.
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        with limiter:
+            try:
+                return func(*args, **kwargs)
+            except meraki.APIError as e:
+                if e.status != 429 or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                wait = retry_after(e) + random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        limiter.backoff(wait)
+
+
+rate_limits = RateLimits()
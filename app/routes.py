@@ -1,7 +1,6 @@
 import logging
 import ipaddress
 import os
-from datetime import datetime
 from flask import (
     Blueprint, render_template, request, redirect, url_for, current_app, session, flash, send_from_directory
 )
@@ -10,10 +9,18 @@ from .models import Client, User, Profile
 from . import db
 from .forms import LoginForm, RegistrationForm, ProfileForm, ResetPasswordRequestForm, ResetPasswordForm
 from flask_login import current_user, login_user, logout_user, login_required
-from .meraki_api import get_external_url, verify_port_forwarding_rule, verify_splash_page, get_meraki_clients
-from .meraki_dashboard import get_dashboard
 from .email import send_email
-from .pihole_api import get_pihole_mappings, add_pihole_mapping, delete_pihole_mapping
+from .pihole_api import get_pihole_mappings
+from .sync_scheduler import sync_scheduler
+from .sightings import record_sighting, sighting_buffer, client_debounce
+from .splash_page import splash_page
+from .fast_lane import fast_lane
+from .admission import admission
+from .inventory import inventory
+from .rate_limit import rate_limits
+from .status_poller import status_poller, snapshot_age
+from .grant_token import issue_grant_token, verify_grant_token
+from .webhooks import WebhookError, invalidate_for_alert, verify_shared_secret
 
 bp = Blueprint('routes', __name__)
 
@@ -40,26 +47,25 @@ def splash():
 
         if client_mac and client_ip:
             logging.info(f"Processing client with MAC: {client_mac} and IP: {client_ip}")
-            # Check if the client is already in the database
-            client = Client.query.filter_by(mac_address=client_mac).first()
-            if client:
-                logging.info("Client found in database, updating last_seen")
-                client.last_seen = datetime.utcnow()
-            else:
-                logging.info("Client not found, creating new entry")
-                client = Client(mac_address=client_mac, ip_address=client_ip, user_agent=user_agent)
-                db.session.add(client)
-
-            db.session.commit()
-            logging.info("Client data saved to database")
-
-            # Store redirect URL from Meraki in session
             redirect_url = request.args.get('base_grant_url')
-            session['redirect_url'] = redirect_url
-            logging.info(f"Stored redirect URL in session: {redirect_url}")
+
+            # Under overload the page is still served, but nothing is persisted
+            with admission.admit(client_mac) as admitted:
+                if admitted:
+                    record_sighting(client_mac, client_ip, user_agent)
+
+                    # Recently granted clients skip the splash page and the timer
+                    if redirect_url and fast_lane.is_granted(client_mac):
+                        logging.info(f"Fast lane grant for {client_mac}, redirecting to {redirect_url}")
+                        return redirect(redirect_url)
+
+            # Carry the redirect URL from Meraki in a signed token rather than
+            # the session, so that cookie-less captive browsers still work
+            token = issue_grant_token(redirect_url, client_mac) if redirect_url else None
+            logging.info(f"Issued grant token for redirect URL: {redirect_url}")
 
             timer_duration = current_app.config.get('SPLASH_TIMER_SECONDS', 10)
-            return render_template('splash.html', timer_duration=timer_duration)
+            return splash_page.response(timer_duration, token)
         else:
             # If Meraki data is not present, it might be a direct access attempt.
             logging.warning("Direct access to splash page without Meraki data")
@@ -73,9 +79,16 @@ def splash():
 def connect():
     """
     This route is hit after the user clicks "connect" or the timer runs out.
-    It redirects the user to their original destination.
+    It redirects the user to their original destination, taken from the signed
+    grant token in the URL or, for older pages, from the session.
     """
-    redirect_url = session.get('redirect_url', 'https://www.reddit.com')
+    token = request.args.get('t')
+    claims = verify_grant_token(token) if token else None
+    if claims:
+        redirect_url = claims['grant']
+        fast_lane.record_grant(claims.get('mac'))
+    else:
+        redirect_url = session.get('redirect_url', 'https://www.reddit.com')
     logging.info(f"Redirecting user to {redirect_url}")
     return redirect(redirect_url)
 
@@ -118,19 +131,8 @@ def admin():
 
         meraki_org_id = os.environ.get('MERAKI_ORG_ID')
         meraki_ssid_names = os.environ.get('MERAKI_SSID_NAMES')
-        external_url = None
-        port_forwarding_rule_active = False
-        splash_page_set_correctly = False
-        dashboard = get_dashboard()
-        if dashboard and meraki_org_id:
-            networks = dashboard.organizations.getOrganizationNetworks(meraki_org_id)
-            if networks:
-                network_id = networks[0]['id']
-                external_url = get_external_url(dashboard, meraki_org_id, network_id)
-                port_forwarding_rule_active = verify_port_forwarding_rule(dashboard, network_id)
-                if meraki_ssid_names:
-                    # For simplicity, we only check the first SSID
-                    splash_page_set_correctly = verify_splash_page(dashboard, network_id, meraki_ssid_names.split(',')[0])
+        # Meraki status comes from the background poller, never from the dashboard directly
+        snapshot = status_poller.snapshot()
 
         auto_refresh_seconds = os.environ.get('AUTO_REFRESH_SECONDS', 120)
 
@@ -139,10 +141,16 @@ def admin():
                                  clients=clients,
                                  meraki_org_id=meraki_org_id,
                                  meraki_ssid_names=meraki_ssid_names,
-                                 external_url=external_url,
+                                 snapshot=snapshot,
+                                 snapshot_age=snapshot_age(snapshot) if snapshot else None,
                                  auto_refresh_seconds=auto_refresh_seconds,
-                                 port_forwarding_rule_active=port_forwarding_rule_active,
-                                 splash_page_set_correctly=splash_page_set_correctly)
+                                 sighting_stats=sighting_buffer.stats(),
+                                 debounce_stats=client_debounce.stats(),
+                                 fast_lane_stats=fast_lane.stats(),
+                                 admission_stats=admission.stats(),
+                                 inventory_stats=inventory.stats(),
+                                 rate_limit_stats=rate_limits.stats(),
+                                 sync_status=sync_scheduler.status())
     except Exception as e:
         logging.error(f"Error loading admin page: {e}", exc_info=True)
         return "An error occurred while loading the admin page.", 500
@@ -160,8 +168,9 @@ def set_refresh():
 @bp.route('/force_refresh', methods=['POST'])
 def force_refresh():
     """
-    Force a refresh of the admin page.
+    Force a refresh of the admin page, collecting a new Meraki status snapshot.
     """
+    status_poller.request_refresh()
     return redirect(url_for('routes.admin'))
 
 @bp.route('/login', methods=['GET', 'POST'])
@@ -234,31 +243,55 @@ def meraki_status():
         meraki_org_id = os.environ.get('MERAKI_ORG_ID')
         meraki_ssid_names = os.environ.get('MERAKI_SSID_NAMES')
         meraki_api_key_set = bool(os.environ.get('MERAKI_API_KEY'))
-        external_url = None
-        port_forwarding_rule_active = False
-        splash_page_set_correctly = False
-        dashboard = get_dashboard()
-        if dashboard and meraki_org_id:
-            networks = dashboard.organizations.getOrganizationNetworks(meraki_org_id)
-            if networks:
-                network_id = networks[0]['id']
-                external_url = get_external_url(dashboard, meraki_org_id, network_id)
-                port_forwarding_rule_active = verify_port_forwarding_rule(dashboard, network_id)
-                if meraki_ssid_names:
-                    # For simplicity, we only check the first SSID
-                    splash_page_set_correctly = verify_splash_page(dashboard, network_id, meraki_ssid_names.split(',')[0])
+        snapshot = status_poller.snapshot()
 
         return render_template('meraki_status.html',
                                  meraki_api_key_set=meraki_api_key_set,
                                  meraki_org_id=meraki_org_id,
                                  meraki_ssid_names=meraki_ssid_names,
-                                 external_url=external_url,
-                                 port_forwarding_rule_active=port_forwarding_rule_active,
-                                 splash_page_set_correctly=splash_page_set_correctly)
+                                 snapshot=snapshot,
+                                 snapshot_age=snapshot_age(snapshot) if snapshot else None,
+                                 poller_stats={'interval': status_poller.interval, 'polls': status_poller.polls,
+                                               'last_poll_ms': round(status_poller.last_poll_ms, 1)})
     except Exception as e:
         logging.error(f"Error loading Meraki status page: {e}", exc_info=True)
         return "An error occurred while loading the Meraki status page.", 500
 
+@bp.route('/meraki_status/compliance')
+def meraki_compliance():
+    """
+    The compliance matrix of every network and SSID from the latest status snapshot, as JSON.
+    """
+    snapshot = status_poller.snapshot()
+    if not snapshot:
+        return {'error': 'No status snapshot has been collected yet.'}, 503
+    return {
+        'collected_at': snapshot['collected_at'].isoformat() + 'Z',
+        'age': snapshot_age(snapshot),
+        'org_id': snapshot['org_id'],
+        'ssid_names': snapshot['ssid_names'],
+        'summary': snapshot['summary'],
+        'networks': snapshot['networks'],
+        'error': snapshot['error'],
+    }
+
+@bp.route('/meraki/webhook', methods=['POST'])
+def meraki_webhook():
+    """
+    Receives Meraki dashboard alerts and drops the cached lookups they make
+    stale, then has the status poller collect a fresh snapshot.
+    """
+    payload = request.get_json(silent=True)
+    try:
+        verify_shared_secret(payload)
+    except WebhookError as e:
+        logging.warning(f"Rejected Meraki webhook from {request.remote_addr}: {e}")
+        return {'error': str(e)}, e.status
+    invalidated = invalidate_for_alert(payload)
+    if invalidated:
+        status_poller.request_refresh()
+    return {'invalidated': invalidated}
+
 @bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
@@ -322,25 +355,23 @@ def mappings():
 @bp.route('/force_sync', methods=['POST'])
 @login_required
 def force_sync():
-    meraki_clients = get_meraki_clients()
-    pihole_mappings = get_pihole_mappings()
-
-    for client in meraki_clients:
-        if client['dhcpHostname']:
-            add_pihole_mapping(client['ip'], client['dhcpHostname'])
-
-    for mapping in pihole_mappings:
-        found = False
-        for client in meraki_clients:
-            if mapping['ip'] == client['ip'] and mapping['domain'] == client['dhcpHostname']:
-                found = True
-                break
-        if not found:
-            delete_pihole_mapping(mapping['ip'], mapping['domain'])
-
-    flash('Sync complete.')
+    """
+    Queue a sync of the Meraki clients into Pi-hole's custom DNS list. It runs
+    in the background; with `dry_run` set it only records what would change.
+    """
+    dry_run = bool(request.form.get('dry_run'))
+    run = sync_scheduler.enqueue(dry_run=dry_run)
+    flash(f"{'Dry run' if dry_run else 'Sync'} queued (run {run.id}), see the admin page for its progress.")
     return redirect(url_for('routes.admin'))
 
+@bp.route('/sync_status')
+@login_required
+def sync_status():
+    """
+    The DNS sync in progress and the last finished one, as JSON.
+    """
+    return sync_scheduler.status()
+
 @bp.route('/logs')
 @login_required
 def logs():
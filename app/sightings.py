@@ -0,0 +1,373 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import case, or_
+from . import db
+from .lru import LRUCache
+from .models import Client
+
+
+class SightingBuffer:
+    """
+    In-process write-behind buffer for client sightings.
+
+    The splash page pushes (mac, ip, user_agent, timestamp) tuples into the
+    buffer and a background flusher writes them to the database in batches,
+    either when the batch size is reached or when the flush interval elapses.
+    Sightings are coalesced per MAC address, so the buffer never holds more
+    than `max_size` entries; when it is full, `add` returns False and the
+    caller is expected to write the sighting directly.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.batch_size = 200
+        self.flush_interval = 2.0
+        self.max_size = 10000
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.stop()
+        self.app = app
+        self.enabled = app.config.get('SIGHTING_WRITE_BEHIND', False)
+        self.batch_size = app.config.get('SIGHTING_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('SIGHTING_FLUSH_INTERVAL', 2.0)
+        self.max_size = app.config.get('SIGHTING_QUEUE_MAX', 10000)
+        self._reset_counters()
+        if self.enabled and not self._atexit_registered:
+            atexit.register(self.stop)
+            self._atexit_registered = True
+        logging.info(f"Sighting write-behind enabled: {self.enabled}")
+
+    def _reset_counters(self):
+        self.enqueued = 0
+        self.coalesced = 0
+        self.overflowed = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def add(self, mac_address, ip_address, user_agent, timestamp=None):
+        """
+        Queue a sighting. Returns False if the buffer is disabled or full.
+        """
+        if not self.enabled:
+            return False
+        sighting = (mac_address, ip_address, user_agent, timestamp or datetime.utcnow())
+        with self._lock:
+            if mac_address in self._pending:
+                self._pending[mac_address] = self._merge(self._pending[mac_address], sighting)
+                self.coalesced += 1
+            elif len(self._pending) >= self.max_size:
+                self.overflowed += 1
+                self._wakeup.set()
+                return False
+            else:
+                self._pending[mac_address] = sighting
+            self.enqueued += 1
+            depth = len(self._pending)
+        self._ensure_flusher()
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    @staticmethod
+    def _merge(previous, current):
+        # Keep the most recent IP and user agent, but never move last_seen backwards
+        if current[3] < previous[3]:
+            return previous
+        return current
+
+    def _requeue(self, sightings):
+        with self._lock:
+            for sighting in sightings:
+                mac_address = sighting[0]
+                if mac_address in self._pending:
+                    # A newer sighting may have been queued during the flush
+                    self._pending[mac_address] = self._merge(sighting, self._pending[mac_address])
+                elif len(self._pending) >= self.max_size:
+                    self.overflowed += 1
+                else:
+                    self._pending[mac_address] = sighting
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _ensure_flusher(self):
+        # The flusher is started lazily so that every forked gunicorn worker
+        # gets its own thread rather than inheriting a dead one from the master.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._wakeup.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='sighting-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logging.error(f"Error flushing client sightings: {e}", exc_info=True)
+
+    def flush(self):
+        """
+        Write all pending sightings to the database in batches.
+        Must be called inside an application context.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                pending = list(self._pending.values())
+                self._pending.clear()
+
+            written = 0
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                started = time.perf_counter()
+                try:
+                    write_sightings(batch)
+                except Exception:
+                    db.session.rollback()
+                    self.flush_errors += 1
+                    # Put this batch and the ones after it back for the next flush,
+                    # and stop debouncing their MACs until they have been written
+                    self._requeue(pending[start:])
+                    for sighting in pending[start:]:
+                        client_debounce.forget(sighting[0])
+                    raise
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.flushes += 1
+                self.flushed += len(batch)
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                self.total_flush_ms += elapsed_ms
+                written += len(batch)
+            logging.debug(f"Flushed {written} client sightings")
+            return written
+
+    def stop(self):
+        """
+        Stop the flusher thread and write out anything still pending.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread() and self._pid == os.getpid():
+            thread.join(timeout=5)
+        self._thread = None
+        if self.app is not None and self.queue_depth():
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logging.error(f"Error flushing client sightings on shutdown: {e}", exc_info=True)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'queue_depth': self.queue_depth(),
+            'queue_max': self.max_size,
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'overflowed': self.overflowed,
+            'flushed': self.flushed,
+            'flushes': self.flushes,
+            'flush_errors': self.flush_errors,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'max_flush_ms': round(self.max_flush_ms, 2),
+            'avg_flush_ms': round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+
+class ClientDebounce:
+    """
+    Per-worker cache of the last persisted sighting for each MAC address.
+
+    Returning clients re-probe the portal constantly; a sighting for a MAC that
+    was persisted less than `window` seconds ago from the same IP is skipped.
+    New MACs and IP changes are always written through.
+    """
+
+    def __init__(self, app=None):
+        self.window = 0
+        self._cache = LRUCache()
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window = app.config.get('CLIENT_DEBOUNCE_SECONDS', 60)
+        self._cache = LRUCache(max_size=app.config.get('CLIENT_DEBOUNCE_MAX_ENTRIES', 50000), ttl=self.window)
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.lookups = 0
+        self.hits = 0
+        self.skipped = 0
+        self.ip_changes = 0
+
+    def should_skip(self, mac_address, ip_address, timestamp):
+        """
+        Return True if the sighting can be dropped because a recent one was already persisted.
+        """
+        if not self.window:
+            return False
+        self.lookups += 1
+        entry = self._cache.get(mac_address)
+        if entry is None:
+            return False
+        self.hits += 1
+        last_ip, last_persisted = entry
+        if last_ip != ip_address:
+            self.ip_changes += 1
+            return False
+        if (timestamp - last_persisted).total_seconds() < self.window:
+            self.skipped += 1
+            return True
+        return False
+
+    def remember(self, mac_address, ip_address, timestamp):
+        if self.window:
+            self._cache.set(mac_address, (ip_address, timestamp))
+
+    def forget(self, mac_address):
+        self._cache.pop(mac_address)
+
+    def stats(self):
+        return {
+            'enabled': bool(self.window),
+            'window': self.window,
+            'entries': len(self._cache),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'skipped': self.skipped,
+            'ip_changes': self.ip_changes,
+            'skip_rate': round(100.0 * self.skipped / self.lookups, 1) if self.lookups else 0.0,
+        }
+
+
+def _dialect_insert(dialect):
+    """
+    Return the dialect-specific insert construct that supports ON CONFLICT, if any.
+    """
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def _coalesce(sightings):
+    by_mac = {}
+    for sighting in sightings:
+        current = by_mac.get(sighting[0])
+        if current is None or sighting[3] >= current[3]:
+            by_mac[sighting[0]] = sighting
+    return by_mac
+
+
+def upsert_statement(dialect, sightings):
+    """
+    Build a single INSERT ... ON CONFLICT DO UPDATE of last_seen and ip_address
+    for a batch of sightings, or return None if the dialect has no native upsert.
+    A sighting older than the stored last_seen (a late flush from another
+    worker) changes neither column.
+    """
+    insert = _dialect_insert(dialect)
+    if insert is None:
+        return None
+    stmt = insert(Client.__table__).values([
+        {'mac_address': mac, 'ip_address': ip, 'user_agent': user_agent,
+         'first_seen': seen, 'last_seen': seen}
+        for mac, ip, user_agent, seen in _coalesce(sightings).values()
+    ])
+    table = Client.__table__
+    # CASE rather than GREATEST, which SQLite does not have
+    newer = or_(table.c.last_seen.is_(None), stmt.excluded.last_seen > table.c.last_seen)
+    return stmt.on_conflict_do_update(
+        index_elements=['mac_address'],
+        set_={'last_seen': case((newer, stmt.excluded.last_seen), else_=table.c.last_seen),
+              'ip_address': case((newer, stmt.excluded.ip_address), else_=table.c.ip_address)}
+    )
+
+
+def write_sightings(sightings):
+    """
+    Upsert a batch of (mac, ip, user_agent, timestamp) sightings in one transaction.
+
+    On PostgreSQL and SQLite this is one statement against the unique index on
+    mac_address. Other databases fall back to a lookup followed by inserts and
+    updates.
+    """
+    stmt = upsert_statement(db.session.get_bind().dialect.name, sightings)
+    if stmt is not None:
+        db.session.execute(stmt)
+        db.session.commit()
+        return
+
+    by_mac = _coalesce(sightings)
+    existing = Client.query.filter(Client.mac_address.in_(list(by_mac))).all()
+    for client in existing:
+        _, ip, _, seen = by_mac.pop(client.mac_address)
+        if client.last_seen is None or seen > client.last_seen:
+            client.ip_address, client.last_seen = ip, seen
+
+    db.session.add_all([
+        Client(mac_address=mac, ip_address=ip, user_agent=user_agent, first_seen=seen, last_seen=seen)
+        for mac, ip, user_agent, seen in by_mac.values()
+    ])
+    db.session.commit()
+
+
+def record_sighting(mac_address, ip_address, user_agent):
+    """
+    Record a client sighting, through the write-behind buffer when it is enabled.
+    Sightings of a returning client inside the debounce window are skipped.
+    """
+    now = datetime.utcnow()
+    if client_debounce.should_skip(mac_address, ip_address, now):
+        logging.debug(f"Skipping sighting for {mac_address} inside debounce window")
+        return
+
+    if sighting_buffer.add(mac_address, ip_address, user_agent, now):
+        logging.debug(f"Queued sighting for {mac_address}")
+    else:
+        write_sightings([(mac_address, ip_address, user_agent, now)])
+        logging.info("Client data saved to database")
+    client_debounce.remember(mac_address, ip_address, now)
+
+
+sighting_buffer = SightingBuffer()
+client_debounce = ClientDebounce()
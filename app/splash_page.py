@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from flask import Response, has_request_context, render_template, request, url_for
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+RenderedPage = namedtuple('RenderedPage', ['etag', 'bodies', 'parts'])
+
+# Stands in for the signed grant token in the pre-rendered page
+TOKEN_PLACEHOLDER = 'GRANT-TOKEN-PLACEHOLDER'
+
+
+class SplashPage:
+    """
+    Pre-rendered splash page.
+
+    `splash.html` only depends on the timer duration, so it is rendered once per
+    (timer, script root) and kept as bytes together with gzip and brotli
+    variants. Serving it is a dictionary lookup plus header negotiation.
+    Pages that carry a signed grant token are the pre-rendered bytes joined
+    around the token.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._pages = {}
+        self._template = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Drop anything rendered for a previous app and pre-render the configured timer.
+        """
+        self.app = app
+        self._pages = {}
+        self._template = app.jinja_env.get_template('splash.html')
+        timer_duration = app.config.get('SPLASH_TIMER_SECONDS', 10)
+        with app.test_request_context('/'):
+            self._build(timer_duration, '')
+        logging.info(f"Pre-rendered splash page for a {timer_duration}s timer")
+
+    def _build(self, timer_duration, script_root):
+        body = render_template('splash.html', timer_duration=timer_duration,
+                               connect_url=url_for('routes.connect')).encode('utf-8')
+        tokenized = render_template('splash.html', timer_duration=timer_duration,
+                                    connect_url=url_for('routes.connect', t=TOKEN_PLACEHOLDER)).encode('utf-8')
+        etag = hashlib.sha256(tokenized).hexdigest()[:32]
+        bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body)
+        page = RenderedPage(etag, bodies, tokenized.split(TOKEN_PLACEHOLDER.encode('ascii')))
+        with self._lock:
+            self._pages[(timer_duration, script_root)] = page
+        return page
+
+    def _stale(self):
+        # Only stat the template when Jinja is configured to auto-reload it;
+        # otherwise a template change takes effect on the next startup.
+        if self._template is None or not self.app.jinja_env.auto_reload:
+            return False
+        return not self._template.is_up_to_date
+
+    def get(self, timer_duration, script_root=None):
+        """
+        Return the rendered page for a timer duration, rendering it on a miss.
+        Outside a request context `script_root` must be given.
+        """
+        if script_root is None:
+            script_root = request.script_root
+        if self._stale():
+            logging.info("Splash template changed, discarding pre-rendered pages")
+            self._pages = {}
+            self._template = self.app.jinja_env.get_template('splash.html')
+        page = self._pages.get((timer_duration, script_root))
+        if page is None:
+            if has_request_context():
+                page = self._build(timer_duration, script_root)
+            else:
+                with self.app.test_request_context('/', base_url=f'http://localhost{script_root}/'):
+                    page = self._build(timer_duration, script_root)
+        return page
+
+    def negotiate(self, page, token, accept_encodings, if_none_match):
+        """
+        Pick the body and headers for a rendered page from the parsed
+        Accept-Encoding and If-None-Match request headers.
+        Returns a (status, headers, body) tuple.
+        """
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in page.bodies and accept_encodings[candidate]:
+                encoding = candidate
+                break
+        etag = page.etag
+        if token:
+            etag = f"{etag}-{hashlib.sha256(token.encode('ascii')).hexdigest()[:16]}"
+        if encoding != 'identity':
+            etag = f"{etag}-{encoding}"
+
+        headers = [
+            ('ETag', f'"{etag}"'),
+            ('Cache-Control', 'private, no-cache'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if if_none_match.contains(etag):
+            return 304, headers, b''
+
+        if token:
+            body = self._compress(token.encode('ascii').join(page.parts), encoding)
+        else:
+            body = page.bodies[encoding]
+        headers.append(('Content-Type', 'text/html; charset=utf-8'))
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        return 200, headers, body
+
+    def response(self, timer_duration, token=None):
+        """
+        Build a response for the splash page, honouring Accept-Encoding and If-None-Match.
+        With a grant token, the connect link points at /connect?t=<token>.
+        """
+        page = self.get(timer_duration)
+        status, headers, body = self.negotiate(page, token, request.accept_encodings, request.if_none_match)
+        return Response(body, status=status, headers=headers)
+
+    @staticmethod
+    def _compress(body, encoding):
+        # Token-bearing pages differ per client, so they are compressed per
+        # response at a cheaper level than the precompressed variants.
+        if encoding == 'gzip':
+            return gzip.compress(body, compresslevel=6, mtime=0)
+        if encoding == 'br':
+            return brotli.compress(body, quality=5)
+        return body
+
+
+splash_page = SplashPage()
@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from . import cache
+from .compliance import compliance_matrix, summarize
+from .meraki_dashboard import get_dashboard
+
+# Versioned, since snapshots are kept until replaced and their layout changes
+SNAPSHOT_KEY = 'meraki_status_snapshot:v2'
+LEASE_KEY = 'meraki_status_poll_lease'
+
+
+class StatusPoller:
+    """
+    Collects a snapshot of the Meraki integration's status in the background.
+
+    Every `interval` seconds a worker thread builds the compliance matrix of
+    every network and configured SSID (see `compliance_matrix`) and stores it
+    with its timestamp in the Flask cache. The
+    admin pages only ever read the stored snapshot. With a shared cache
+    backend a lease in the cache keeps all but one worker from polling.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 60
+        self._last = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        self._reset_counters()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.stop()
+        self.app = app
+        self.interval = app.config.get('STATUS_POLL_SECONDS', 60)
+        self._last = None
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.polls = 0
+        self.poll_errors = 0
+        self.last_poll_ms = 0.0
+
+    def collect(self):
+        """
+        Collect a status snapshot from the dashboard. Needs an app context.
+        """
+        org_id = os.environ.get('MERAKI_ORG_ID')
+        ssid_names = [name.strip() for name in os.environ.get('MERAKI_SSID_NAMES', '').split(',') if name.strip()]
+        snapshot = {
+            'collected_at': datetime.utcnow(),
+            'org_id': org_id,
+            'ssid_names': ssid_names,
+            'networks': [],
+            'external_url': None,
+            'port_forwarding_rule_active': False,
+            'splash_page_set_correctly': False,
+            'summary': summarize([], ssid_names),
+            'error': None,
+        }
+        dashboard = get_dashboard()
+        if not dashboard or not org_id:
+            snapshot['error'] = 'The Meraki API key or organization ID is not set.'
+            return snapshot
+
+        try:
+            networks = dashboard.organizations.getOrganizationNetworks(org_id)
+            snapshot['networks'] = compliance_matrix(dashboard, org_id, networks, ssid_names)
+        except Exception as e:
+            logging.error(f"Error collecting Meraki status: {e}", exc_info=True)
+            snapshot['error'] = str(e)
+
+        snapshot['summary'] = summarize(snapshot['networks'], ssid_names)
+        if snapshot['networks']:
+            # Provisioning adds the port forwarding rule to the first network only
+            first = snapshot['networks'][0]
+            snapshot['external_url'] = first['external_url']
+            snapshot['port_forwarding_rule_active'] = first['port_forwarding_rule_active']
+            summary = snapshot['summary']
+            snapshot['splash_page_set_correctly'] = bool(ssid_names) and summary['compliant_pairs'] == summary['pairs']
+        return snapshot
+
+    def poll(self):
+        started = datetime.utcnow()
+        snapshot = self.collect()
+        self.polls += 1
+        if snapshot['error']:
+            self.poll_errors += 1
+        self.last_poll_ms = (datetime.utcnow() - started).total_seconds() * 1000
+        self._last = snapshot
+        cache.set(SNAPSHOT_KEY, snapshot, timeout=0)
+        logging.info(f"Collected Meraki status for {len(snapshot['networks'])} networks "
+                     f"in {self.last_poll_ms:.0f} ms")
+        return snapshot
+
+    def snapshot(self):
+        """
+        The most recent snapshot, or None if none has been collected yet.
+        """
+        self._ensure_poller()
+        return cache.get(SNAPSHOT_KEY) or self._last
+
+    def request_refresh(self):
+        """
+        Ask the poller to collect a new snapshot now rather than at the next interval.
+        """
+        cache.delete(LEASE_KEY)
+        self._ensure_poller()
+        self._wakeup.set()
+
+    def _ensure_poller(self):
+        # Started lazily so that every forked gunicorn worker gets its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._wakeup.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='status-poller', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping:
+                try:
+                    if cache.add(LEASE_KEY, os.getpid(), timeout=max(1, int(self.interval))):
+                        self.poll()
+                except Exception as e:
+                    self.poll_errors += 1
+                    logging.error(f"Meraki status poller failed: {e}", exc_info=True)
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+
+def snapshot_age(snapshot):
+    """
+    Age of a snapshot in whole seconds.
+    """
+    return int((datetime.utcnow() - snapshot['collected_at']).total_seconds())
+
+
+status_poller = StatusPoller()
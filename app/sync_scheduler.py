@@ -0,0 +1,249 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+import meraki
+from . import db
+from .dns_journal import DnsJournal, incremental_clients, journal_progress, managed_mappings
+from .dns_sync import sync_dns
+from .meraki_api import advance_cursors, get_meraki_clients
+from .models import DnsMapping, SyncJournalEntry, SyncRun
+from .pihole_api import PiholeError, get_pihole_client
+from .provisioning import file_lock
+
+DEFAULT_LOCK_FILE = '/tmp/meraki-captive-portal-dns-sync.lock'
+# How often each worker's thread looks for queued or due runs
+CHECK_SECONDS = 5
+
+
+class SyncError(Exception):
+    pass
+
+
+def perform_sync(run, incremental=False):
+    """
+    Sync the Meraki clients into Pi-hole's custom DNS list for `run`, writing
+    only the mappings that differ, through the run's journal. Returns the plan
+    and the PiholeReport (None for a dry run or when nothing had to be
+    written). Raises SyncError if either side cannot be read.
+
+    A full sync compares all clients with Pi-hole's own list. Once a full sync
+    has filled the journal, an incremental sync compares the clients seen
+    since the last run with the managed mappings instead, without reading
+    Pi-hole. A 'resume' run finishes the writes of an interrupted run. The
+    incremental fetch cursors only move once all of a run's writes are made.
+    """
+    pihole = get_pihole_client()
+    if pihole is None:
+        raise SyncError('PIHOLE_API_URL and PIHOLE_API_KEY are not set.')
+    journal = DnsJournal(run)
+    cursors = {}
+    try:
+        if run.trigger == 'resume':
+            return journal.resume(pihole)
+        if incremental and DnsMapping.query.first() is not None:
+            clients, skipped = incremental_clients(get_meraki_clients(incremental=True, cursors=cursors))
+            logging.info(f"Incremental DNS sync: {skipped} clients unchanged since they were pushed")
+            plan, report = sync_dns(clients, managed_mappings(), pihole, prune=True, dry_run=run.dry_run,
+                                    journal=journal)
+        else:
+            pihole_mappings = pihole.get_mappings()
+            # A client missing from an incremental delta may simply not have been
+            # seen since the last run, so absence is no reason to delete its mapping
+            plan, report = sync_dns(get_meraki_clients(incremental=incremental, cursors=cursors), pihole_mappings,
+                                    pihole, prune=not incremental, dry_run=run.dry_run, journal=journal)
+        # Only move past clients that are in Pi-hole, or a failed write would
+        # not be planned again until the client is next seen
+        if not run.dry_run and not (report and report.failed):
+            advance_cursors(cursors)
+        return plan, report
+    except PiholeError as e:
+        raise SyncError(f"Could not read the Pi-hole mappings: {e}")
+    except meraki.APIError as e:
+        raise SyncError(f"Could not fetch clients from Meraki: {e}")
+
+
+class SyncScheduler:
+    """
+    Runs the Meraki to Pi-hole DNS sync in the background.
+
+    Every worker runs a thread that, every few seconds, starts the runs queued
+    by /force_sync and a scheduled run once `interval` seconds have passed
+    since the last one. A run only starts while holding an exclusive lock on
+    `lock_file`, so only one worker on the host syncs at a time. Each run is
+    recorded as a SyncRun row with its outcome and counts.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 900
+        self.lock_file = DEFAULT_LOCK_FILE
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.stop()
+        self.app = app
+        self.interval = app.config.get('DNS_SYNC_INTERVAL_SECONDS', 900)
+        self.lock_file = app.config.get('DNS_SYNC_LOCK_FILE') or DEFAULT_LOCK_FILE
+        app.before_request(self._before_request)
+
+    def _before_request(self):
+        # Scheduled runs need a running thread even if nobody asks for a sync
+        if self.interval:
+            self._ensure_worker()
+
+    def enqueue(self, dry_run=False, trigger='manual'):
+        """
+        Queue a sync run and wake this worker's thread to start it. A run of
+        the same kind that is already queued is returned instead of a new one.
+        """
+        run = SyncRun.query.filter_by(status='queued', dry_run=dry_run).first()
+        if run is None:
+            run = SyncRun(trigger=trigger, dry_run=dry_run, status='queued')
+            db.session.add(run)
+            db.session.commit()
+            logging.info(f"Queued {'dry run of the ' if dry_run else ''}DNS sync {run.id} ({trigger})")
+        self._ensure_worker()
+        self._wakeup.set()
+        return run
+
+    def status(self):
+        """
+        The run in progress or waiting, and the last finished run, as dicts.
+        """
+        current = (SyncRun.query.filter(SyncRun.status.in_(('running', 'queued')))
+                   .order_by(SyncRun.status.desc(), SyncRun.id).first())
+        last = (SyncRun.query.filter(SyncRun.status.in_(('succeeded', 'failed')))
+                .order_by(SyncRun.finished_at.desc()).first())
+        status = {
+            'interval': self.interval,
+            'managed': DnsMapping.query.count(),
+            'current': current.to_dict() if current else None,
+            'last': last.to_dict() if last else None,
+        }
+        if current is not None:
+            status['current']['journal'] = journal_progress(current.id)
+        return status
+
+    def run_pending(self):
+        """
+        Run the queued runs, and a scheduled one if it is due, unless another
+        worker holds the lock. Returns the number of runs started.
+        """
+        started = 0
+        with file_lock(self.lock_file) as acquired:
+            if not acquired:
+                return 0
+            # Whoever was running when we could take the lock has died
+            for run in SyncRun.query.filter_by(status='running').all():
+                self._interrupted(run)
+            db.session.commit()
+
+            if self._schedule_due():
+                db.session.add(SyncRun(trigger='schedule', dry_run=False, status='queued'))
+                db.session.commit()
+            while True:
+                run = SyncRun.query.filter_by(status='queued').order_by(SyncRun.id).first()
+                if run is None:
+                    break
+                self.execute(run)
+                started += 1
+        return started
+
+    def _interrupted(self, run):
+        run.status = 'failed'
+        run.finished_at = datetime.utcnow()
+        run.message = 'Interrupted'
+        pending = SyncJournalEntry.query.filter_by(run_id=run.id, status='pending')
+        if pending.first() is None:
+            return
+        # Hand the writes it did not get to over to a run that finishes them
+        resume = SyncRun(trigger='resume', dry_run=False, status='queued')
+        db.session.add(resume)
+        db.session.flush()
+        pending.update({'run_id': resume.id})
+        run.message = f"Interrupted, resumed by run {resume.id}"
+        logging.warning(f"DNS sync {run.id} was interrupted, run {resume.id} will finish its writes")
+
+    def _schedule_due(self):
+        if not self.interval:
+            return False
+        if SyncRun.query.filter_by(status='queued', dry_run=False).first():
+            return False
+        last = (SyncRun.query.filter(SyncRun.dry_run.is_(False), SyncRun.started_at.isnot(None))
+                .order_by(SyncRun.started_at.desc()).first())
+        return last is None or last.started_at <= datetime.utcnow() - timedelta(seconds=self.interval)
+
+    def execute(self, run):
+        run.status = 'running'
+        run.started_at = datetime.utcnow()
+        db.session.commit()
+        try:
+            plan, report = perform_sync(run, incremental=self.app.config.get('MERAKI_INCREMENTAL_SYNC', False))
+        except Exception as e:
+            logging.error(f"DNS sync {run.id} failed: {e}", exc_info=not isinstance(e, SyncError))
+            db.session.rollback()
+            run.status = 'failed'
+            run.errors = 1
+            run.message = str(e)[:255]
+            # The run will not get to its remaining writes, the next one plans them again
+            SyncJournalEntry.query.filter_by(run_id=run.id, status='pending').update(
+                {'status': 'failed', 'error': run.message})
+        else:
+            summary = plan.summary()
+            run.unchanged = summary['unchanged']
+            run.conflicts = summary['conflicts']
+            if run.dry_run or report is None:
+                # A dry run records what it would have written
+                run.adds, run.deletes = summary['adds'], summary['deletes']
+            else:
+                run.adds, run.deletes, run.errors = report.added, report.deleted, len(report.failed)
+            run.status = 'failed' if run.errors else 'succeeded'
+        run.finished_at = datetime.utcnow()
+        db.session.commit()
+        logging.info(f"DNS sync {run.id} {run.status} in {run.duration:.1f}s: {run.adds} added, "
+                     f"{run.deletes} deleted, {run.errors} errors")
+        return run
+
+    def _ensure_worker(self):
+        # Started lazily so that every forked gunicorn worker gets its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._wakeup.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='dns-sync', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stopping:
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    logging.error(f"DNS sync scheduler failed: {e}", exc_info=True)
+                    db.session.rollback()
+                finally:
+                    # Do not hold a database connection between checks
+                    db.session.remove()
+                self._wakeup.wait(CHECK_SECONDS)
+                self._wakeup.clear()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+
+sync_scheduler = SyncScheduler()
@@ -0,0 +1,9 @@
+import hashlib
+import json
+
+
+def fingerprint(state):
+    """
+    Content hash of a JSON-serializable value, stable across key order.
+    """
+    return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
@@ -0,0 +1,67 @@
+import hmac
+import logging
+import os
+from flask import current_app
+from .meraki_api import get_external_url, get_network_ssids, verify_port_forwarding_rule, verify_splash_page
+
+# The cached lookups each alert type can make stale. Other alerts are
+# acknowledged and ignored.
+ALERT_INVALIDATIONS = {
+    # Any configuration change in the network, including firewall and SSID settings
+    'settings_changed': ('port_forwarding', 'ssids', 'external_url'),
+    # A device went offline or came back, which can change the appliance's DDNS hostname
+    'stopped_reporting': ('external_url',),
+    'started_reporting': ('external_url',),
+}
+
+
+class WebhookError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def verify_shared_secret(payload):
+    """
+    Check the shared secret Meraki sends in every alert against
+    MERAKI_WEBHOOK_SECRET. Raises WebhookError if the receiver is disabled
+    or the secret does not match.
+    """
+    secret = current_app.config.get('MERAKI_WEBHOOK_SECRET')
+    if not secret:
+        raise WebhookError('The webhook receiver is not enabled.', 404)
+    if not isinstance(payload, dict):
+        raise WebhookError('Expected a JSON object.', 400)
+    if not hmac.compare_digest(str(payload.get('sharedSecret', '')).encode(), secret.encode()):
+        raise WebhookError('Invalid shared secret.', 403)
+
+
+def invalidate_for_alert(payload):
+    """
+    Drop the cached dashboard lookups an alert makes stale. Returns the names
+    of the invalidated lookups.
+    """
+    alert_type = payload.get('alertTypeId')
+    network_id = payload.get('networkId')
+    targets = ALERT_INVALIDATIONS.get(alert_type, ())
+    if not targets or not network_id:
+        logging.info(f"Ignoring Meraki alert {alert_type} for network {network_id}")
+        return []
+    if payload.get('organizationId') and payload['organizationId'] != os.environ.get('MERAKI_ORG_ID'):
+        logging.info(f"Ignoring Meraki alert {alert_type} for organization {payload['organizationId']}")
+        return []
+
+    invalidated = []
+    if 'port_forwarding' in targets:
+        verify_port_forwarding_rule.invalidate(None, network_id)
+        invalidated.append('port_forwarding')
+    if 'ssids' in targets:
+        get_network_ssids.invalidate(None, network_id)
+        for ssid_name in [name.strip() for name in os.environ.get('MERAKI_SSID_NAMES', '').split(',') if name.strip()]:
+            verify_splash_page.invalidate(None, network_id, ssid_name)
+        invalidated.append('ssids')
+    if 'external_url' in targets:
+        get_external_url.invalidate(None, os.environ.get('MERAKI_ORG_ID'), network_id)
+        invalidated.append('external_url')
+    logging.info(f"Meraki alert {alert_type} for network {network_id} invalidated {', '.join(invalidated)}")
+    return invalidated
@@ -0,0 +1,19 @@
+from app import create_app
+from app.asgi import PortalASGI
+import os
+import logging
+
+# Configure logging
+log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+logging.info("Starting ASGI application")
+
+flask_app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+app = PortalASGI(flask_app)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5001))
+    uvicorn.run(app, host='0.0.0.0', port=port, log_level=log_level.lower())
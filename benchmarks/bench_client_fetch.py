@@ -0,0 +1,63 @@
+"""
+Compare the sequential per-network client fetch with the concurrent,
+rate-limited one in app.meraki_api against a local stub dashboard.
+
+    python -m benchmarks.bench_client_fetch --networks 1 5 10 20 40
+"""
+import argparse
+import os
+import time
+import meraki
+from app import meraki_api
+from app.rate_limit import rate_limits
+from benchmarks.stub_dashboard import StubDashboard
+
+
+def sequential(dashboard, networks):
+    clients = []
+    for network in networks:
+        clients.extend(dashboard.networks.getNetworkClients(network['id'], timespan=86400,
+                                                            total_pages='all', perPage=1000))
+    return clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--networks', nargs='+', type=int, default=[1, 5, 10, 20, 40])
+    parser.add_argument('--latency', type=float, default=0.25, help='Stub latency per request in seconds')
+    parser.add_argument('--org-rate', type=float, default=9, help='MERAKI_ORG_RATE for the limiter')
+    parser.add_argument('--concurrency', type=int, default=4, help='MERAKI_FETCH_CONCURRENCY')
+    parser.add_argument('--stub-rate-limit', type=int, default=10, help='Stub requests/s before 429')
+    args = parser.parse_args()
+
+    os.environ['MERAKI_ORG_RATE'] = str(args.org_rate)
+    os.environ['MERAKI_FETCH_CONCURRENCY'] = str(args.concurrency)
+
+    print(f"latency {args.latency * 1000:.0f} ms/request, limiter {args.org_rate}/s x {args.concurrency}, "
+          f"stub limit {args.stub_rate_limit}/s")
+    print(f"{'networks':>8} {'sequential':>11} {'concurrent':>11} {'speedup':>8} {'429s':>5}")
+    for count in args.networks:
+        stub = StubDashboard(networks=count, latency=args.latency, rate_limit=args.stub_rate_limit).start()
+        try:
+            # The portal's limiter stands in for the SDK's own smart flow limiter here
+            dashboard = meraki.DashboardAPI('0' * 40, base_url=stub.base_url, suppress_logging=True,
+                                            smart_flow_enabled=False, nginx_429_retry_wait_time=1)
+            networks = stub.network_list()
+
+            started = time.perf_counter()
+            expected = sequential(dashboard, networks)
+            sequential_time = time.perf_counter() - started
+
+            rate_limits.reset()
+            started = time.perf_counter()
+            clients = meraki_api.fetch_network_clients(dashboard, 'org', networks)
+            concurrent_time = time.perf_counter() - started
+            assert len(clients) == len(expected)
+        finally:
+            stub.stop()
+        print(f"{count:>8} {sequential_time:>10.2f}s {concurrent_time:>10.2f}s "
+              f"{sequential_time / concurrent_time:>7.1f}x {stub.rejected:>5}")
+
+
+if __name__ == '__main__':
+    main()
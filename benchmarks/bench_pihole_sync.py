@@ -0,0 +1,73 @@
+"""
+Compare one bare requests.get per Pi-hole write, as pihole_api used to make,
+with the pooled, concurrent PiholeClient against a local stub Pi-hole, and
+with the single bulk update PiholeClient makes against a stub Pi-hole v6.
+
+    python -m benchmarks.bench_pihole_sync --mappings 100 500 1000
+"""
+import argparse
+import time
+import requests
+from app.dns_sync import Mapping
+from app.pihole_api import PiholeClient
+from benchmarks.stub_pihole import StubPihole
+
+
+def sequential(stub, mappings):
+    for mapping in mappings:
+        response = requests.get(f"{stub.api_url}?customdns&action=add&ip={mapping.ip}"
+                                f"&domain={mapping.hostname}&auth={stub.api_key}", timeout=5)
+        response.raise_for_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mappings', nargs='+', type=int, default=[100, 500, 1000])
+    parser.add_argument('--latency', type=float, default=0.01, help='Stub latency per request in seconds')
+    parser.add_argument('--concurrency', type=int, default=8, help='PIHOLE_CONCURRENCY')
+    args = parser.parse_args()
+
+    print(f"latency {args.latency * 1000:.0f} ms/request, {args.concurrency} workers")
+    print(f"{'mappings':>8} {'sequential':>11} {'conns':>6} {'pooled':>8} {'conns':>6} {'speedup':>8} "
+          f"{'v6 bulk':>8} {'reqs':>5} {'speedup':>8}")
+    for count in args.mappings:
+        mappings = [Mapping(f'host-{i}', f'10.0.{i // 256}.{i % 256}') for i in range(count)]
+
+        stub = StubPihole(latency=args.latency).start()
+        try:
+            started = time.perf_counter()
+            sequential(stub, mappings)
+            sequential_time = time.perf_counter() - started
+            sequential_connections = stub.connections
+        finally:
+            stub.stop()
+
+        stub = StubPihole(latency=args.latency).start()
+        client = PiholeClient(stub.api_url, stub.api_key, max_workers=args.concurrency)
+        try:
+            started = time.perf_counter()
+            report = client.apply(adds=mappings)
+            pooled_time = time.perf_counter() - started
+            assert report.ok and report.added == count
+        finally:
+            client.close()
+            stub.stop()
+        pooled_connections = stub.connections
+
+        stub = StubPihole(latency=args.latency, version=6).start()
+        client = PiholeClient(stub.api_url, stub.api_key, max_workers=args.concurrency)
+        try:
+            started = time.perf_counter()
+            report = client.apply(adds=mappings)
+            bulk_time = time.perf_counter() - started
+            assert report.ok and len(stub.mappings) == count
+        finally:
+            client.close()
+            stub.stop()
+        print(f"{count:>8} {sequential_time:>10.2f}s {sequential_connections:>6} {pooled_time:>7.2f}s "
+              f"{pooled_connections:>6} {sequential_time / pooled_time:>7.1f}x "
+              f"{bulk_time:>7.2f}s {stub.requests:>5} {sequential_time / bulk_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
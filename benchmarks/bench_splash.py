@@ -0,0 +1,106 @@
+"""
+Load generator for the splash page.
+
+Sends splash page requests with unique client MACs from a pool of threads,
+optionally following the connect link, and reports requests per second and
+latency percentiles. Run it against the sync (gunicorn) and async (uvicorn)
+servers on the same machine to compare them; see benchmarks/README.md.
+"""
+import argparse
+import http.client
+import re
+import statistics
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+CONNECT_LINK = re.compile(rb'href="(/connect\?t=[^"]+)"')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+    return samples[index]
+
+
+def forge_session_cookie(secret_key, user_id):
+    """
+    Build a Flask session cookie for `user_id`, so the benchmark does not
+    depend on the login form.
+    """
+    from flask import Flask
+    app = Flask(__name__)
+    app.secret_key = secret_key
+    serializer = app.session_interface.get_signing_serializer(app)
+    return f"session={serializer.dumps({'_user_id': str(user_id), '_fresh': True})}"
+
+
+def worker(base, cookie, deadline, follow, results, errors, lock):
+    parts = urlsplit(base)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    latencies = []
+    failed = 0
+    while time.perf_counter() < deadline:
+        mac = ':'.join(f'{b:02x}' for b in uuid.uuid4().bytes[:6])
+        path = f"{parts.path or '/'}?client_mac={mac}&client_ip=10.0.0.1&base_grant_url=https://n1.network-auth.com/grant"
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Cookie': cookie, 'User-Agent': 'bench-splash'})
+            response = conn.getresponse()
+            body = response.read()
+            if response.status != 200:
+                failed += 1
+            elif follow:
+                match = CONNECT_LINK.search(body)
+                if match:
+                    conn.request('GET', match.group(1).decode())
+                    conn.getresponse().read()
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    with lock:
+        results.extend(latencies)
+        errors.append(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('url', help='Base URL of the running portal, e.g. http://127.0.0.1:5001/')
+    parser.add_argument('--secret-key', required=True, help='SECRET_KEY of the running portal')
+    parser.add_argument('--user-id', default=1, type=int, help='ID of an existing admin user')
+    parser.add_argument('--concurrency', default=32, type=int)
+    parser.add_argument('--duration', default=20.0, type=float, help='Seconds to run for')
+    parser.add_argument('--follow-connect', action='store_true', help='Also request the connect link')
+    args = parser.parse_args()
+
+    cookie = forge_session_cookie(args.secret_key, args.user_id)
+    results, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=worker,
+                                args=(args.url, cookie, deadline, args.follow_connect, results, errors, lock))
+               for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"requests:    {len(results)} ({sum(errors)} errors) in {elapsed:.1f}s")
+    print(f"throughput:  {len(results) / elapsed:.1f} req/s")
+    if results:
+        print(f"latency p50: {percentile(results, 50) * 1000:.1f} ms")
+        print(f"latency p95: {percentile(results, 95) * 1000:.1f} ms")
+        print(f"latency p99: {percentile(results, 99) * 1000:.1f} ms")
+        print(f"latency avg: {statistics.mean(results) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Replay recorded Meraki webhook payloads against a running portal, as a local
+stand-in for the dashboard's alert delivery.
+
+    python benchmarks/replay_webhooks.py http://127.0.0.1:5001/meraki/webhook --secret $MERAKI_WEBHOOK_SECRET
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import requests
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'tests', 'fixtures', 'meraki_webhooks')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('url', help='The portal\'s /meraki/webhook URL')
+    parser.add_argument('--secret', required=True, help='MERAKI_WEBHOOK_SECRET of the portal')
+    parser.add_argument('--org-id', help='Replace the recorded organization ID (MERAKI_ORG_ID)')
+    parser.add_argument('--network-id', help='Replace the recorded network ID')
+    parser.add_argument('payloads', nargs='*', help=f'Payload files (default: all in {FIXTURES})')
+    args = parser.parse_args()
+
+    session = requests.Session()
+    for path in args.payloads or sorted(glob.glob(os.path.join(FIXTURES, '*.json'))):
+        with open(path) as f:
+            payload = json.load(f)
+        payload['sharedSecret'] = args.secret
+        if args.org_id:
+            payload['organizationId'] = args.org_id
+        if args.network_id:
+            payload['networkId'] = args.network_id
+        started = time.perf_counter()
+        response = session.post(args.url, json=payload, timeout=10)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"{os.path.basename(path):<28} {response.status_code} {elapsed:6.1f} ms  {response.text.strip()}")
+
+
+if __name__ == '__main__':
+    main()
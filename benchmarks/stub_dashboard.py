@@ -0,0 +1,101 @@
+"""
+Minimal local stand-in for the Meraki dashboard API, for benchmarks.
+
+Serves the handful of endpoints the portal uses, with Link header
+pagination, a fixed per-request latency and, optionally, Meraki's per-organization rate limit (answered with
+429 and Retry-After).
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubDashboard:
+    def __init__(self, networks=10, clients_per_network=50, latency=0.2, rate_limit=None):
+        self.networks = networks
+        self.clients_per_network = clients_per_network
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.rejected = 0
+        self._window = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/api/v1"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _allow(self):
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit is None:
+                return True
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.rate_limit:
+                self.rejected += 1
+                return False
+            self._window.append(now)
+            return True
+
+    def network_list(self):
+        return [{'id': f'N_{i}', 'name': f'Site {i}'} for i in range(self.networks)]
+
+    def client_list(self, network_id):
+        index = int(network_id.split('_')[1])
+        return [{'id': f'k{index}-{j}', 'mac': f'02:00:00:{index % 256:02x}:{j // 256:02x}:{j % 256:02x}',
+                 'ip': f'10.{index % 256}.{j // 256}.{j % 256}', 'dhcpHostname': f'host-{index}-{j}'}
+                for j in range(self.clients_per_network)]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if not stub._allow():
+                    self._send(429, {'errors': ['API rate limit exceeded for organization']},
+                               {'Retry-After': '1'})
+                    return
+                time.sleep(stub.latency)
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                if re.fullmatch(r'/api/v1/organizations/[^/]+/networks', parts.path):
+                    self._send(200, stub.network_list())
+                elif match := re.fullmatch(r'/api/v1/networks/([^/]+)/clients', parts.path):
+                    self._send_page(parts.path, stub.client_list(match.group(1)), query)
+                else:
+                    self._send(404, {'errors': ['Not found']})
+
+            def _send_page(self, path, items, query):
+                per_page = int(query.get('perPage', 10))
+                start = int(query.get('startingAfter', 0))
+                headers = {}
+                if start + per_page < len(items):
+                    headers['Link'] = (f'<{stub.base_url[:-len("/api/v1")]}{path}'
+                                       f'?perPage={per_page}&startingAfter={start + per_page}>; rel=next')
+                self._send(200, items[start:start + per_page], headers)
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
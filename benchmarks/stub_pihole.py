@@ -0,0 +1,207 @@
+"""
+Minimal local stand-in for the Pi-hole local DNS API, for benchmarks and
+tests: the legacy custom DNS API (admin/api.php) of Pi-hole v5 or, with
+`version=6`, the session-authenticated REST API (/api) of Pi-hole v6.
+
+Keeps the mappings in memory, answers every request after a fixed latency and
+counts requests, logins and TCP connections, so connection reuse can be
+checked. With `fail_every` set, every n-th request gets a 503.
+"""
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+HOSTS_PATH = '/api/config/dns/hosts'
+
+
+class StubPihole:
+    def __init__(self, latency=0.02, api_key='stub-key', fail_every=None, version=5):
+        self.latency = latency
+        self.api_key = api_key
+        self.fail_every = fail_every
+        self.version = version
+        self.mappings = set()
+        self.requests = 0
+        self.connections = 0
+        self.failed = 0
+        self.logins = 0
+        self.sessions = set()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.api_url = f"http://127.0.0.1:{self.server.server_port}/admin/api.php"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def expire_sessions(self):
+        with self._lock:
+            self.sessions.clear()
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+            if self.fail_every and self.requests % self.fail_every == 0:
+                self.failed += 1
+                return False
+            return True
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 so that clients can keep connections alive
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; without this, Nagle's
+            # algorithm stalls every reused connection on a delayed ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _begin(self):
+                # Read the body even for a 503, or it is left on the kept-alive connection
+                length = int(self.headers.get('Content-Length') or 0)
+                self.body = json.loads(self.rfile.read(length)) if length else None
+                time.sleep(stub.latency)
+                if not stub._count():
+                    self._send(503, {'error': {'key': 'busy', 'message': 'Busy'}})
+                    return None
+                return urlsplit(self.path)
+
+            def do_GET(self):
+                parts = self._begin()
+                if parts is None:
+                    return
+                if stub.version == 6:
+                    self._v6('GET', parts.path)
+                    return
+                query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+                if parts.path != '/admin/api.php' or 'customdns' not in query:
+                    self._send(404, {'error': 'Not found'})
+                elif query.get('auth') != stub.api_key:
+                    self._send(200, [])
+                elif query.get('action') == 'get':
+                    with stub._lock:
+                        data = sorted([domain, ip] for domain, ip in stub.mappings)
+                    self._send(200, {'data': data})
+                elif query.get('action') in ('add', 'delete'):
+                    self._send(200, stub._write(query['action'], query.get('domain'), query.get('ip')))
+                else:
+                    self._send(200, {'success': False, 'message': 'Unknown action'})
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def do_PUT(self):
+                self._dispatch('PUT')
+
+            def do_PATCH(self):
+                self._dispatch('PATCH')
+
+            def do_DELETE(self):
+                self._dispatch('DELETE')
+
+            def _dispatch(self, method):
+                parts = self._begin()
+                if parts is None:
+                    return
+                if stub.version == 6:
+                    self._v6(method, parts.path)
+                else:
+                    self._send(404, {'error': 'Not found'})
+
+            def _v6(self, method, path):
+                if path == '/api/auth':
+                    self._send(*stub._auth(method, self.body, self.headers.get('X-FTL-SID')))
+                elif not path.startswith('/api/config'):
+                    self._send(404, {'error': {'key': 'not_found', 'message': 'Not found', 'hint': path}})
+                elif self.headers.get('X-FTL-SID') not in stub.sessions:
+                    self._send(401, {'error': {'key': 'unauthorized', 'message': 'Unauthorized', 'hint': None}})
+                elif method == 'GET' and path == HOSTS_PATH:
+                    self._send(200, stub._hosts())
+                elif method == 'PATCH' and path == '/api/config':
+                    hosts = ((self.body or {}).get('config') or {}).get('dns', {}).get('hosts')
+                    self._send(*stub._replace_hosts(hosts))
+                elif method in ('PUT', 'DELETE') and path.startswith(HOSTS_PATH + '/'):
+                    ip, _, domain = unquote(path[len(HOSTS_PATH) + 1:]).partition(' ')
+                    self._send(*stub._write_v6(method, domain, ip))
+                else:
+                    self._send(400, {'error': {'key': 'bad_request', 'message': 'Invalid request', 'hint': path}})
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def _write(self, action, domain, ip):
+        with self._lock:
+            if action == 'add':
+                if any(existing == domain for existing, _ in self.mappings):
+                    return {'success': False, 'message': 'This domain already has a custom DNS entry for an IPv4'}
+                self.mappings.add((domain, ip))
+            else:
+                if (domain, ip) not in self.mappings:
+                    return {'success': False, 'message': 'This domain/ip association does not exist'}
+                self.mappings.discard((domain, ip))
+        return {'success': True, 'message': ''}
+
+    def _auth(self, method, body, sid):
+        with self._lock:
+            if method == 'DELETE':
+                self.sessions.discard(sid)
+                return 204, None
+            if method == 'POST' and (body or {}).get('password') == self.api_key:
+                self.logins += 1
+                sid = secrets.token_urlsafe(16)
+                self.sessions.add(sid)
+                return 200, {'session': {'valid': True, 'totp': False, 'sid': sid, 'csrf': 'csrf',
+                                         'validity': 1800, 'message': 'app-password correct'}}
+            return 401, {'session': {'valid': False, 'totp': False, 'sid': None, 'validity': -1,
+                                     'message': 'password incorrect' if method == 'POST' else 'no SID provided'}}
+
+    def _hosts(self):
+        with self._lock:
+            hosts = [f"{ip} {domain}" for domain, ip in sorted(self.mappings)]
+        return {'config': {'dns': {'hosts': hosts}}, 'took': 0.001}
+
+    def _replace_hosts(self, hosts):
+        if not isinstance(hosts, list):
+            return 400, {'error': {'key': 'bad_request', 'message': 'Invalid dns.hosts', 'hint': None}}
+        mappings = set()
+        for entry in hosts:
+            ip, *domains = entry.split()
+            mappings.update((domain, ip) for domain in domains)
+        with self._lock:
+            self.mappings = mappings
+        return 200, self._hosts()
+
+    def _write_v6(self, method, domain, ip):
+        with self._lock:
+            if method == 'PUT':
+                if (domain, ip) in self.mappings:
+                    return 400, {'error': {'key': 'bad_request', 'message': 'Item already present', 'hint': None}}
+                self.mappings.add((domain, ip))
+                return 201, {'took': 0.001}
+            if (domain, ip) not in self.mappings:
+                return 404, {'error': {'key': 'not_found', 'message': 'Item not found', 'hint': None}}
+            self.mappings.discard((domain, ip))
+            return 204, None
@@ -1,4 +1,14 @@
 #!/bin/sh
 set -e
 flask db upgrade
+flask assets build
+# Provision the Meraki network once, in the background, so workers start serving immediately
+flask provision &
+if [ "$SERVER_MODE" = "asgi" ]; then
+    if ! command -v uvicorn >/dev/null; then
+        echo "SERVER_MODE=asgi needs an image built with ASGI=1" >&2
+        exit 1
+    fi
+    exec uvicorn --host 0.0.0.0 --port $PORT --workers ${WEB_CONCURRENCY:-1} asgi:app
+fi
 exec gunicorn --bind 0.0.0.0:$PORT --timeout 120 run:app
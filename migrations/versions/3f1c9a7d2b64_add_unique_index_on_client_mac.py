@@ -0,0 +1,37 @@
+"""add unique index on client mac_address
+
+Revision ID: 3f1c9a7d2b64
+Revises: daf777b59f3f
+Create Date: 2026-10-18 09:12:41.204317
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b64'
+down_revision = 'daf777b59f3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Collapse duplicate MAC rows into the oldest one, keeping the earliest
+    # first_seen and the latest last_seen, before the unique index is created.
+    op.execute("""
+        UPDATE client SET
+            first_seen = (SELECT MIN(c.first_seen) FROM client c WHERE c.mac_address = client.mac_address),
+            last_seen = (SELECT MAX(c.last_seen) FROM client c WHERE c.mac_address = client.mac_address)
+        WHERE id IN (SELECT MIN(id) FROM client GROUP BY mac_address HAVING COUNT(*) > 1)
+    """)
+    op.execute("""
+        DELETE FROM client WHERE id NOT IN (SELECT MIN(id) FROM client GROUP BY mac_address)
+    """)
+
+    with op.batch_alter_table('client', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_client_mac_address'), ['mac_address'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('client', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_client_mac_address'))
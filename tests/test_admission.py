@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import patch
+from app import create_app, db
+from app.admission import AdmissionControl, TokenBucket, admission
+from app.models import Client, User
+
+class TokenBucketTestCase(unittest.TestCase):
+    @patch('app.admission.time.monotonic')
+    def test_bucket_refills_over_time(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        bucket = TokenBucket(capacity=2, rate=1)
+        self.assertTrue(bucket.take())
+        self.assertTrue(bucket.take())
+        self.assertFalse(bucket.take())
+        mock_monotonic.return_value = 1.5
+        self.assertTrue(bucket.take())
+        self.assertFalse(bucket.take())
+
+class AdmissionControlTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['ADMISSION_CONTROL_ENABLED'] = True
+        self.app.config['ADMISSION_MAC_BURST'] = 2
+        self.app.config['ADMISSION_MAC_RATE'] = 0.01
+        self.app.config['ADMISSION_MAX_CONCURRENT'] = 1
+        self.app.config['ADMISSION_QUEUE_TIMEOUT'] = 0
+        self.app.config['CLIENT_DEBOUNCE_SECONDS'] = 0
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_duplicate_probes_are_throttled(self):
+        control = AdmissionControl(self.app)
+        results = []
+        for _ in range(3):
+            with control.admit('00:11:22:33:44:55') as admitted:
+                results.append(admitted)
+        self.assertEqual(results, [True, True, False])
+        with control.admit('AA:BB:CC:DD:EE:FF') as admitted:
+            self.assertTrue(admitted)
+        self.assertEqual(control.stats()['throttled'], 1)
+
+    def test_concurrency_cap_degrades(self):
+        control = AdmissionControl(self.app)
+        with control.admit('00:11:22:33:44:55') as first:
+            self.assertTrue(first)
+            self.assertEqual(control.stats()['in_flight'], 1)
+            with control.admit('AA:BB:CC:DD:EE:FF') as second:
+                self.assertFalse(second)
+        self.assertEqual(control.stats()['in_flight'], 0)
+        self.assertEqual(control.stats()['degraded'], 1)
+        with control.admit('AA:BB:CC:DD:EE:FF') as third:
+            self.assertTrue(third)
+
+    def test_disabled_admits_everything(self):
+        self.app.config['ADMISSION_CONTROL_ENABLED'] = False
+        control = AdmissionControl(self.app)
+        for _ in range(5):
+            with control.admit('00:11:22:33:44:55') as admitted:
+                self.assertTrue(admitted)
+
+    def test_throttled_splash_is_served_without_persisting(self):
+        admission.init_app(self.app)
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/login', data={'username': 'testuser', 'password': 'password'})
+        for ip in ('1.2.3.4', '1.2.3.5', '1.2.3.6'):
+            response = client.get(f'/?client_mac=00:11:22:33:44:55&client_ip={ip}&base_grant_url=https://meraki.com')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'let timeLeft', response.data)
+        self.assertEqual(Client.query.filter_by(mac_address='00:11:22:33:44:55').one().ip_address, '1.2.3.5')
+        self.assertEqual(admission.stats()['throttled'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
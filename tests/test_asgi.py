@@ -0,0 +1,139 @@
+import asyncio
+import os
+import re
+import tempfile
+import unittest
+from unittest.mock import patch
+from app import create_app, db
+from app.asgi import PortalASGI, async_database_url
+from app.config import TestingConfig
+from app.grant_token import issue_grant_token
+from app.models import Client, User
+
+SPLASH_QUERY = b'client_mac=00:11:22:33:44:55&client_ip=1.2.3.4&base_grant_url=https://meraki.com'
+
+
+class ASGITestCase(unittest.TestCase):
+    def setUp(self):
+        # The async engine needs a database it can share with the sync one
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        with patch.object(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{self.db_path}'):
+            self.app = create_app('testing')
+        # No app context stays pushed: requests passed through to Flask would
+        # otherwise share its `g`, and with it the logged in user
+        with self.app.app_context():
+            db.create_all()
+            user = User(username='testuser')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+        client = self.app.test_client()
+        client.post('/login', data={'username': 'testuser', 'password': 'password'})
+        self.cookie = f"session={client.get_cookie('session').value}"
+        self.loop = asyncio.new_event_loop()
+        self.asgi = PortalASGI(self.app)
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.asgi.engine.dispose())
+        self.loop.close()
+        with self.app.app_context():
+            db.drop_all()
+        os.remove(self.db_path)
+
+    def request(self, path, query=b'', headers=None, method='GET'):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'root_path': '', 'query_string': query, 'server': ('localhost', 80),
+            'client': ('127.0.0.1', 1234),
+            'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        self.loop.run_until_complete(self.asgi(scope, receive, send))
+        start = messages[0]
+        body = b''.join(m.get('body', b'') for m in messages[1:])
+        return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+
+    def test_async_database_url(self):
+        self.assertEqual(str(async_database_url('sqlite:////tmp/x.db')), 'sqlite+aiosqlite:////tmp/x.db')
+        self.assertEqual(async_database_url('postgresql://u:p@db/portal').drivername, 'postgresql+asyncpg')
+        with self.assertRaises(ValueError):
+            async_database_url('mysql://u:p@db/portal')
+
+    def test_splash_records_sighting(self):
+        status, headers, body = self.request('/', SPLASH_QUERY, {'Cookie': self.cookie})
+        self.assertEqual(status, 200)
+        self.assertIn(b'let timeLeft = 10;', body)
+        self.assertIn('etag', headers)
+        with self.app.app_context():
+            client = Client.query.filter_by(mac_address='00:11:22:33:44:55').first()
+            self.assertIsNotNone(client)
+            self.assertEqual(client.ip_address, '1.2.3.4')
+
+    def test_splash_matches_wsgi_page(self):
+        _, _, body = self.request('/', SPLASH_QUERY, {'Cookie': self.cookie})
+        with self.app.test_client() as client:
+            client.post('/login', data={'username': 'testuser', 'password': 'password'})
+            response = client.get('/?' + SPLASH_QUERY.decode())
+        self.assertEqual(body, response.data)
+
+    def test_not_modified(self):
+        _, headers, _ = self.request('/', SPLASH_QUERY, {'Cookie': self.cookie})
+        status, _, body = self.request('/', SPLASH_QUERY, {'Cookie': self.cookie, 'If-None-Match': headers['etag']})
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+
+    def test_direct_access(self):
+        status, _, body = self.request('/', b'', {'Cookie': self.cookie})
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'Direct access is not supported.')
+
+    def test_anonymous_splash_falls_through_to_login(self):
+        status, headers, _ = self.request('/', SPLASH_QUERY)
+        self.assertEqual(status, 302)
+        self.assertIn('/login', headers['location'])
+
+    def test_connect_with_token(self):
+        _, _, body = self.request('/', SPLASH_QUERY, {'Cookie': self.cookie})
+        connect_url = re.search(rb'href="(/connect\?t=[^"]+)"', body).group(1).decode()
+        path, _, query = connect_url.partition('?')
+        status, headers, _ = self.request(path, query.encode())
+        self.assertEqual(status, 302)
+        self.assertEqual(headers['location'], 'https://meraki.com')
+
+    def test_connect_without_token(self):
+        status, headers, _ = self.request('/connect')
+        self.assertEqual(status, 302)
+        self.assertEqual(headers['location'], 'https://www.reddit.com')
+
+    def test_connect_quotes_non_latin1_url(self):
+        with self.app.app_context():
+            token = issue_grant_token('https://meraki.com/grant?continue_url=https://example.com/☃')
+        status, headers, _ = self.request('/connect', f't={token}'.encode())
+        self.assertEqual(status, 302)
+        self.assertEqual(headers['location'], 'https://meraki.com/grant?continue_url=https://example.com/%E2%98%83')
+
+    def test_connect_with_reset_password_token(self):
+        with self.app.app_context():
+            token = User.query.first().get_reset_password_token()
+        status, headers, _ = self.request('/connect', f't={token}'.encode())
+        self.assertEqual(status, 302)
+        self.assertEqual(headers['location'], 'https://www.reddit.com')
+
+    def test_admin_is_served_by_flask(self):
+        self.request('/', SPLASH_QUERY, {'Cookie': self.cookie, 'User-Agent': 'test-agent'})
+        status, _, body = self.request('/admin', headers={'Cookie': self.cookie})
+        self.assertEqual(status, 200)
+        self.assertIn(b'00:11:22:33:44:55', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from app import create_app, db
+from app.assets import assets, build_assets
+from app.models import User
+from app.splash_page import splash_page
+
+# The splash page and everything it pulls in must fit in a single small round
+# trip for clients that are still behind the walled garden.
+SPLASH_BYTE_BUDGET = 8 * 1024
+SPLASH_URL = '/?client_mac=00:11:22:33:44:55&client_ip=1.2.3.4&base_grant_url=https://meraki.com'
+ASSET_REFERENCE = re.compile(r'<(?:link|img|script)\b[^>]*\b(?:href|src)="([^"]+)"')
+
+class AssetsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.output_folder = tempfile.mkdtemp()
+        self.app.config['ASSETS_FOLDER'] = self.output_folder
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_folder)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def build(self):
+        manifest = build_assets(self.app.static_folder, self.output_folder)
+        assets.load_manifest(self.app)
+        splash_page.init_app(self.app)
+        return manifest
+
+    def login(self):
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        self.client.post('/login', data={'username': 'testuser', 'password': 'password'})
+
+    def test_build_fingerprints_and_precompresses(self):
+        manifest = self.build()
+        self.assertRegex(manifest['css/style.css'], r'^css/style\.[0-9a-f]{10}\.css$')
+        built = os.path.join(self.output_folder, manifest['css/style.css'])
+        self.assertTrue(os.path.exists(built))
+        with open(built + '.gz', 'rb') as f, open(os.path.join(self.app.static_folder, 'css/style.css'), 'rb') as src:
+            self.assertEqual(gzip.decompress(f.read()), src.read())
+        self.assertFalse(os.path.exists(os.path.join(self.output_folder, manifest['images/loader.gif'] + '.gz')))
+
+    def test_fingerprinted_assets_are_cached_forever(self):
+        manifest = self.build()
+        url = '/assets/' + manifest['css/style.css']
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+
+    def test_templates_reference_fingerprinted_assets(self):
+        manifest = self.build()
+        response = self.client.get('/login')
+        self.assertIn(('/assets/' + manifest['css/style.css']).encode(), response.data)
+
+    def test_splash_page_is_self_contained(self):
+        self.login()
+        for build in (False, True):
+            if build:
+                self.build()
+            response = self.client.get(SPLASH_URL)
+            html = response.get_data(as_text=True)
+            self.assertNotIn('stylesheet', html)
+            references = ASSET_REFERENCE.findall(html)
+            self.assertTrue(references)
+            for reference in references:
+                self.assertTrue(reference.startswith('/'), f"{reference} is not served by the portal")
+
+    def test_splash_page_byte_budget(self):
+        self.login()
+        self.build()
+        response = self.client.get(SPLASH_URL)
+        total = len(response.data)
+        for reference in ASSET_REFERENCE.findall(response.get_data(as_text=True)):
+            asset = self.client.get(reference)
+            self.assertEqual(asset.status_code, 200, reference)
+            total += len(asset.data)
+        self.assertLessEqual(total, SPLASH_BYTE_BUDGET)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from app import create_app, cache
+from app.compliance import compliance_matrix, summarize
+
+MERAKI_ENV = {'MERAKI_ORG_ID': 'org', 'EXTERNAL_PORT': '5001', 'MERAKI_FETCH_CONCURRENCY': '8'}
+
+
+@patch.dict('os.environ', MERAKI_ENV)
+class ComplianceMatrixTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        cache.clear()
+        self.dashboard = MagicMock()
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = \
+            {'rules': [{'name': 'Captive Portal'}]}
+        self.dashboard.wireless.getNetworkWirelessSsids.return_value = [
+            {'number': 0, 'name': 'Guest'}, {'number': 1, 'name': 'Staff'}]
+        self.dashboard.wireless.getNetworkWirelessSsidSplashSettings.side_effect = \
+            lambda network_id, number: {'splashUrl': 'http://portal.example.com:5001/' if number == 0 else None}
+        self.networks = [{'id': f'N_{i}', 'name': f'Net {i}'} for i in range(8)]
+        self.external_url = patch('app.meraki_api.get_external_url', return_value='portal.example.com')
+        mock_external_url = self.external_url.start()
+        patch('app.compliance.get_external_url', mock_external_url).start()
+        self.addCleanup(patch.stopall)
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_matrix_covers_every_pair(self):
+        rows = compliance_matrix(self.dashboard, 'org', self.networks, ['Guest', 'Staff'])
+        self.assertEqual([row['id'] for row in rows], [network['id'] for network in self.networks])
+        self.assertTrue(all(row['ssids'] == {'Guest': True, 'Staff': False} for row in rows))
+        self.assertFalse(any(row['compliant'] for row in rows))
+        self.assertEqual(summarize(rows, ['Guest', 'Staff']),
+                         {'networks': 8, 'compliant_networks': 0, 'pairs': 16, 'compliant_pairs': 8})
+        self.assertTrue(all(row['compliant'] for row in compliance_matrix(
+            self.dashboard, 'org', self.networks, ['Guest'])))
+
+    def test_networks_are_checked_concurrently(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow_ssids(network_id):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return []
+
+        self.dashboard.wireless.getNetworkWirelessSsids.side_effect = slow_ssids
+        started = time.monotonic()
+        compliance_matrix(self.dashboard, 'org', self.networks, ['Guest'], max_workers=4)
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertEqual(peak[0], 4)
+
+    def test_results_are_cached_per_pair(self):
+        compliance_matrix(self.dashboard, 'org', self.networks, ['Guest', 'Staff'])
+        compliance_matrix(self.dashboard, 'org', self.networks, ['Guest', 'Staff'])
+        # Only the portal's network needs the port forwarding rule
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.assert_called_once_with('N_0')
+        # One SSID list per network, one splash settings read per pair
+        self.assertEqual(self.dashboard.wireless.getNetworkWirelessSsids.call_count, 8)
+        self.assertEqual(self.dashboard.wireless.getNetworkWirelessSsidSplashSettings.call_count, 16)
+
+    def test_errors_are_reported_per_network(self):
+        self.dashboard.wireless.getNetworkWirelessSsids.side_effect = \
+            lambda network_id: [] if network_id != 'N_3' else None
+        rows = compliance_matrix(self.dashboard, 'org', self.networks, ['Guest'])
+        self.assertIsNotNone(rows[3]['error'])
+        self.assertIsNone(rows[2]['error'])
+
+    def test_rule_is_only_needed_on_portal_network(self):
+        networks = self.networks[:2]
+        rows = compliance_matrix(self.dashboard, 'org', networks, ['Guest'])
+        self.assertEqual([row['port_forwarding_rule_active'] for row in rows], [True, None])
+        self.assertEqual(summarize(rows, ['Guest'])['compliant_networks'], 2)
+        cache.clear()
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = {'rules': []}
+        rows = compliance_matrix(self.dashboard, 'org', networks, ['Guest'])
+        self.assertEqual([row['compliant'] for row in rows], [False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from app import create_app, db, dns_journal
+from app.dns_journal import mapping_checksum
+from app.models import DnsMapping, NetworkSyncCursor, SyncJournalEntry, SyncRun
+from app.pihole_api import PiholeClient
+from app.sync_scheduler import sync_scheduler
+from benchmarks.stub_pihole import StubPihole
+
+
+def client(mac, ip, hostname, last_seen='2026-10-18T10:00:00Z'):
+    return {'mac': mac, 'ip': ip, 'dhcpHostname': hostname, 'lastSeen': last_seen}
+
+
+class DnsJournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config['DNS_SYNC_LOCK_FILE'] = os.path.join(self.tmpdir, 'sync.lock')
+        sync_scheduler.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.stub = StubPihole(latency=0).start()
+        self.pihole = PiholeClient(self.stub.api_url, self.stub.api_key, max_workers=2)
+        self.patches = [
+            patch('app.sync_scheduler.get_pihole_client', return_value=self.pihole),
+            patch.object(sync_scheduler, '_ensure_worker'),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        sync_scheduler.stop()
+        self.pihole.close()
+        self.stub.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.tmpdir)
+
+    def sync(self, clients, incremental=False):
+        self.app.config['MERAKI_INCREMENTAL_SYNC'] = incremental
+        with patch('app.sync_scheduler.get_meraki_clients', return_value=iter(clients)):
+            return sync_scheduler.execute(sync_scheduler.enqueue())
+
+    def managed(self):
+        return {(row.hostname, row.ip, row.mac) for row in DnsMapping.query}
+
+    def test_full_sync_records_mappings(self):
+        self.stub.mappings = {('printer', '10.0.0.5'), ('manual', '10.0.0.200')}
+        run = self.sync([client('aa:01', '10.0.0.1', 'Laptop'), client('aa:05', '10.0.0.5', 'printer')])
+        self.assertEqual((run.status, run.adds, run.deletes, run.unchanged), ('succeeded', 1, 1, 1))
+        self.assertEqual(self.managed(), {('laptop', '10.0.0.1', 'aa:01'), ('printer', '10.0.0.5', 'aa:05')})
+        laptop = db.session.get(DnsMapping, 'laptop')
+        self.assertEqual(laptop.checksum, mapping_checksum('laptop', '10.0.0.1'))
+        self.assertIsNotNone(laptop.last_pushed)
+        # Already in Pi-hole, so managed from now on but never pushed
+        self.assertIsNone(db.session.get(DnsMapping, 'printer').last_pushed)
+        self.assertEqual({(entry.action, entry.hostname, entry.status) for entry in SyncJournalEntry.query},
+                         {('add', 'laptop', 'done'), ('delete', 'manual', 'done')})
+
+    def test_incremental_sync_plans_against_journal(self):
+        self.sync([client('aa:01', '10.0.0.1', 'laptop'), client('aa:02', '10.0.0.2', 'phone')])
+        self.stub.mappings.add(('manual', '10.0.0.200'))
+        with patch.object(self.pihole, 'get_mappings', wraps=self.pihole.get_mappings) as mock_get:
+            # The laptop moved, the phone is unchanged and a tablet is new
+            run = self.sync([client('aa:01', '10.0.0.7', 'laptop', '2026-10-18T11:00:00Z'),
+                             client('aa:02', '10.0.0.2', 'phone'),
+                             client('aa:03', '10.0.0.3', 'tablet')], incremental=True)
+        mock_get.assert_not_called()
+        self.assertEqual((run.status, run.adds, run.deletes), ('succeeded', 2, 1))
+        self.assertEqual(self.stub.mappings, {('laptop', '10.0.0.7'), ('phone', '10.0.0.2'),
+                                              ('tablet', '10.0.0.3'), ('manual', '10.0.0.200')})
+        self.assertEqual(self.managed(), {('laptop', '10.0.0.7', 'aa:01'), ('phone', '10.0.0.2', 'aa:02'),
+                                          ('tablet', '10.0.0.3', 'aa:03')})
+
+    def test_incremental_sync_without_journal_reads_pihole(self):
+        self.stub.mappings = {('phone', '10.0.0.2')}
+        run = self.sync([client('aa:01', '10.0.0.1', 'laptop')], incremental=True)
+        self.assertEqual((run.status, run.adds, run.deletes), ('succeeded', 1, 0))
+        self.assertEqual(self.managed(), {('laptop', '10.0.0.1', 'aa:01')})
+
+    @patch.object(dns_journal, 'BATCH_SIZE', 2)
+    def test_failed_writes_are_journaled(self):
+        self.stub.mappings = {('taken', '10.0.0.9')}
+        with patch.object(self.pihole, 'get_mappings', return_value=[]):
+            run = self.sync([client(f'aa:0{i}', f'10.0.0.{i}', f'host-{i}') for i in range(4)]
+                            + [client('aa:09', '10.0.0.8', 'taken')])
+        self.assertEqual((run.status, run.adds, run.errors), ('failed', 4, 1))
+        failed = SyncJournalEntry.query.filter_by(status='failed').one()
+        self.assertEqual(failed.hostname, 'taken')
+        self.assertIn('already has a custom DNS entry', failed.error)
+        self.assertNotIn('taken', {row.hostname for row in DnsMapping.query})
+
+    def test_cursors_advance_after_writes(self):
+        fetched_at = datetime(2026, 10, 18, 12, 0, 0)
+
+        def get_meraki_clients(incremental=False, cursors=None):
+            yield client('aa:01', '10.0.0.1', 'laptop')
+            cursors['N_0'] = fetched_at
+
+        self.stub.mappings = {('laptop', '10.0.0.9')}
+        with patch('app.sync_scheduler.get_meraki_clients', side_effect=get_meraki_clients), \
+                patch.object(self.pihole, 'get_mappings', return_value=[]):
+            run = sync_scheduler.execute(sync_scheduler.enqueue())
+        self.assertEqual(run.status, 'failed')
+        self.assertIsNone(db.session.get(NetworkSyncCursor, 'N_0'))
+
+        self.stub.mappings = set()
+        with patch('app.sync_scheduler.get_meraki_clients', side_effect=get_meraki_clients):
+            run = sync_scheduler.execute(sync_scheduler.enqueue())
+        self.assertEqual(run.status, 'succeeded')
+        self.assertEqual(db.session.get(NetworkSyncCursor, 'N_0').last_synced, fetched_at)
+
+    def test_interrupted_run_is_resumed(self):
+        run = SyncRun(trigger='schedule', dry_run=False, status='running', started_at=datetime.utcnow())
+        db.session.add(run)
+        db.session.flush()
+        for action, hostname, ip in [('delete', 'old', '10.0.0.9'), ('add', 'first', '10.0.0.1'),
+                                     ('add', 'second', '10.0.0.2')]:
+            db.session.add(SyncJournalEntry(run_id=run.id, action=action, hostname=hostname, ip=ip,
+                                            mac='aa:01', status='pending'))
+        db.session.commit()
+        # The delete and the first add reached Pi-hole before the worker died
+        self.stub.mappings = {('first', '10.0.0.1')}
+
+        self.assertEqual(sync_scheduler.run_pending(), 1)
+        resume = SyncRun.query.filter_by(trigger='resume').one()
+        self.assertEqual(db.session.get(SyncRun, run.id).message, f"Interrupted, resumed by run {resume.id}")
+        self.assertEqual((resume.status, resume.adds, resume.errors), ('succeeded', 1, 0))
+        self.assertEqual(self.stub.mappings, {('first', '10.0.0.1'), ('second', '10.0.0.2')})
+        self.assertEqual(SyncJournalEntry.query.filter_by(run_id=resume.id, status='done').count(), 3)
+        self.assertEqual({row.hostname for row in DnsMapping.query}, {'first', 'second'})
+
+    def test_pending_writes_of_failed_run(self):
+        run = sync_scheduler.enqueue()
+        db.session.add(SyncJournalEntry(run_id=run.id, action='add', hostname='laptop', ip='10.0.0.1',
+                                        status='pending'))
+        db.session.commit()
+        with patch('app.sync_scheduler.perform_sync', side_effect=RuntimeError('boom')):
+            sync_scheduler.execute(run)
+        entry = SyncJournalEntry.query.one()
+        self.assertEqual((entry.status, entry.error), ('failed', 'boom'))
+
+    def test_status_shows_progress(self):
+        self.sync([client('aa:01', '10.0.0.1', 'laptop')])
+        run = sync_scheduler.enqueue()
+        db.session.add(SyncJournalEntry(run_id=run.id, action='add', hostname='phone', ip='10.0.0.2',
+                                        status='pending'))
+        db.session.commit()
+        status = sync_scheduler.status()
+        self.assertEqual(status['managed'], 1)
+        self.assertEqual(status['current']['journal'], {'pending': 1, 'done': 0, 'failed': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import random
+import time
+import unittest
+from unittest.mock import MagicMock
+from app.dns_sync import Mapping, desired_mappings, normalize_pihole_mappings, plan_sync, sync_dns
+
+
+def client(ip, hostname, last_seen='2026-10-18T10:00:00Z'):
+    return {'ip': ip, 'dhcpHostname': hostname, 'lastSeen': last_seen}
+
+
+class DnsSyncTestCase(unittest.TestCase):
+    def test_minimal_plan(self):
+        clients = [client('10.0.0.1', 'kept'), client('10.0.0.2', 'Moved'), client('10.0.0.3', 'new'),
+                   client('10.0.0.4', None)]
+        current = [{'ip': '10.0.0.1', 'domain': 'kept'}, {'ip': '10.0.0.9', 'domain': 'moved'},
+                   {'ip': '10.0.0.8', 'domain': 'stale'}]
+        pihole = MagicMock()
+        plan, report = sync_dns(clients, current, pihole)
+        self.assertEqual(plan.adds, [Mapping('moved', '10.0.0.2'), Mapping('new', '10.0.0.3')])
+        self.assertEqual(plan.deletes, [Mapping('moved', '10.0.0.9'), Mapping('stale', '10.0.0.8')])
+        self.assertEqual(plan.unchanged, 1)
+        pihole.apply.assert_called_once_with(adds=plan.adds, deletes=plan.deletes)
+        self.assertIs(report, pihole.apply.return_value)
+
+    def test_without_prune_only_replaced_hostnames_are_deleted(self):
+        desired, _ = desired_mappings([client('10.0.0.2', 'moved')])
+        current = normalize_pihole_mappings([['moved', '10.0.0.9'], ['stale', '10.0.0.8']])
+        plan = plan_sync(desired, current, prune=False)
+        self.assertEqual(plan.deletes, [Mapping('moved', '10.0.0.9')])
+
+    def test_collisions_are_resolved_deterministically(self):
+        clients = [
+            client('10.0.0.1', 'laptop', '2026-10-18T09:00:00Z'),
+            client('10.0.0.2', 'laptop', '2026-10-18T10:00:00Z'),  # newer claim on the hostname wins
+            client('10.0.0.3', 'printer', '2026-10-18T08:00:00Z'),
+            client('10.0.0.3', 'phone', '2026-10-18T11:00:00Z'),  # newer claim on the IP wins
+            client('10.0.0.4', 'tv', '2026-10-18T10:00:00Z'),
+            client('10.0.0.5', 'tv', '2026-10-18T10:00:00Z'),  # tie: greatest IP wins
+        ]
+        expected = None
+        for _ in range(20):
+            random.shuffle(clients)
+            result = desired_mappings(clients)
+            if expected is None:
+                expected = result
+            self.assertEqual(result, expected)
+        desired, conflicts = expected
+        self.assertEqual(desired, {Mapping('laptop', '10.0.0.2'), Mapping('phone', '10.0.0.3'),
+                                   Mapping('tv', '10.0.0.5')})
+        self.assertEqual(conflicts, [Mapping('laptop', '10.0.0.1'), Mapping('printer', '10.0.0.3'),
+                                     Mapping('tv', '10.0.0.4')])
+
+    def test_duplicate_ip_loser_is_a_conflict(self):
+        for clients in ([client('10.0.0.1', 'a', '1'), client('10.0.0.1', 'b', '2')],
+                        [client('10.0.0.1', 'b', '2'), client('10.0.0.1', 'a', '1')]):
+            desired, conflicts = desired_mappings(clients)
+            self.assertEqual(desired, {Mapping('b', '10.0.0.1')})
+            self.assertEqual(conflicts, [Mapping('a', '10.0.0.1')])
+        # The same client seen twice is no conflict
+        self.assertEqual(desired_mappings([client('10.0.0.1', 'a', '1'), client('10.0.0.1', 'a', '2')])[1], [])
+
+    def test_steady_state_issues_no_writes(self):
+        clients = [client(f'10.{i // 65536}.{i // 256 % 256}.{i % 256}', f'host-{i}') for i in range(5000)]
+        current = [{'ip': c['ip'], 'domain': c['dhcpHostname']} for c in clients]
+        pihole = MagicMock()
+        started = time.process_time()
+        plan, report = sync_dns(clients, current, pihole)
+        elapsed = time.process_time() - started
+        self.assertEqual(plan.writes, 0)
+        self.assertEqual(plan.unchanged, 5000)
+        self.assertIsNone(report)
+        pihole.apply.assert_not_called()
+        self.assertLess(elapsed, 0.5)
+
+    def test_dry_run(self):
+        pihole = MagicMock()
+        plan, report = sync_dns([client('10.0.0.1', 'new')], [], pihole, dry_run=True)
+        self.assertEqual(plan.summary(), {'adds': 1, 'deletes': 0, 'unchanged': 0, 'conflicts': 0})
+        self.assertIsNone(report)
+        pihole.apply.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import re
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app import create_app, db
+from app.fast_lane import fast_lane
+from app.models import Client, User
+
+SPLASH_URL = '/?client_mac=00:11:22:33:44:55&client_ip=1.2.3.4&base_grant_url=https://meraki.com/grant'
+
+class FastLaneTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FAST_LANE_ENABLED'] = True
+        self.app.config['FAST_LANE_WINDOW_SECONDS'] = 3600
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        fast_lane.init_app(self.app)
+        self.client = self.app.test_client()
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        self.client.post('/login', data={'username': 'testuser', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_new_client_sees_splash_page(self):
+        response = self.client.get(SPLASH_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(fast_lane.stats()['misses'], 1)
+
+    def connect(self, response):
+        connect_url = re.search(r'href="(/connect[^"]*)"', response.get_data(as_text=True)).group(1)
+        return self.client.get(connect_url)
+
+    def test_granted_client_skips_splash_page(self):
+        self.connect(self.client.get(SPLASH_URL))
+        self.assertIsNotNone(Client.query.filter_by(mac_address='00:11:22:33:44:55').one().last_granted)
+        response = self.client.get(SPLASH_URL)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.location, 'https://meraki.com/grant')
+        stats = fast_lane.stats()
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['hit_rate'], 50.0)
+
+    def test_grant_is_read_from_database(self):
+        db.session.add(Client(mac_address='00:11:22:33:44:55', ip_address='1.2.3.4',
+                              last_granted=datetime.utcnow() - timedelta(minutes=5)))
+        db.session.commit()
+        response = self.client.get(SPLASH_URL)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(fast_lane.stats()['db_hits'], 1)
+
+    def test_expired_grant_sees_splash_page(self):
+        db.session.add(Client(mac_address='00:11:22:33:44:55', ip_address='1.2.3.4',
+                              last_granted=datetime.utcnow() - timedelta(hours=2)))
+        db.session.commit()
+        response = self.client.get(SPLASH_URL)
+        self.assertEqual(response.status_code, 200)
+
+    def test_miss_is_remembered(self):
+        self.client.get(SPLASH_URL)
+        with patch('app.fast_lane.Client.query') as mock_query:
+            response = self.client.get(SPLASH_URL)
+        self.assertEqual(response.status_code, 200)
+        mock_query.filter_by.assert_not_called()
+        self.assertEqual(fast_lane.stats()['memory_misses'], 1)
+        # A grant replaces the remembered miss
+        self.connect(response)
+        self.assertEqual(self.client.get(SPLASH_URL).status_code, 302)
+
+    def test_grant_without_client_row(self):
+        fast_lane.record_grant('66:77:88:99:aa:bb')
+        self.assertIsNone(Client.query.filter_by(mac_address='66:77:88:99:aa:bb').first())
+        self.assertTrue(fast_lane.is_granted('66:77:88:99:aa:bb'))
+
+    def test_disabled_fast_lane(self):
+        self.app.config['FAST_LANE_ENABLED'] = False
+        fast_lane.init_app(self.app)
+        self.connect(self.client.get(SPLASH_URL))
+        response = self.client.get(SPLASH_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Client.query.filter_by(mac_address='00:11:22:33:44:55').one().last_granted)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import re
+import time
+import unittest
+from unittest.mock import patch
+import jwt
+from app import create_app, db
+from app.grant_token import AUDIENCE, issue_grant_token, verify_grant_token
+from app.models import User
+
+SPLASH_URL = '/?client_mac=00:11:22:33:44:55&client_ip=1.2.3.4&base_grant_url=https://meraki.com/grant'
+
+class GrantTokenTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self):
+        self.client.post('/login', data={'username': 'testuser', 'password': 'password'})
+
+    def test_token_round_trip(self):
+        token = issue_grant_token('https://meraki.com/grant', '00:11:22:33:44:55')
+        claims = verify_grant_token(token)
+        self.assertEqual(claims['grant'], 'https://meraki.com/grant')
+        self.assertEqual(claims['mac'], '00:11:22:33:44:55')
+
+    def test_tampered_token_is_rejected(self):
+        token = issue_grant_token('https://meraki.com/grant')
+        self.assertIsNone(verify_grant_token(token[:-2] + 'xx'))
+
+    @patch('app.grant_token.time')
+    def test_expired_token_is_rejected(self, mock_time):
+        mock_time.return_value = 1000
+        token = issue_grant_token('https://meraki.com/grant', expires_in=60)
+        self.assertIsNone(verify_grant_token(token))
+
+    def test_splash_page_links_to_signed_connect_url(self):
+        self.login()
+        response = self.client.get(SPLASH_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Set-Cookie', response.headers)
+        match = re.search(r'href="/connect\?t=([^"]+)"', response.get_data(as_text=True))
+        self.assertIsNotNone(match)
+        self.assertIn(f'const redirectUrl = "/connect?t={match.group(1)}"'.encode(), response.data)
+
+    @patch('app.grant_token.time', return_value=time.time())
+    def test_repeat_probe_is_not_modified(self, mock_time):
+        self.login()
+        etag = self.client.get(SPLASH_URL).headers['ETag']
+        response = self.client.get(SPLASH_URL, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_connect_follows_token_without_cookies(self):
+        token = issue_grant_token('https://meraki.com/grant', '00:11:22:33:44:55')
+        client = self.app.test_client(use_cookies=False)
+        response = client.get(f'/connect?t={token}')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.location, 'https://meraki.com/grant')
+
+    def test_reset_password_token_is_not_a_grant(self):
+        token = User.query.first().get_reset_password_token()
+        self.assertIsNone(verify_grant_token(token))
+        with self.client.session_transaction() as sess:
+            sess['redirect_url'] = 'https://meraki.com/session-grant'
+        response = self.client.get(f'/connect?t={token}')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.location, 'https://meraki.com/session-grant')
+
+    def test_token_without_grant_is_rejected(self):
+        token = jwt.encode({'aud': AUDIENCE, 'exp': time.time() + 60}, self.app.config['SECRET_KEY'],
+                           algorithm='HS256')
+        self.assertIsNone(verify_grant_token(token))
+
+    def test_connect_with_invalid_token_uses_default(self):
+        response = self.client.get('/connect?t=not-a-token')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.location, 'https://www.reddit.com')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from app import create_app, meraki_api
+from app.inventory import inventory
+from app.rate_limit import rate_limits
+
+DEVICES = [
+    {'serial': 'Q2MX-0001', 'model': 'MX68', 'productType': 'appliance', 'networkId': 'N_1'},
+    {'serial': 'Q2MR-0001', 'model': 'MR46', 'productType': 'wireless', 'networkId': 'N_1'},
+    {'serial': 'Q2MX-0002', 'model': 'MX85', 'networkId': 'N_2'},
+    {'serial': 'Q2MS-0001', 'model': 'MS120', 'productType': 'switch', 'networkId': 'N_2'},
+]
+
+
+@patch.dict('os.environ', {'MERAKI_ORG_ID': 'org', 'MERAKI_ORG_RATE': '1000'})
+class InventoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        rate_limits.reset()
+        self.dashboard = MagicMock()
+        self.dashboard.organizations.getOrganizationDevices.return_value = DEVICES
+
+    def tearDown(self):
+        inventory.stop()
+        self.app_context.pop()
+
+    def test_appliance_lookups_use_one_org_call(self):
+        self.assertEqual(meraki_api.get_appliance_serial(self.dashboard, 'N_1'), 'Q2MX-0001')
+        # No productType: falls back to the model name
+        self.assertEqual(meraki_api.get_appliance_serial(self.dashboard, 'N_2'), 'Q2MX-0002')
+        self.assertIsNone(meraki_api.get_appliance_serial(self.dashboard, 'N_3'))
+        self.dashboard.organizations.getOrganizationDevices.assert_called_once_with('org', total_pages='all')
+        self.dashboard.networks.getNetworkDevices.assert_not_called()
+
+    def test_devices_by_network_and_type(self):
+        inventory.refresh(self.dashboard)
+        self.assertEqual({d['serial'] for d in inventory.devices('N_2')}, {'Q2MX-0002', 'Q2MS-0001'})
+        self.assertEqual([d['serial'] for d in inventory.devices('N_1', 'wireless')], ['Q2MR-0001'])
+        self.assertEqual(inventory.device('Q2MS-0001')['networkId'], 'N_2')
+        self.assertEqual(inventory.stats()['devices'], 4)
+
+    def test_failed_refresh_keeps_index(self):
+        inventory.refresh(self.dashboard)
+        self.dashboard.organizations.getOrganizationDevices.side_effect = RuntimeError('boom')
+        self.assertFalse(inventory.refresh(self.dashboard))
+        self.assertEqual(inventory.appliance('N_1')['serial'], 'Q2MX-0001')
+        self.assertEqual(inventory.stats()['refresh_errors'], 1)
+
+    @patch('app.inventory.get_dashboard')
+    def test_failed_load_is_not_retried_by_lookups(self, mock_get_dashboard):
+        mock_get_dashboard.return_value = self.dashboard
+        self.dashboard.organizations.getOrganizationDevices.side_effect = RuntimeError('429 Too Many Requests')
+        for _ in range(5):
+            self.assertIsNone(meraki_api.get_appliance_serial(self.dashboard, 'N_1'))
+            self.assertEqual(inventory.devices('N_1'), [])
+        self.dashboard.organizations.getOrganizationDevices.assert_called_once()
+        self.assertEqual(inventory.stats()['refresh_errors'], 1)
+
+        # Once the refresh interval has passed, a lookup tries again
+        self.dashboard.organizations.getOrganizationDevices.side_effect = None
+        inventory._load_attempted -= inventory.refresh_interval
+        self.assertEqual(meraki_api.get_appliance_serial(self.dashboard, 'N_1'), 'Q2MX-0001')
+        self.assertEqual(self.dashboard.organizations.getOrganizationDevices.call_count, 2)
+
+    @patch('app.inventory.get_dashboard')
+    def test_scheduled_refresh(self, mock_get_dashboard):
+        mock_get_dashboard.return_value = self.dashboard
+        inventory.refresh_interval = 0.05
+        inventory.appliance('N_1')
+        inventory._thread.join(timeout=0.3)
+        self.assertGreater(self.dashboard.organizations.getOrganizationDevices.call_count, 1)
+
+    def test_external_url_uses_indexed_serial(self):
+        self.dashboard.devices.getDeviceManagementInterface.return_value = \
+            {'ddnsHostnames': {'activeDdnsHostname': 'portal-abc.dynamic-m.com'}}
+        self.assertEqual(meraki_api.get_external_url(self.dashboard, 'org', 'N_1'), 'portal-abc.dynamic-m.com')
+        self.dashboard.devices.getDeviceManagementInterface.assert_called_once_with('Q2MX-0001')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from unittest.mock import patch
+from app.lru import LRUCache
+
+class LRUCacheTestCase(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    @patch('app.lru.time.monotonic')
+    def test_entries_expire_after_ttl(self, mock_monotonic):
+        cache = LRUCache(ttl=10)
+        mock_monotonic.return_value = 100
+        cache.set('a', 1)
+        mock_monotonic.return_value = 105
+        self.assertIn('a', cache)
+        mock_monotonic.return_value = 111
+        self.assertNotIn('a', cache)
+        self.assertEqual(len(cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import time
+import unittest
+from typing import Optional
+from unittest.mock import patch, MagicMock
+import meraki
+from app import cache, create_app
+from app.memo import ERROR_TIMEOUT, memoize
+from app import meraki_api
+
+calls: list[tuple[str, Optional[str]]] = []
+results: dict[str, Optional[str]] = {}
+
+
+@memoize(timeout=60, stale=60)
+def lookup(dashboard, network_id, ssid_name=None):
+    calls.append((network_id, ssid_name))
+    return results.get(network_id, f"{network_id}/{ssid_name}/{len(calls)}")
+
+
+class MemoizeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        calls.clear()
+        results.clear()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_keyed_on_arguments(self):
+        first = lookup(object(), 'net-1')
+        self.assertEqual(lookup(object(), 'net-1'), first)
+        self.assertNotEqual(lookup(None, 'net-2'), first)
+        self.assertNotEqual(lookup(None, 'net-1', 'Guest'), first)
+        self.assertEqual(lookup(None, network_id='net-1', ssid_name='Guest'), lookup(None, 'net-1', 'Guest'))
+        self.assertEqual(len(calls), 3)
+
+    def test_invalidate(self):
+        lookup(None, 'net-1')
+        lookup(None, 'net-2')
+        lookup.invalidate(None, 'net-1')
+        lookup(None, 'net-1')
+        lookup(None, 'net-2')
+        self.assertEqual(calls, [('net-1', None), ('net-2', None), ('net-1', None)])
+
+    def test_stale_while_revalidate(self):
+        first = lookup(None, 'net-1')
+        with patch('app.memo.time.time', return_value=time.time() + 90), \
+                patch('app.memo.threading.Thread') as mock_thread:
+            self.assertEqual(lookup(None, 'net-1'), first)
+            self.assertEqual(lookup(None, 'net-1'), first)
+        # Only one refresh is started for a key, and it runs off the caller's thread
+        mock_thread.assert_called_once()
+        self.assertEqual(len(calls), 1)
+        kwargs = mock_thread.call_args.kwargs
+        kwargs['target'](*kwargs['args'])
+        self.assertEqual(len(calls), 2)
+        self.assertNotEqual(lookup(None, 'net-1'), first)
+
+    def test_failure_is_cached_briefly(self):
+        results['net-1'] = None
+        with patch.object(cache, 'set', wraps=cache.set) as mock_set:
+            self.assertIsNone(lookup(None, 'net-1'))
+        self.assertEqual(mock_set.call_args.kwargs['timeout'], ERROR_TIMEOUT)
+        self.assertIsNone(lookup(None, 'net-1'))
+        self.assertEqual(len(calls), 1)
+        del results['net-1']
+        with patch('app.memo.time.time', return_value=time.time() + ERROR_TIMEOUT + 1), \
+                patch('app.memo.threading.Thread') as mock_thread:
+            # Past its freshness the failure is refreshed like any other result
+            lookup(None, 'net-1')
+            kwargs = mock_thread.call_args.kwargs
+            kwargs['target'](*kwargs['args'])
+        self.assertEqual(lookup(None, 'net-1'), 'net-1/None/2')
+
+    def test_failed_refresh_keeps_stale_result(self):
+        first = lookup(None, 'net-1')
+        results['net-1'] = None
+        with patch('app.memo.time.time', return_value=time.time() + 90), \
+                patch('app.memo.threading.Thread') as mock_thread:
+            self.assertEqual(lookup(None, 'net-1'), first)
+            kwargs = mock_thread.call_args.kwargs
+            kwargs['target'](*kwargs['args'])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(lookup(None, 'net-1'), first)
+
+    def test_api_error_is_not_cached_as_a_result(self):
+        dashboard = MagicMock()
+        response = MagicMock(status_code=500, reason='Server Error', text='', headers={})
+        dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.side_effect = \
+            meraki.APIError({'tags': ['appliance'], 'operation': 'getRules'}, response)
+        self.assertIsNone(meraki_api.verify_port_forwarding_rule(dashboard, 'net-1'))
+        cached, fresh_until = cache.get(meraki_api.verify_port_forwarding_rule.make_key(None, 'net-1'))
+        self.assertIsNone(cached)
+        self.assertLessEqual(fresh_until, time.time() + ERROR_TIMEOUT)
+
+    def test_no_app_context(self):
+        self.app_context.pop()
+        try:
+            lookup(None, 'net-1')
+            lookup(None, 'net-1')
+        finally:
+            self.app_context.push()
+        self.assertEqual(len(calls), 2)
+
+    def test_port_forwarding_rule_is_per_network(self):
+        dashboard = MagicMock()
+        dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.side_effect = \
+            lambda network_id: {'rules': [{'name': 'Captive Portal'}] if network_id == 'net-1' else []}
+        self.assertTrue(meraki_api.verify_port_forwarding_rule(dashboard, 'net-1'))
+        self.assertFalse(meraki_api.verify_port_forwarding_rule(dashboard, 'net-2'))
+
+    @patch.dict('os.environ', {'LAN_IP': '192.168.1.10'})
+    def test_adding_rule_invalidates_verification(self):
+        dashboard = MagicMock()
+        dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = {'rules': []}
+        self.assertFalse(meraki_api.verify_port_forwarding_rule(dashboard, 'net-1'))
+        meraki_api.add_port_forwarding_rule(dashboard, 'net-1')
+        dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = \
+            {'rules': [{'name': 'Captive Portal'}]}
+        self.assertTrue(meraki_api.verify_port_forwarding_rule(dashboard, 'net-1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
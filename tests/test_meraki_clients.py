@@ -0,0 +1,221 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+import meraki
+from app import create_app, db, meraki_api
+from app.models import NetworkSyncCursor, SyncRun, User
+from app.rate_limit import rate_limits
+from app.sync_scheduler import sync_scheduler
+
+BASE_URL = 'https://api.meraki.com/api/v1'
+
+
+class FakeResponse:
+    def __init__(self, items, next_url=None):
+        self.status_code = 200
+        self._items = items
+        self.links = {'next': {'url': next_url}} if next_url else {}
+
+    def json(self):
+        return self._items
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """
+    Serves `clients_per_network` clients per network in pages of `page_size`.
+    """
+
+    def __init__(self, clients_per_network=5, page_size=2, latency=0.0, fail_network=None):
+        self._base_url = BASE_URL
+        self.clients_per_network = clients_per_network
+        self.page_size = page_size
+        self.latency = latency
+        self.fail_network = fail_network
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def request(self, metadata, method, url, params=None):
+        with self.lock:
+            self.requests.append((url, params))
+        time.sleep(self.latency)
+        path, _, query = url.partition('?')
+        network_id = path.split('/')[2]
+        if network_id == self.fail_network:
+            response = MagicMock(status_code=500, reason_phrase='Server Error')
+            response.json.return_value = {'errors': ['boom']}
+            raise meraki.APIError(metadata, response)
+        start = int(query.split('=')[1]) if query else 0
+        end = start + self.page_size
+        items = [{'ip': f'{network_id}-{i}', 'dhcpHostname': f'host-{network_id}-{i}'}
+                 for i in range(start, min(end, self.clients_per_network))]
+        next_url = f'{BASE_URL}{path}?startingAfter={end}' if end < self.clients_per_network else None
+        return FakeResponse(items, next_url)
+
+
+def fake_dashboard(session, networks=3):
+    dashboard = MagicMock()
+    dashboard._session = session
+    dashboard.organizations.getOrganizationNetworks.return_value = [{'id': f'N_{i}'} for i in range(networks)]
+    return dashboard
+
+
+@patch.dict('os.environ', {'MERAKI_ORG_ID': 'org', 'MERAKI_ORG_RATE': '1000', 'MERAKI_FETCH_CONCURRENCY': '4'})
+class MerakiClientsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        rate_limits.reset()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_pages_are_followed(self):
+        session = FakeSession(clients_per_network=5, page_size=2)
+        pages = list(meraki_api.iter_network_client_pages(fake_dashboard(session), meraki_api.org_limiter('org'),
+                                                           'N_0', timespan=86400))
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(session.requests[0], ('/networks/N_0/clients', {'timespan': 86400, 'perPage': 1000}))
+        self.assertEqual(session.requests[1], ('/networks/N_0/clients?startingAfter=2', None))
+
+    def test_get_meraki_clients_streams_all_networks(self):
+        session = FakeSession(clients_per_network=5, page_size=2)
+        with patch('app.meraki_api.get_dashboard', return_value=fake_dashboard(session)):
+            clients = meraki_api.get_meraki_clients()
+            self.assertNotIsInstance(clients, list)
+            ips = sorted(client['ip'] for client in clients)
+        self.assertEqual(ips, sorted(f'N_{n}-{i}' for n in range(3) for i in range(5)))
+
+    def test_stream_is_bounded(self):
+        session = FakeSession(clients_per_network=1000, page_size=1)
+        stream = meraki_api.stream_network_clients(fake_dashboard(session), 'org', [{'id': 'N_0'}])
+        next(stream)
+        time.sleep(0.2)
+        # Fetching stops once the page queue is full, instead of pulling everything
+        self.assertLess(len(session.requests), 20)
+        stream.close()
+
+    def test_error_is_raised(self):
+        session = FakeSession(fail_network='N_1')
+        with patch('app.meraki_api.get_dashboard', return_value=fake_dashboard(session)):
+            with self.assertRaises(meraki.APIError):
+                list(meraki_api.get_meraki_clients())
+
+    def test_incremental_mode_uses_cursors(self):
+        last_run = datetime(2026, 10, 1, 12, 0, 0)
+        db.session.add(NetworkSyncCursor(network_id='N_0', last_synced=last_run))
+        db.session.commit()
+        session = FakeSession(clients_per_network=1)
+        with patch('app.meraki_api.get_dashboard', return_value=fake_dashboard(session, networks=2)), \
+                patch('app.meraki_api.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = last_run + timedelta(days=1)
+            cursors = {}
+            list(meraki_api.get_meraki_clients(incremental=True, cursors=cursors))
+
+        params = dict(session.requests)
+        self.assertEqual(params['/networks/N_0/clients'], {'t0': '2026-10-01T11:55:00Z', 'perPage': 1000})
+        self.assertEqual(params['/networks/N_1/clients'], {'timespan': 86400, 'perPage': 1000})
+        expected = {'N_0': last_run + timedelta(days=1), 'N_1': last_run + timedelta(days=1)}
+        self.assertEqual(cursors, expected)
+        # Nothing is stored until the caller has applied the clients
+        self.assertEqual(db.session.get(NetworkSyncCursor, 'N_0').last_synced, last_run)
+        meraki_api.advance_cursors(cursors)
+        self.assertEqual({c.network_id: c.last_synced for c in NetworkSyncCursor.query.all()}, expected)
+
+    def test_incremental_cursor_not_advanced_on_error(self):
+        session = FakeSession(fail_network='N_0')
+        cursors = {}
+        with patch('app.meraki_api.get_dashboard', return_value=fake_dashboard(session, networks=1)):
+            with self.assertRaises(meraki.APIError):
+                list(meraki_api.get_meraki_clients(incremental=True, cursors=cursors))
+        self.assertEqual(cursors, {})
+
+
+@patch.dict('os.environ', {'MERAKI_ORG_ID': 'org', 'MERAKI_ORG_RATE': '1000'})
+class ForceSyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        rate_limits.reset()
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.client.post('/login', data={'username': 'testuser', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def pihole(self, mappings):
+        pihole = MagicMock()
+        pihole.get_mappings.return_value = mappings
+        pihole.apply.side_effect = lambda adds, deletes: MagicMock(added=len(adds), deleted=len(deletes), failed=[], elapsed=0.0)
+        return pihole
+
+    def queue(self, dry_run=False):
+        run = SyncRun(trigger='manual', dry_run=dry_run, status='queued')
+        db.session.add(run)
+        db.session.commit()
+        return run
+
+    def test_force_sync_only_queues(self):
+        with patch.object(sync_scheduler, '_ensure_worker') as mock_worker, \
+                patch('app.sync_scheduler.perform_sync') as mock_sync:
+            response = self.client.post('/force_sync', follow_redirects=True)
+            # A second request while the first is waiting joins it
+            self.client.post('/force_sync')
+        self.assertIn(b'Sync queued (run 1)', response.data)
+        mock_worker.assert_called()
+        mock_sync.assert_not_called()
+        run = SyncRun.query.one()
+        self.assertEqual((run.status, run.trigger, run.dry_run), ('queued', 'manual', False))
+
+    @patch('app.sync_scheduler.get_pihole_client')
+    def test_sync_adds_and_removes(self, mock_get_client):
+        pihole = mock_get_client.return_value = self.pihole(
+            [{'ip': 'N_0-0', 'hostname': 'host-N_0-0'}, {'ip': '10.0.0.9', 'hostname': 'gone'}])
+        with patch('app.meraki_api.get_dashboard', return_value=fake_dashboard(FakeSession(2), networks=1)):
+            run = sync_scheduler.execute(self.queue())
+        # host-N_0-0 is already mapped, so only the new client is written
+        pihole.apply.assert_called_once_with(adds=[('host-n_0-1', 'N_0-1')], deletes=[('gone', '10.0.0.9')])
+        self.assertEqual((run.status, run.adds, run.deletes, run.unchanged, run.errors), ('succeeded', 1, 1, 1, 0))
+
+    @patch('app.sync_scheduler.get_pihole_client')
+    def test_dry_run_writes_nothing(self, mock_get_client):
+        pihole = mock_get_client.return_value = self.pihole([{'ip': '10.0.0.9', 'hostname': 'gone'}])
+        with patch('app.meraki_api.get_dashboard', return_value=fake_dashboard(FakeSession(2), networks=1)):
+            run = sync_scheduler.execute(self.queue(dry_run=True))
+        self.assertEqual((run.status, run.adds, run.deletes), ('succeeded', 2, 1))
+        pihole.apply.assert_not_called()
+
+    @patch('app.sync_scheduler.get_pihole_client')
+    def test_sync_failure_deletes_nothing(self, mock_get_client):
+        pihole = mock_get_client.return_value = self.pihole([{'ip': '10.0.0.9', 'hostname': 'kept'}])
+        session = FakeSession(fail_network='N_0')
+        with patch('app.meraki_api.get_dashboard', return_value=fake_dashboard(session, networks=1)):
+            run = sync_scheduler.execute(self.queue())
+        self.assertEqual(run.status, 'failed')
+        self.assertIn('Could not fetch clients from Meraki', run.message)
+        pihole.apply.assert_not_called()
+
+    @patch('app.sync_scheduler.get_pihole_client', return_value=None)
+    def test_sync_without_pihole(self, mock_get_client):
+        run = sync_scheduler.execute(self.queue())
+        self.assertEqual(run.status, 'failed')
+        self.assertIn('PIHOLE_API_URL', run.message)
+
+if __name__ == '__main__':
+    unittest.main()
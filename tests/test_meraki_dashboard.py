@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch
+from app import meraki_dashboard
+from app.meraki_dashboard import get_dashboard
+from app.rate_limit import call_limited, rate_limits
+
+API_KEY = 'a' * 40
+
+
+class MerakiDashboardTestCase(unittest.TestCase):
+    def setUp(self):
+        meraki_dashboard._reset_after_fork()
+
+    def tearDown(self):
+        meraki_dashboard._reset_after_fork()
+
+    @patch.dict('os.environ', {'MERAKI_API_KEY': ''})
+    def test_no_api_key(self):
+        self.assertIsNone(get_dashboard())
+
+    @patch.dict('os.environ', {'MERAKI_API_KEY': API_KEY})
+    def test_shared_instance(self):
+        self.assertIs(get_dashboard(), get_dashboard())
+
+    def test_rebuilt_when_api_key_changes(self):
+        with patch.dict('os.environ', {'MERAKI_API_KEY': API_KEY}):
+            first = get_dashboard()
+        with patch.dict('os.environ', {'MERAKI_API_KEY': 'b' * 40}):
+            second = get_dashboard()
+        self.assertIsNot(first, second)
+
+    @patch.dict('os.environ', {'MERAKI_API_KEY': API_KEY})
+    def test_rebuilt_in_new_process(self):
+        first = get_dashboard()
+        with patch('app.meraki_dashboard.os.getpid', return_value=-1):
+            self.assertIsNot(get_dashboard(), first)
+
+    @patch.dict('os.environ', {'MERAKI_API_KEY': API_KEY, 'MERAKI_POOL_SIZE': '4',
+                               'MERAKI_REQUEST_TIMEOUT': '15'})
+    def test_pool_and_timeout(self):
+        session = get_dashboard()._session
+        client = getattr(session, '_client', None)
+        if client is None:
+            self.skipTest('Meraki SDK does not use httpx')
+        self.assertEqual(client._transport._pool._max_connections, 4)
+        self.assertEqual(client.timeout.read, 15)
+        self.assertIn('authorization', client.headers)
+
+    @patch.dict('os.environ', {'MERAKI_API_KEY': API_KEY, 'MERAKI_ORG_ID': 'org'})
+    def test_calls_are_rate_limited(self):
+        dashboard = get_dashboard()
+        with patch.object(dashboard._dashboard.organizations, 'getOrganizationNetworks',
+                          return_value=[{'id': 'N_1'}]) as mock_call:
+            with patch('app.meraki_dashboard.call_limited', wraps=call_limited) as mock_limited:
+                self.assertEqual(dashboard.organizations.getOrganizationNetworks('org'), [{'id': 'N_1'}])
+        mock_call.assert_called_once_with('org')
+        self.assertIs(mock_limited.call_args[0][0], rate_limits.limiter('org'))
+
+
+if __name__ == '__main__':
+    unittest.main()
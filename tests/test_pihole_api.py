@@ -0,0 +1,158 @@
+import unittest
+from unittest.mock import patch
+from app import pihole_api
+from app.dns_sync import Mapping
+from app.pihole_api import LegacyBackend, PiholeClient, PiholeError, V6Backend, base_url, get_pihole_client
+from benchmarks.stub_pihole import StubPihole
+
+
+class PiholeClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubPihole(latency=0.005).start()
+        self.client = PiholeClient(self.stub.api_url, self.stub.api_key, max_workers=4)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_apply_reuses_connections(self):
+        mappings = [Mapping(f'host-{i}', f'10.0.0.{i}') for i in range(40)]
+        report = self.client.apply(adds=mappings)
+        self.assertTrue(report.ok)
+        self.assertEqual(report.added, 40)
+        self.assertEqual(len(self.stub.mappings), 40)
+        self.assertLessEqual(self.stub.connections, 4)
+        self.assertEqual(self.client.get_mappings()[0], {'ip': '10.0.0.0', 'hostname': 'host-0'})
+
+    def test_deletes_run_before_adds(self):
+        self.stub.mappings = {('moved', '10.0.0.9')}
+        report = self.client.apply(adds=[Mapping('moved', '10.0.0.2')], deletes=[Mapping('moved', '10.0.0.9')])
+        self.assertEqual(report.summary()['added'], 1)
+        self.assertEqual(report.deleted, 1)
+        self.assertEqual(self.stub.mappings, {('moved', '10.0.0.2')})
+
+    def test_failures_are_reported(self):
+        self.stub.mappings = {('taken', '10.0.0.1')}
+        report = self.client.apply(adds=[Mapping('taken', '10.0.0.2'), Mapping('free', '10.0.0.3')])
+        self.assertFalse(report.ok)
+        self.assertEqual(report.added, 1)
+        self.assertEqual([(action, mapping) for action, mapping, _ in report.failed],
+                         [('add', Mapping('taken', '10.0.0.2'))])
+
+    def test_server_errors_are_retried(self):
+        self.stub.fail_every = 2
+        client = PiholeClient(self.stub.api_url, self.stub.api_key, max_workers=1)
+        report = client.apply(adds=[Mapping(f'host-{i}', f'10.0.0.{i}') for i in range(10)])
+        self.assertTrue(report.ok)
+        self.assertGreater(self.stub.failed, 0)
+
+    def test_api_key_is_not_in_errors(self):
+        client = PiholeClient('http://127.0.0.1:9/admin/api.php', 'secret-key', timeout=0.5, retries=0)
+        with self.assertRaises(PiholeError) as raised:
+            client.get_mappings()
+        self.assertNotIn('secret-key', str(raised.exception))
+
+
+class V6BackendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubPihole(latency=0.005, version=6).start()
+        # The v5 URL: an upgraded Pi-hole is detected without a config change
+        self.client = PiholeClient(self.stub.api_url, self.stub.api_key, max_workers=4)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_detects_v6(self):
+        self.assertIsInstance(self.client.backend, V6Backend)
+        legacy = StubPihole(latency=0).start()
+        try:
+            self.assertIsInstance(PiholeClient(legacy.api_url, legacy.api_key).backend, LegacyBackend)
+        finally:
+            legacy.stop()
+
+    def test_apply_is_one_bulk_update(self):
+        self.stub.mappings = {('moved', '10.0.0.9'), ('manual', '10.0.0.200')}
+        self.client.get_mappings()
+        requests_before = self.stub.requests
+        adds = [Mapping(f'host-{i}', f'10.0.1.{i}') for i in range(100)] + [Mapping('moved', '10.0.0.2')]
+        report = self.client.apply(adds=adds, deletes=[Mapping('moved', '10.0.0.9')])
+        self.assertTrue(report.ok)
+        self.assertEqual((report.added, report.deleted), (101, 1))
+        # One read of the hosts list and one replacement, whatever the number of mappings
+        self.assertEqual(self.stub.requests - requests_before, 2)
+        self.assertEqual(len(self.stub.mappings), 102)
+        self.assertIn(('manual', '10.0.0.200'), self.stub.mappings)
+        self.assertNotIn(('moved', '10.0.0.9'), self.stub.mappings)
+        self.assertEqual(self.stub.logins, 1)
+
+    def test_other_hostnames_of_an_entry_are_kept(self):
+        with patch.object(self.stub, '_hosts', return_value={'config': {'dns': {'hosts': ['10.0.0.1 Router gw']}}}):
+            self.assertEqual(self.client.get_mappings(), [{'ip': '10.0.0.1', 'hostname': 'Router'},
+                                                          {'ip': '10.0.0.1', 'hostname': 'gw'}])
+            self.client.apply(deletes=[Mapping('gw', '10.0.0.1')])
+        self.assertEqual(self.stub.mappings, {('Router', '10.0.0.1')})
+
+    def test_single_writes(self):
+        self.client.add('10.0.0.1', 'printer')
+        self.assertEqual(self.stub.mappings, {('printer', '10.0.0.1')})
+        self.client.delete('10.0.0.1', 'printer')
+        self.assertEqual(self.stub.mappings, set())
+        with self.assertRaises(PiholeError):
+            self.client.delete('10.0.0.1', 'printer')
+
+    def test_expired_session_is_renewed(self):
+        self.client.get_mappings()
+        self.stub.expire_sessions()
+        self.client.get_mappings()
+        self.assertEqual(self.stub.logins, 2)
+
+    def test_wrong_password(self):
+        client = PiholeClient(self.stub.api_url, 'wrong')
+        with self.assertRaises(PiholeError) as raised:
+            client.get_mappings()
+        self.assertIn('password incorrect', str(raised.exception))
+        report = client.apply(adds=[Mapping('host', '10.0.0.1')])
+        self.assertEqual([(action, mapping) for action, mapping, _ in report.failed],
+                         [('add', Mapping('host', '10.0.0.1'))])
+
+    def test_close_logs_out(self):
+        self.client.get_mappings()
+        self.assertEqual(len(self.stub.sessions), 1)
+        self.client.close()
+        self.assertEqual(self.stub.sessions, set())
+
+    def test_forced_legacy_version(self):
+        client = PiholeClient(self.stub.api_url, self.stub.api_key, api_version='5')
+        self.assertIsInstance(client.backend, LegacyBackend)
+        with self.assertRaises(PiholeError):
+            client.get_mappings()
+
+
+class SharedPiholeClientTestCase(unittest.TestCase):
+    def setUp(self):
+        pihole_api._shared = None
+
+    @patch.dict('os.environ', {'PIHOLE_API_URL': '', 'PIHOLE_API_KEY': ''})
+    def test_not_configured(self):
+        self.assertIsNone(get_pihole_client())
+        self.assertEqual(pihole_api.get_pihole_mappings(), [])
+
+    def test_shared_until_settings_change(self):
+        with patch.dict('os.environ', {'PIHOLE_API_URL': 'http://pihole/admin/api.php', 'PIHOLE_API_KEY': 'a'}):
+            first = get_pihole_client()
+            self.assertIs(get_pihole_client(), first)
+        with patch.dict('os.environ', {'PIHOLE_API_URL': 'http://pihole/admin/api.php', 'PIHOLE_API_KEY': 'b'}):
+            self.assertIsNot(get_pihole_client(), first)
+
+        with patch.dict('os.environ', {'PIHOLE_API_URL': 'http://pihole/admin/api.php', 'PIHOLE_API_KEY': 'b',
+                                       'PIHOLE_API_VERSION': '6'}):
+            self.assertEqual(get_pihole_client().api_version, '6')
+
+    def test_base_url(self):
+        for api_url in ('http://pihole/admin/api.php', 'http://pihole/api/', 'http://pihole'):
+            self.assertEqual(base_url(api_url), 'http://pihole')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+import meraki
+from app import create_app, db, meraki_api
+from app.models import ProvisionedState
+from app.provisioning import apply_once, provision, file_lock, fcntl
+
+MERAKI_ENV = {
+    'MERAKI_API_ENABLED': 'true',
+    'MERAKI_API_KEY': 'key',
+    'MERAKI_ORG_ID': '123',
+    'MERAKI_SSID_NAMES': 'Guest',
+    'LAN_IP': '192.168.1.10',
+    'PORT': '5001',
+}
+
+
+class ProvisioningTestCase(unittest.TestCase):
+    def setUp(self):
+        fd, self.lock_path = tempfile.mkstemp(suffix='.lock')
+        os.close(fd)
+        self.app = create_app('testing')
+        self.app.config['PROVISION_LOCK_FILE'] = self.lock_path
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.dashboard = MagicMock()
+        self.dashboard.organizations.getOrganizationNetworks.return_value = [{'id': 'net-1', 'name': 'Net'}]
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = {'rules': []}
+        self.dashboard.wireless.getNetworkWirelessSsids.return_value = [{'number': 0, 'name': 'Guest'}]
+        self.dashboard.wireless.getNetworkWirelessSsidSplashSettings.return_value = {'splashPage': 'None'}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        os.remove(self.lock_path)
+
+    @patch.dict('os.environ', MERAKI_ENV)
+    @patch('app.provisioning.get_dashboard')
+    def test_create_app_does_not_provision(self, mock_get_dashboard):
+        create_app('testing')
+        mock_get_dashboard.assert_not_called()
+
+    @patch.dict('os.environ', MERAKI_ENV)
+    @patch('app.meraki_api.get_external_url', return_value='portal.example.com')
+    def test_provision_adds_missing_rule(self, mock_get_external_url):
+        self.assertTrue(provision(self.dashboard))
+        rules = self.dashboard.appliance.updateNetworkApplianceFirewallPortForwardingRules.call_args.kwargs['rules']
+        self.assertEqual([rule['name'] for rule in rules], ['Captive Portal'])
+        self.dashboard.wireless.updateNetworkWirelessSsidSplashSettings.assert_called_once_with(
+            networkId='net-1', number=0, splashPage='custom', splashUrl='http://portal.example.com:5001/')
+        self.assertEqual(ProvisionedState.query.count(), 2)
+
+    @patch.dict('os.environ', MERAKI_ENV)
+    @patch('app.meraki_api.get_external_url', return_value='portal.example.com')
+    def test_provision_skips_unchanged_targets(self, mock_get_external_url):
+        provision(self.dashboard)
+        self.dashboard.reset_mock()
+        provision(self.dashboard)
+        # Only the live state summaries are read
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.assert_called_once()
+        self.dashboard.wireless.getNetworkWirelessSsids.assert_called_once()
+        self.dashboard.wireless.getNetworkWirelessSsidSplashSettings.assert_not_called()
+        self.dashboard.appliance.updateNetworkApplianceFirewallPortForwardingRules.assert_not_called()
+
+        self.dashboard.reset_mock()
+        with patch.dict('os.environ', {'PORT': '5002'}):
+            provision(self.dashboard)
+        self.dashboard.appliance.updateNetworkApplianceFirewallPortForwardingRules.assert_called_once()
+        self.dashboard.wireless.getNetworkWirelessSsidSplashSettings.assert_called_once()
+
+    @patch.dict('os.environ', MERAKI_ENV)
+    @patch('app.meraki_api.get_external_url', return_value='portal.example.com')
+    def test_dashboard_changes_are_provisioned_again(self, mock_get_external_url):
+        provision(self.dashboard)
+        self.dashboard.reset_mock()
+        # A new SSID by a configured name, and the rule removed by hand
+        self.dashboard.wireless.getNetworkWirelessSsids.return_value = [
+            {'number': 0, 'name': 'Guest'}, {'number': 3, 'name': 'Guest'}]
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = {
+            'rules': [{'name': 'Other'}]}
+        provision(self.dashboard)
+        self.assertEqual([call.kwargs['number'] for call in
+                          self.dashboard.wireless.updateNetworkWirelessSsidSplashSettings.call_args_list], [0, 3])
+        self.dashboard.appliance.updateNetworkApplianceFirewallPortForwardingRules.assert_called_once()
+
+    @patch.dict('os.environ', MERAKI_ENV)
+    @patch('app.meraki_api.get_external_url', return_value='portal.example.com')
+    def test_provision_does_not_rewrite_matching_settings(self, mock_get_external_url):
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = {'rules': [
+            {'name': 'Other', 'lanIp': '192.168.1.20', 'publicPort': '80', 'localPort': '80',
+             'protocol': 'tcp', 'allowedIps': ['any']},
+            {'name': 'Captive Portal', 'lanIp': '192.168.1.10', 'publicPort': '5001', 'localPort': '5001',
+             'protocol': 'tcp', 'allowedIps': ['any'], 'uplink': 'both'},
+        ]}
+        self.dashboard.wireless.getNetworkWirelessSsidSplashSettings.return_value = {
+            'splashPage': 'custom', 'splashUrl': 'http://portal.example.com:5001/'}
+        provision(self.dashboard, force=True)
+        self.dashboard.appliance.updateNetworkApplianceFirewallPortForwardingRules.assert_not_called()
+        self.dashboard.wireless.updateNetworkWirelessSsidSplashSettings.assert_not_called()
+
+    @patch.dict('os.environ', MERAKI_ENV)
+    def test_changed_rule_is_replaced_in_place(self):
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = {'rules': [
+            {'name': 'Other', 'lanIp': '192.168.1.20'},
+            {'name': 'Captive Portal', 'lanIp': '192.168.1.99', 'publicPort': '5001', 'localPort': '5001',
+             'protocol': 'tcp', 'allowedIps': ['any']},
+        ]}
+        self.assertTrue(meraki_api.add_port_forwarding_rule(self.dashboard, 'net-1'))
+        rules = self.dashboard.appliance.updateNetworkApplianceFirewallPortForwardingRules.call_args.kwargs['rules']
+        self.assertEqual([(rule['name'], rule['lanIp']) for rule in rules],
+                         [('Other', '192.168.1.20'), ('Captive Portal', '192.168.1.10')])
+
+    def test_failed_apply_is_not_recorded(self):
+        self.assertTrue(apply_once('target', {'a': 1}, lambda: None))
+        self.assertIsNone(db.session.get(ProvisionedState, 'target'))
+        self.assertTrue(apply_once('target', {'a': 1}, lambda: True))
+        self.assertFalse(apply_once('target', {'a': 1}, lambda: True))
+
+    def test_unreadable_live_state_is_applied(self):
+        def live():
+            raise meraki.APIError({'tags': ['wireless'], 'operation': 'getNetworkWirelessSsids'}, MagicMock())
+
+        self.assertTrue(apply_once('target', {'a': 1}, lambda: False, live=live))
+        self.assertIsNone(db.session.get(ProvisionedState, 'target'))
+        self.assertTrue(apply_once('target', {'a': 1}, lambda: False, live=lambda: ['Guest']))
+        self.assertFalse(apply_once('target', {'a': 1}, lambda: False, live=lambda: ['Guest']))
+        self.assertTrue(apply_once('target', {'a': 1}, lambda: False, live=lambda: ['Guest', 'Staff']))
+
+    @patch.dict('os.environ', {'MERAKI_API_ENABLED': 'false'})
+    def test_provision_disabled(self):
+        self.assertFalse(provision(self.dashboard))
+        self.dashboard.organizations.getOrganizationNetworks.assert_not_called()
+
+    @patch('app.provisioning.provision', return_value=True)
+    def test_cli_command(self, mock_provision):
+        result = self.app.test_cli_runner().invoke(args=['provision'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Provisioning complete', result.output)
+        mock_provision.assert_called_once()
+
+    @unittest.skipIf(fcntl is None, 'fcntl is not available')
+    @patch('app.provisioning.provision', return_value=True)
+    def test_cli_skips_when_locked(self, mock_provision):
+        with file_lock(self.lock_path) as acquired:
+            self.assertTrue(acquired)
+            result = self.app.test_cli_runner().invoke(args=['provision'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('already in progress', result.output)
+        mock_provision.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
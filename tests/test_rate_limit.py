@@ -0,0 +1,155 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import meraki
+from cachelib import SimpleCache
+from app import create_app
+from app import meraki_api
+from app.rate_limit import RateLimiter, RateLimits, SharedWindowCounter, call_limited, rate_limits
+from app.config import TestingConfig
+from test_meraki_clients import FakeSession, fake_dashboard
+
+
+def api_error(status, headers=None):
+    response = MagicMock()
+    response.status_code = status
+    response.reason_phrase = 'Too Many Requests'
+    response.headers = headers or {}
+    response.json.return_value = {'errors': ['rate limited']}
+    return meraki.APIError({'tags': ['networks'], 'operation': 'getNetworkClients'}, response)
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    def test_rate_is_respected(self):
+        limiter = RateLimiter(rate=50, max_concurrent=4)
+        started = time.monotonic()
+        for _ in range(11):
+            with limiter:
+                pass
+        # The first call is free, the next ten are spaced 20ms apart
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+        self.assertEqual(limiter.stats()['calls'], 11)
+
+    def test_concurrency_is_capped(self):
+        limiter = RateLimiter(rate=1000, burst=100, max_concurrent=2)
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def work():
+            with limiter:
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 2)
+
+    def test_backoff_pauses_callers(self):
+        limiter = RateLimiter(rate=1000, burst=100)
+        limiter.backoff(0.1)
+        started = time.monotonic()
+        with limiter:
+            pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(limiter.stats()['throttled'], 1)
+
+
+class SharedRateLimitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimpleCache()
+
+    def test_shared_counter_caps_all_limiters(self):
+        counter = SharedWindowCounter(self.backend, 'test', rate=3)
+        other = SharedWindowCounter(self.backend, 'test', rate=3)
+        with patch('time.time', return_value=1000.0):
+            taken = [counter.take(), other.take(), counter.take(), other.take()]
+            self.assertEqual(taken, [True, True, True, False])
+            self.assertEqual(counter.available(), 0)
+        with patch('time.time', return_value=1001.0):
+            self.assertTrue(counter.take())
+
+    def test_backoff_is_shared(self):
+        first = RateLimiter(rate=1000, burst=100, backend=self.backend, key='org')
+        second = RateLimiter(rate=1000, burst=100, backend=self.backend, key='org')
+        first.backoff(0.1)
+        started = time.monotonic()
+        with second:
+            pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_stats(self):
+        limiter = RateLimiter(rate=5, backend=self.backend, key='org')
+        with limiter:
+            pass
+        stats = limiter.stats()
+        self.assertEqual(stats['calls'], 1)
+        self.assertTrue(stats['shared'])
+        self.assertEqual(stats['throttled'], 0)
+        self.assertEqual(stats['tokens_available'], 4)
+
+    def test_registry_uses_shared_app_cache(self):
+        app = create_app(TestingConfig)
+        with patch('app.rate_limit.cache_is_shared', return_value=True):
+            limits = RateLimits(app)
+        self.assertIsNotNone(limits.backend)
+        self.assertIs(limits.limiter('org'), limits.limiter('org'))
+        self.assertIn('org', limits.stats())
+        app.config['MERAKI_SHARED_RATE_LIMIT'] = False
+        with patch('app.rate_limit.cache_is_shared', return_value=True):
+            limits.init_app(app)
+        self.assertIsNone(limits.backend)
+
+    def test_per_worker_cache_is_not_shared(self):
+        limits = RateLimits(create_app(TestingConfig))
+        self.assertIsNone(limits.backend)
+        self.assertFalse(limits.limiter('org').stats()['shared'])
+
+
+class CallLimitedTestCase(unittest.TestCase):
+    def setUp(self):
+        rate_limits.reset()
+
+    def test_retry_after_429(self):
+        limiter = RateLimiter(rate=1000, burst=100)
+        func = MagicMock(side_effect=[api_error(429, {'Retry-After': '0.05'}), ['ok']])
+        with patch.object(limiter, 'backoff', wraps=limiter.backoff) as mock_backoff:
+            self.assertEqual(call_limited(limiter, func, 'N_1'), ['ok'])
+        # Retry-After plus up to BACKOFF_BASE seconds of jitter
+        wait = mock_backoff.call_args[0][0]
+        self.assertGreaterEqual(wait, 0.05)
+        self.assertLessEqual(wait, 0.55)
+        self.assertEqual(func.call_count, 2)
+
+    def test_other_errors_are_raised(self):
+        limiter = RateLimiter(rate=1000, burst=100)
+        func = MagicMock(side_effect=api_error(404))
+        with self.assertRaises(meraki.APIError):
+            call_limited(limiter, func)
+        func.assert_called_once()
+
+    @patch.dict('os.environ', {'MERAKI_ORG_RATE': '1000', 'MERAKI_FETCH_CONCURRENCY': '4'})
+    def test_fetch_network_clients_runs_concurrently(self):
+        session = FakeSession(clients_per_network=1, latency=0.1)
+        networks = [{'id': f'N_{i}'} for i in range(8)]
+        started = time.monotonic()
+        clients = meraki_api.fetch_network_clients(fake_dashboard(session), 'org', networks)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(sorted(c['ip'] for c in clients), sorted(f"{n['id']}-0" for n in networks))
+
+    @patch.dict('os.environ', {'MERAKI_ORG_ID': 'org'})
+    @patch('app.meraki_api.get_dashboard')
+    def test_get_meraki_clients_raises(self, mock_get_dashboard):
+        mock_get_dashboard.return_value = fake_dashboard(FakeSession(fail_network='N_1'))
+        with self.assertRaises(meraki.APIError):
+            list(meraki_api.get_meraki_clients())
+
+
+if __name__ == '__main__':
+    unittest.main()
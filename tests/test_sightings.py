@@ -0,0 +1,223 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app import create_app, db
+from app.models import Client, User
+from app.sightings import SightingBuffer, ClientDebounce, client_debounce, sighting_buffer, write_sightings
+
+class SightingBufferTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['SIGHTING_WRITE_BEHIND'] = True
+        self.app.config['SIGHTING_FLUSH_INTERVAL'] = 3600
+        self.app.config['SIGHTING_BATCH_SIZE'] = 2
+        self.app.config['SIGHTING_QUEUE_MAX'] = 3
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.buffer = SightingBuffer(self.app)
+
+    def tearDown(self):
+        self.buffer.stop()
+        sighting_buffer.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_sightings_are_written_on_flush(self):
+        self.assertTrue(self.buffer.add('00:11:22:33:44:55', '1.2.3.4', 'agent'))
+        self.assertEqual(Client.query.count(), 0)
+        self.assertEqual(self.buffer.queue_depth(), 1)
+        self.assertEqual(self.buffer.flush(), 1)
+        client = Client.query.filter_by(mac_address='00:11:22:33:44:55').first()
+        self.assertIsNotNone(client)
+        self.assertEqual(client.ip_address, '1.2.3.4')
+        self.assertEqual(self.buffer.queue_depth(), 0)
+
+    def test_sightings_are_coalesced_per_mac(self):
+        now = datetime.utcnow()
+        self.buffer.add('00:11:22:33:44:55', '1.2.3.4', 'agent', now)
+        self.buffer.add('00:11:22:33:44:55', '1.2.3.5', 'agent', now + timedelta(seconds=5))
+        self.buffer.add('00:11:22:33:44:55', '1.2.3.6', 'agent', now - timedelta(seconds=5))
+        self.assertEqual(self.buffer.queue_depth(), 1)
+        self.buffer.flush()
+        client = Client.query.filter_by(mac_address='00:11:22:33:44:55').one()
+        self.assertEqual(client.ip_address, '1.2.3.5')
+        self.assertEqual(client.last_seen, now + timedelta(seconds=5))
+        self.assertEqual(self.buffer.stats()['coalesced'], 2)
+
+    def test_flush_updates_existing_clients(self):
+        seen = datetime.utcnow() - timedelta(days=1)
+        db.session.add(Client(mac_address='00:11:22:33:44:55', ip_address='1.2.3.4',
+                              first_seen=seen, last_seen=seen))
+        db.session.commit()
+        self.buffer.add('00:11:22:33:44:55', '1.2.3.4', 'agent')
+        self.buffer.add('AA:BB:CC:DD:EE:FF', '5.6.7.8', 'agent')
+        self.buffer.add('AA:BB:CC:DD:EE:00', '5.6.7.9', 'agent')
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(Client.query.count(), 3)
+        client = Client.query.filter_by(mac_address='00:11:22:33:44:55').one()
+        self.assertEqual(client.first_seen, seen)
+        self.assertGreater(client.last_seen, seen)
+        stats = self.buffer.stats()
+        self.assertEqual(stats['flushes'], 2)
+        self.assertEqual(stats['flushed'], 3)
+
+    def test_full_buffer_rejects_new_macs(self):
+        self.assertTrue(self.buffer.add('00:00:00:00:00:01', '1.2.3.1', None))
+        self.assertTrue(self.buffer.add('00:00:00:00:00:02', '1.2.3.2', None))
+        self.assertTrue(self.buffer.add('00:00:00:00:00:03', '1.2.3.3', None))
+        self.assertFalse(self.buffer.add('00:00:00:00:00:04', '1.2.3.4', None))
+        self.assertTrue(self.buffer.add('00:00:00:00:00:01', '1.2.3.1', None))
+        self.assertEqual(self.buffer.stats()['overflowed'], 1)
+
+    def test_failed_flush_keeps_sightings(self):
+        for i in range(3):
+            self.buffer.add(f'00:00:00:00:00:0{i}', f'1.2.3.{i}', None)
+        with patch('app.sightings.write_sightings', side_effect=RuntimeError('database is locked')):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.queue_depth(), 3)
+        self.assertEqual(self.buffer.stats()['flush_errors'], 1)
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(Client.query.count(), 3)
+
+    def test_failed_flush_forgets_debounced_macs(self):
+        now = datetime.utcnow()
+        client_debounce.init_app(self.app)
+        self.buffer.add('00:11:22:33:44:55', '1.2.3.4', None, now)
+        client_debounce.remember('00:11:22:33:44:55', '1.2.3.4', now)
+        with patch('app.sightings.write_sightings', side_effect=RuntimeError('database is locked')):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertFalse(client_debounce.should_skip('00:11:22:33:44:55', '1.2.3.4', now))
+
+    def test_requeue_respects_max_size(self):
+        now = datetime.utcnow()
+        self.buffer.add('00:00:00:00:00:01', '1.2.3.1', None, now)
+        self.buffer.add('00:00:00:00:00:02', '1.2.3.2', None, now)
+
+        def fail(batch):
+            # Sightings queued while the batch is being written
+            self.buffer.add('00:00:00:00:00:01', '1.2.3.9', None, now + timedelta(seconds=1))
+            self.buffer.add('00:00:00:00:00:03', '1.2.3.3', None, now)
+            self.buffer.add('00:00:00:00:00:04', '1.2.3.4', None, now)
+            raise RuntimeError('database is locked')
+
+        with patch('app.sightings.write_sightings', side_effect=fail):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(self.buffer.queue_depth(), 3)
+        self.assertEqual(self.buffer.stats()['overflowed'], 1)
+        self.buffer.flush()
+        # The newer sighting queued during the failed flush wins
+        self.assertEqual(Client.query.filter_by(mac_address='00:00:00:00:00:01').one().ip_address, '1.2.3.9')
+
+    def test_stop_flushes_pending_sightings(self):
+        self.buffer.add('00:11:22:33:44:55', '1.2.3.4', 'agent')
+        self.buffer.stop()
+        self.assertEqual(Client.query.count(), 1)
+
+    def test_write_sightings_upserts_on_mac(self):
+        first = datetime.utcnow() - timedelta(hours=1)
+        second = datetime.utcnow()
+        write_sightings([('00:11:22:33:44:55', '1.2.3.4', 'agent', first)])
+        write_sightings([('00:11:22:33:44:55', '1.2.3.4', 'agent', second)])
+        client = Client.query.filter_by(mac_address='00:11:22:33:44:55').one()
+        self.assertEqual(client.first_seen, first)
+        self.assertEqual(client.last_seen, second)
+
+    def test_older_sighting_does_not_go_backwards(self):
+        earlier = datetime.utcnow() - timedelta(minutes=5)
+        later = datetime.utcnow()
+        write_sightings([('00:11:22:33:44:55', '1.2.3.5', 'agent', later)])
+        write_sightings([('00:11:22:33:44:55', '1.2.3.4', 'agent', earlier)])
+        client = Client.query.filter_by(mac_address='00:11:22:33:44:55').one()
+        self.assertEqual((client.ip_address, client.last_seen), ('1.2.3.5', later))
+
+    def test_fallback_does_not_go_backwards(self):
+        earlier = datetime.utcnow() - timedelta(minutes=5)
+        later = datetime.utcnow()
+        with patch('app.sightings.upsert_statement', return_value=None):
+            write_sightings([('00:11:22:33:44:55', '1.2.3.5', 'agent', later)])
+            write_sightings([('00:11:22:33:44:55', '1.2.3.4', 'agent', earlier),
+                             ('66:77:88:99:AA:BB', '1.2.3.6', 'agent', earlier)])
+            write_sightings([('66:77:88:99:AA:BB', '1.2.3.7', 'agent', later)])
+        client = Client.query.filter_by(mac_address='00:11:22:33:44:55').one()
+        self.assertEqual((client.ip_address, client.last_seen), ('1.2.3.5', later))
+        client = Client.query.filter_by(mac_address='66:77:88:99:AA:BB').one()
+        self.assertEqual((client.ip_address, client.last_seen), ('1.2.3.7', later))
+
+    def test_splash_page_uses_buffer(self):
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        sighting_buffer.init_app(self.app)
+        client = self.app.test_client()
+        client.post('/login', data={'username': 'testuser', 'password': 'password'})
+        response = client.get('/?client_mac=00:11:22:33:44:55&client_ip=1.2.3.4&base_grant_url=https://meraki.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sighting_buffer.queue_depth(), 1)
+        sighting_buffer.stop()
+        self.assertEqual(Client.query.filter_by(mac_address='00:11:22:33:44:55').count(), 1)
+
+class ClientDebounceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['CLIENT_DEBOUNCE_SECONDS'] = 60
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.debounce = ClientDebounce(self.app)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_new_mac_is_not_skipped(self):
+        self.assertFalse(self.debounce.should_skip('00:11:22:33:44:55', '1.2.3.4', datetime.utcnow()))
+        self.assertEqual(self.debounce.stats()['hits'], 0)
+
+    def test_recent_sighting_is_skipped(self):
+        now = datetime.utcnow()
+        self.debounce.remember('00:11:22:33:44:55', '1.2.3.4', now)
+        self.assertTrue(self.debounce.should_skip('00:11:22:33:44:55', '1.2.3.4', now + timedelta(seconds=30)))
+        self.assertFalse(self.debounce.should_skip('00:11:22:33:44:55', '1.2.3.4', now + timedelta(seconds=61)))
+        stats = self.debounce.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['skipped'], 1)
+
+    def test_ip_change_is_written_through(self):
+        now = datetime.utcnow()
+        self.debounce.remember('00:11:22:33:44:55', '1.2.3.4', now)
+        self.assertFalse(self.debounce.should_skip('00:11:22:33:44:55', '1.2.3.5', now))
+        self.assertEqual(self.debounce.stats()['ip_changes'], 1)
+
+    def test_zero_window_disables_debounce(self):
+        self.app.config['CLIENT_DEBOUNCE_SECONDS'] = 0
+        self.debounce.init_app(self.app)
+        now = datetime.utcnow()
+        self.debounce.remember('00:11:22:33:44:55', '1.2.3.4', now)
+        self.assertFalse(self.debounce.should_skip('00:11:22:33:44:55', '1.2.3.4', now))
+
+    def test_splash_page_skips_repeat_writes(self):
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/login', data={'username': 'testuser', 'password': 'password'})
+        url = '/?client_mac=00:11:22:33:44:55&client_ip=1.2.3.4&base_grant_url=https://meraki.com'
+        client.get(url)
+        last_seen = Client.query.filter_by(mac_address='00:11:22:33:44:55').one().last_seen
+        client.get(url)
+        db.session.expire_all()
+        self.assertEqual(Client.query.filter_by(mac_address='00:11:22:33:44:55').one().last_seen, last_seen)
+        client.get('/?client_mac=00:11:22:33:44:55&client_ip=1.2.3.9&base_grant_url=https://meraki.com')
+        db.session.expire_all()
+        self.assertEqual(Client.query.filter_by(mac_address='00:11:22:33:44:55').one().ip_address, '1.2.3.9')
+
+if __name__ == '__main__':
+    unittest.main()
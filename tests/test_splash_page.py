@@ -0,0 +1,75 @@
+import gzip
+import unittest
+from unittest.mock import patch
+from app import create_app, db
+from app.models import User
+from app.splash_page import splash_page, brotli
+
+SPLASH_URL = '/?client_mac=00:11:22:33:44:55&client_ip=1.2.3.4&base_grant_url=https://meraki.com'
+
+class SplashPageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        self.client.post('/login', data={'username': 'testuser', 'password': 'password'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_splash_page_is_pre_rendered(self):
+        with patch('app.splash_page.render_template') as mock_render:
+            response = self.client.get(SPLASH_URL)
+        self.assertEqual(response.status_code, 200)
+        mock_render.assert_not_called()
+        self.assertIn(b'let timeLeft = 10;', response.data)
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIn('Accept-Encoding', response.headers.get('Vary'))
+
+    def test_gzip_variant(self):
+        response = self.client.get(SPLASH_URL, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        plain = self.client.get(SPLASH_URL)
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertNotEqual(response.headers['ETag'], plain.headers['ETag'])
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_variant_is_preferred(self):
+        response = self.client.get(SPLASH_URL, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers.get('Content-Encoding'), 'br')
+        plain = self.client.get(SPLASH_URL)
+        self.assertEqual(brotli.decompress(response.data), plain.data)
+
+    def test_not_modified(self):
+        etag = self.client.get(SPLASH_URL).headers['ETag']
+        response = self.client.get(SPLASH_URL, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_timer_change_renders_new_page(self):
+        etag = self.client.get(SPLASH_URL).headers['ETag']
+        self.app.config['SPLASH_TIMER_SECONDS'] = 20
+        response = self.client.get(SPLASH_URL, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'let timeLeft = 20;', response.data)
+
+    def test_init_app_rebuilds_pages(self):
+        self.client.get(SPLASH_URL)
+        self.app.config['SPLASH_TIMER_SECONDS'] = 30
+        splash_page.init_app(self.app)
+        with patch('app.splash_page.render_template') as mock_render:
+            response = self.client.get(SPLASH_URL)
+        mock_render.assert_not_called()
+        self.assertIn(b'let timeLeft = 30;', response.data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+from app import create_app, cache, db
+from app.models import User
+from app.status_poller import status_poller, SNAPSHOT_KEY
+from app.rate_limit import rate_limits
+
+MERAKI_ENV = {'MERAKI_ORG_ID': 'org', 'MERAKI_SSID_NAMES': 'Guest, Staff', 'MERAKI_ORG_RATE': '1000'}
+
+
+@patch.dict('os.environ', MERAKI_ENV)
+class StatusPollerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        rate_limits.reset()
+        self.dashboard = MagicMock()
+        self.dashboard.organizations.getOrganizationNetworks.return_value = [
+            {'id': 'N_1', 'name': 'HQ'}, {'id': 'N_2', 'name': 'Branch'}]
+
+    def tearDown(self):
+        status_poller.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    @patch('app.compliance.verify_splash_page', side_effect=lambda d, network_id, name: network_id == 'N_1')
+    @patch('app.compliance.verify_port_forwarding_rule', return_value=True)
+    @patch('app.compliance.get_external_url', return_value='portal.dynamic-m.com')
+    @patch('app.status_poller.get_dashboard')
+    def test_collect_covers_all_networks_and_ssids(self, mock_get_dashboard, *mocks):
+        mock_get_dashboard.return_value = self.dashboard
+        snapshot = status_poller.collect()
+        self.assertIsNone(snapshot['error'])
+        self.assertEqual([n['id'] for n in snapshot['networks']], ['N_1', 'N_2'])
+        self.assertEqual(snapshot['networks'][1]['ssids'], {'Guest': False, 'Staff': False})
+        self.assertEqual(snapshot['ssid_names'], ['Guest', 'Staff'])
+        self.assertEqual(snapshot['external_url'], 'portal.dynamic-m.com')
+        # N_2's SSIDs are not set, so the splash page is not set everywhere
+        self.assertFalse(snapshot['splash_page_set_correctly'])
+        self.assertEqual(snapshot['summary'], {'networks': 2, 'compliant_networks': 1,
+                                               'pairs': 4, 'compliant_pairs': 2})
+
+    @patch('app.status_poller.get_dashboard')
+    def test_collect_records_errors(self, mock_get_dashboard):
+        mock_get_dashboard.return_value = self.dashboard
+        self.dashboard.organizations.getOrganizationNetworks.side_effect = RuntimeError('dashboard down')
+        snapshot = status_poller.collect()
+        self.assertEqual(snapshot['error'], 'dashboard down')
+        self.assertEqual(snapshot['networks'], [])
+
+    @patch('app.status_poller.get_dashboard', return_value=None)
+    def test_poll_stores_snapshot_in_cache(self, mock_get_dashboard):
+        status_poller.poll()
+        self.assertIsNotNone(cache.get(SNAPSHOT_KEY)['collected_at'])
+        self.assertEqual(status_poller.polls, 1)
+
+    @patch('app.status_poller.get_dashboard', return_value=None)
+    def test_background_thread_polls(self, mock_get_dashboard):
+        status_poller.snapshot()
+        status_poller._thread.join(timeout=0.2)
+        self.assertIsNotNone(cache.get(SNAPSHOT_KEY))
+        mock_get_dashboard.assert_called()
+
+
+@patch.dict('os.environ', MERAKI_ENV)
+class StatusPagesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.client.post('/login', data={'username': 'testuser', 'password': 'password'})
+
+    def tearDown(self):
+        status_poller.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def snapshot(self, **kwargs):
+        snapshot = {
+            'collected_at': datetime.utcnow() - timedelta(seconds=42), 'org_id': 'org', 'ssid_names': ['Guest'],
+            'networks': [{'id': 'N_1', 'name': 'HQ', 'external_url': 'portal.dynamic-m.com',
+                          'port_forwarding_rule_active': True, 'ssids': {'Guest': True},
+                          'compliant': True, 'error': None}],
+            'external_url': 'portal.dynamic-m.com', 'port_forwarding_rule_active': True,
+            'splash_page_set_correctly': True, 'error': None,
+            'summary': {'networks': 1, 'compliant_networks': 1, 'pairs': 1, 'compliant_pairs': 1},
+        }
+        snapshot.update(kwargs)
+        return snapshot
+
+    @patch('app.routes.status_poller')
+    @patch('app.meraki_dashboard.meraki.DashboardAPI')
+    def test_pages_render_from_snapshot(self, mock_dashboard_api, mock_poller):
+        mock_poller.snapshot.return_value = self.snapshot()
+        mock_poller.interval = 60
+        mock_poller.polls = 3
+        mock_poller.last_poll_ms = 12.5
+        admin = self.client.get('/admin', headers={'X-Forwarded-For': '127.0.0.1'})
+        self.assertIn(b'Connected', admin.data)
+        self.assertIn(b'as of 42s ago', admin.data)
+        status = self.client.get('/meraki_status')
+        self.assertIn(b'(42s ago)', status.data)
+        self.assertIn(b'HQ', status.data)
+        mock_dashboard_api.assert_not_called()
+
+    @patch('app.routes.status_poller')
+    def test_pages_before_first_snapshot(self, mock_poller):
+        mock_poller.snapshot.return_value = None
+        admin = self.client.get('/admin', headers={'X-Forwarded-For': '127.0.0.1'})
+        self.assertIn(b'Checking...', admin.data)
+        status = self.client.get('/meraki_status')
+        self.assertEqual(status.status_code, 200)
+        self.assertIn(b'Collecting the first status snapshot', status.data)
+
+    @patch('app.routes.status_poller')
+    def test_compliance_json(self, mock_poller):
+        mock_poller.snapshot.return_value = None
+        self.assertEqual(self.client.get('/meraki_status/compliance').status_code, 503)
+        mock_poller.snapshot.return_value = self.snapshot()
+        response = self.client.get('/meraki_status/compliance')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['age'], 42)
+        self.assertEqual(response.json['summary']['compliant_pairs'], 1)
+        self.assertEqual(response.json['networks'][0]['ssids'], {'Guest': True})
+
+    @patch('app.routes.status_poller')
+    def test_force_refresh(self, mock_poller):
+        self.client.post('/force_refresh')
+        mock_poller.request_refresh.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+from app import create_app, db
+from app.models import SyncRun, User
+from app.provisioning import file_lock
+from app.sync_scheduler import SyncError, sync_scheduler
+
+
+def fake_result(adds=0, deletes=0):
+    plan = MagicMock(adds=[None] * adds, deletes=[None] * deletes)
+    plan.summary.return_value = {'adds': adds, 'deletes': deletes, 'unchanged': 0, 'conflicts': 0}
+    return plan, MagicMock(added=adds, deleted=deletes, failed=[])
+
+
+class SyncSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config['DNS_SYNC_LOCK_FILE'] = os.path.join(self.tmpdir, 'sync.lock')
+        sync_scheduler.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        # The tests drive run_pending themselves
+        self.worker = patch.object(sync_scheduler, '_ensure_worker')
+        self.worker.start()
+
+    def tearDown(self):
+        self.worker.stop()
+        sync_scheduler.stop()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.tmpdir)
+
+    @patch('app.sync_scheduler.perform_sync', return_value=fake_result(adds=2))
+    def test_queued_runs_are_executed(self, mock_sync):
+        sync_scheduler.enqueue()
+        sync_scheduler.enqueue(dry_run=True)
+        self.assertEqual(sync_scheduler.run_pending(), 2)
+        self.assertEqual(mock_sync.call_count, 2)
+        self.assertEqual([run.status for run in SyncRun.query.order_by(SyncRun.id)], ['succeeded', 'succeeded'])
+        self.assertEqual(sync_scheduler.run_pending(), 0)
+
+    def test_enqueue_joins_queued_run(self):
+        first = sync_scheduler.enqueue()
+        self.assertEqual(sync_scheduler.enqueue().id, first.id)
+        self.assertNotEqual(sync_scheduler.enqueue(dry_run=True).id, first.id)
+        self.assertEqual(SyncRun.query.count(), 2)
+
+    @patch('app.sync_scheduler.perform_sync')
+    def test_single_flight(self, mock_sync):
+        sync_scheduler.enqueue()
+        # Another worker is syncing
+        with file_lock(sync_scheduler.lock_file) as acquired:
+            self.assertTrue(acquired)
+            self.assertEqual(sync_scheduler.run_pending(), 0)
+        mock_sync.assert_not_called()
+        self.assertEqual(SyncRun.query.one().status, 'queued')
+
+    @patch('app.sync_scheduler.perform_sync', return_value=fake_result())
+    def test_scheduled_run_when_due(self, mock_sync):
+        sync_scheduler.interval = 60
+        self.assertEqual(sync_scheduler.run_pending(), 1)
+        self.assertEqual(SyncRun.query.one().trigger, 'schedule')
+        # Not due again until the interval has passed
+        self.assertEqual(sync_scheduler.run_pending(), 0)
+        run = SyncRun.query.one()
+        run.started_at = datetime.utcnow() - timedelta(seconds=61)
+        db.session.commit()
+        self.assertEqual(sync_scheduler.run_pending(), 1)
+
+    def test_no_schedule_without_interval(self):
+        sync_scheduler.interval = 0
+        self.assertEqual(sync_scheduler.run_pending(), 0)
+        self.assertEqual(SyncRun.query.count(), 0)
+
+    @patch('app.sync_scheduler.perform_sync', return_value=fake_result())
+    def test_interrupted_run_is_failed(self, mock_sync):
+        db.session.add(SyncRun(trigger='manual', dry_run=False, status='running', started_at=datetime.utcnow()))
+        db.session.commit()
+        sync_scheduler.run_pending()
+        run = SyncRun.query.one()
+        self.assertEqual((run.status, run.message), ('failed', 'Interrupted'))
+
+    @patch('app.sync_scheduler.perform_sync', side_effect=SyncError('Pi-hole is down'))
+    def test_failure_is_recorded(self, mock_sync):
+        run = sync_scheduler.execute(sync_scheduler.enqueue())
+        self.assertEqual((run.status, run.errors, run.message), ('failed', 1, 'Pi-hole is down'))
+        self.assertIsNotNone(run.finished_at)
+
+    @patch('app.sync_scheduler.perform_sync', return_value=fake_result(adds=3, deletes=1))
+    def test_sync_status(self, mock_sync):
+        user = User(username='testuser')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/login', data={'username': 'testuser', 'password': 'password'})
+
+        sync_scheduler.enqueue()
+        status = client.get('/sync_status').get_json()
+        self.assertEqual(status['current']['status'], 'queued')
+        self.assertIsNone(status['last'])
+
+        sync_scheduler.run_pending()
+        status = client.get('/sync_status').get_json()
+        self.assertIsNone(status['current'])
+        self.assertEqual((status['last']['status'], status['last']['adds'], status['last']['deletes']),
+                         ('succeeded', 3, 1))
+        self.assertIn(b'3 added, 1 deleted', client.get('/admin').data)
+
+
+if __name__ == '__main__':
+    unittest.main()
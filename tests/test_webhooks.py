@@ -0,0 +1,94 @@
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+from app import create_app, cache
+from app import meraki_api
+from app.memo import cache_is_shared
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'meraki_webhooks')
+MERAKI_ENV = {'MERAKI_ORG_ID': '123456', 'MERAKI_SSID_NAMES': 'Guest, Staff'}
+
+
+def load_payload(name):
+    with open(os.path.join(FIXTURES, f'{name}.json')) as f:
+        return json.load(f)
+
+
+@patch.dict('os.environ', MERAKI_ENV)
+class WebhookTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['MERAKI_WEBHOOK_SECRET'] = 'webhook-secret'
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        cache.clear()
+        self.client = self.app.test_client()
+        self.dashboard = MagicMock()
+        self.dashboard.appliance.getNetworkApplianceFirewallPortForwardingRules.return_value = {'rules': []}
+        patcher = patch('app.routes.status_poller')
+        self.mock_poller = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def cached(self, func, *args):
+        return cache.get(func.make_key(None, *args)) is not None
+
+    def test_settings_changed_invalidates_network(self):
+        meraki_api.verify_port_forwarding_rule(self.dashboard, 'N_1')
+        meraki_api.verify_port_forwarding_rule(self.dashboard, 'N_2')
+        response = self.client.post('/meraki/webhook', json=load_payload('settings_changed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['invalidated'], ['port_forwarding', 'ssids', 'external_url'])
+        self.assertFalse(self.cached(meraki_api.verify_port_forwarding_rule, 'N_1'))
+        self.assertTrue(self.cached(meraki_api.verify_port_forwarding_rule, 'N_2'))
+        self.mock_poller.request_refresh.assert_called_once()
+
+    def test_stopped_reporting_invalidates_external_url(self):
+        with patch('app.meraki_api.get_appliance_serial', return_value=None):
+            meraki_api.get_external_url(self.dashboard, '123456', 'N_1')
+        meraki_api.verify_port_forwarding_rule(self.dashboard, 'N_1')
+        response = self.client.post('/meraki/webhook', json=load_payload('stopped_reporting'))
+        self.assertEqual(response.json['invalidated'], ['external_url'])
+        self.assertFalse(self.cached(meraki_api.get_external_url, '123456', 'N_1'))
+        self.assertTrue(self.cached(meraki_api.verify_port_forwarding_rule, 'N_1'))
+
+    def test_unrelated_alert_is_ignored(self):
+        response = self.client.post('/meraki/webhook', json=load_payload('rogue_ap'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['invalidated'], [])
+        self.mock_poller.request_refresh.assert_not_called()
+
+    def test_other_organization_is_ignored(self):
+        payload = load_payload('settings_changed')
+        payload['organizationId'] = '999'
+        self.assertEqual(self.client.post('/meraki/webhook', json=payload).json['invalidated'], [])
+
+    def test_invalid_secret_is_rejected(self):
+        payload = load_payload('settings_changed')
+        payload['sharedSecret'] = 'wrong'
+        self.assertEqual(self.client.post('/meraki/webhook', json=payload).status_code, 403)
+        self.assertEqual(self.client.post('/meraki/webhook', data='not json').status_code, 400)
+
+    def test_disabled_without_secret(self):
+        self.app.config['MERAKI_WEBHOOK_SECRET'] = None
+        response = self.client.post('/meraki/webhook', json=load_payload('settings_changed'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_ttl_is_longer_with_webhooks(self):
+        ttl = meraki_api.cache_ttl(300)
+        with patch('app.meraki_api.cache_is_shared', return_value=True):
+            self.assertEqual(ttl(), 3600)
+            self.app.config['MERAKI_WEBHOOK_SECRET'] = None
+            self.assertEqual(ttl(), 300)
+
+    def test_ttl_is_unchanged_with_per_worker_cache(self):
+        # The testing config uses SimpleCache, which other workers cannot see
+        self.assertFalse(cache_is_shared())
+        self.assertEqual(meraki_api.cache_ttl(300)(), 300)
+
+
+if __name__ == '__main__':
+    unittest.main()